@@ -10,13 +10,35 @@ import time
 
 # Custom modules
 sys.path.append("ctes_resources/scripts")
-import aggregator
 import args
+import bench
+import common
 import create_erate
 import data_writer
-import buildings
+import ensemble
+import eso_store
+import jobs
+import operate
+import decompose
+import precision
 import project_setup
-import storage
+import quick
+import shards
+import results
+import sensitivity
+import stages
+import summaries
+import sweep
+import watch
+
+#-------------------------------------------------------------------------------
+# Report pipeline errors as messages (as sys.exit did) rather than tracebacks
+def report(kind, value, tb):
+    if issubclass(kind, common.CtesError):
+        print(value, file=sys.stderr)
+    else:
+        sys.__excepthook__(kind, value, tb)
+sys.excepthook = report
 
 #-------------------------------------------------------------------------------
 print('Started...')
@@ -39,23 +61,51 @@ if args['setup']:
         "appropriate ctes type ('rtu', 'chiller', '<district>')")
     sys.exit()
 #-------------------------------------------------------------------------------
+# Convert building simulations to columnar stores
+if args['convert']:
+    print('Checking if project setup is complete')
+    log = project_setup.check(args['project_name'])
+    eso_store.convert_all(args['project_name'], log)
+
+#-------------------------------------------------------------------------------
+# Compare the AMPL files written with float64 and float32 time series
+if args['precision_check']:
+    print('Checking if project setup is complete')
+    log = project_setup.check(args['project_name'])
+    precision.check(args['project_name'], log)
+
+#-------------------------------------------------------------------------------
 # Run preprocessor(s)
 if args['run']:
     print('Checking if project setup is complete')
     log = project_setup.check(args['project_name'])
     print('Executing optimization pre-processing scripts')
-    preprocess = buildings.run(args['project_name'], log)
-    if len(preprocess['community']['district_plant_names']) > 0:
-        print("District loop(s) detected. ")
-    else:
-        print("No district loops assigned, proceeding with CTES processing")
-        log.info("Processing CTES models for chillers and RTUs")
-        preprocess = storage.run(args['project_name'], preprocess, log)
-    preprocess = aggregator.run(preprocess, log)
-    preprocess['utility_rate'] = create_erate.run(
-        preprocess['program_manager']['timesteps'], log)
+    preprocess = stages.preprocess(args['project_name'], log,
+        fresh=args['fresh'])
+    if preprocess['community'].get('district_plants_pending'):
+        print("District loop(s) detected; re-run (or use -l) once the " \
+            "plant simulations are in 'district_plant_simulations'")
+
+#-------------------------------------------------------------------------------
+# Pre-process through a shared work queue, as its coordinator or a worker
+if args['shard']:
+    print('Checking if project setup is complete')
+    log = project_setup.check(args['project_name'])
+    print('Executing sharded pre-processing')
+    preprocess = shards.coordinate(args['project_name'], args['shard'], log,
+        args['jobs'])
+if args['worker']:
+    print("Working on the queue in '{}' (Ctrl-C to stop)".format(
+        args['worker']))
+    shards.work(args['worker'])
 
 #-------------------------------------------------------------------------------
+# Watch the project and re-run affected stages until interrupted
+if args['watch']:
+    print('Checking if project setup is complete')
+    log = project_setup.check(args['project_name'])
+    watch.run(args['project_name'], log)
+#-------------------------------------------------------------------------------
 # Run with new utility rate only
 if args['utility']:
     print('Checking if project setup is complete')
@@ -69,13 +119,103 @@ if args['utility']:
     preprocess['utility_rate'] = create_erate.run(
         preprocess['program_manager']['timesteps'], log)
 #-------------------------------------------------------------------------------
-# Data Summary
-print("Writing files")
-data_writer.data_structure(preprocess, os.path.join(args['project_name'],
-    'project_workspace', 'preprocessor_data_structure.txt'), log)
-data_writer.write_json(preprocess,os.path.join(args['project_name'],
-    'project_workspace'), "preprocess.json", log)
-data_writer.ampl(preprocess, log)
+# Run a scenario sweep
+if args['sweep']:
+    print('Checking if project setup is complete')
+    log = project_setup.check(args['project_name'])
+    print('Executing scenario sweep')
+    sweep.run(args['project_name'], args['sweep'], log)
+
+#-------------------------------------------------------------------------------
+# Data Summary (written by the final pre-processing stage for -r)
+if args['utility']:
+    print("Writing files")
+    data_writer.data_structure(preprocess, os.path.join(args['project_name'],
+        'project_workspace', 'preprocessor_data_structure.txt'), log)
+    data_writer.write_json(preprocess,os.path.join(args['project_name'],
+        'project_workspace'), "preprocess.json", log)
+    data_writer.ampl(preprocess, log)
+#-------------------------------------------------------------------------------
+# Sample a DR event ensemble against the preprocessed community profile
+if args['ensemble']:
+    if not (args['run'] or args['utility'] or args['sweep']):
+        log = project_setup.check(args['project_name'])
+    print('Executing DR event ensemble')
+    ensemble.run(args['project_name'], args['ensemble'], log)
+#-------------------------------------------------------------------------------
+# Solve with the local solver
+if args['decompose'] or args['quick'] or args['solve']:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble']):
+        log = project_setup.check(args['project_name'])
+    with open(os.path.join(args['project_name'], 'program_manager.json'),
+        'r') as f:
+        pm = json.load(f)
+    f.close()
+    if args['decompose']:
+        print('Solving by plant-wise decomposition')
+        decompose.run(args['project_name'], log, pm.get('decomposition'))
+    if args['quick']:
+        print('Solving LP relaxation with rounding heuristic')
+        quick.run(args['project_name'], log, pm.get('quick'))
+    if args['solve']:
+        print('Running local solver job')
+        jobs.run([jobs.job(args['project_name'],
+            os.path.join(args['project_name'], 'ampl_files'),
+            os.path.join(args['project_name'], 'optimization_results'))],
+            pm.get('solver'), os.path.join(args['project_name'],
+                'project_workspace', 'solver_status.json'), log)
+#-------------------------------------------------------------------------------
+# Schedule the installed storage over the next window
+if args['operate'] is not None:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble'] or args['decompose'] or args['quick'] or
+        args['solve']):
+        log = project_setup.check(args['project_name'])
+    with open(os.path.join(args['project_name'], 'program_manager.json'),
+        'r') as f:
+        pm = json.load(f)
+    f.close()
+    print('Scheduling installed storage')
+    operate.run(args['project_name'], log, pm.get('operations'),
+        args['operate'] or None)
+#-------------------------------------------------------------------------------
+# Benchmark the local solver
+if args['benchmark']:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble'] or args['decompose'] or args['quick'] or
+        args['solve']):
+        log = project_setup.check(args['project_name'])
+    print('Executing solver benchmark')
+    bench.run(args['project_name'], args['benchmark'], log)
+#-------------------------------------------------------------------------------
+# Cost sensitivity study on one model instance
+if args['sensitivity']:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble'] or args['decompose'] or args['quick'] or
+        args['solve']):
+        log = project_setup.check(args['project_name'])
+    print('Executing cost sensitivity study')
+    sensitivity.run(args['project_name'], args['sensitivity'], log)
+#-------------------------------------------------------------------------------
+# Compute bills from solver outputs
+if args['bills']:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble'] or args['decompose'] or args['quick'] or
+        args['solve']):
+        log = project_setup.check(args['project_name'])
+    print('Computing baseline and optimal bills')
+    results.run(args['project_name'], log)
+    summaries.run(args['project_name'], log)
+#-------------------------------------------------------------------------------
+# Report the results summaries at one resolution
+if args['summary']:
+    if not (args['run'] or args['utility'] or args['sweep'] or
+        args['ensemble'] or args['decompose'] or args['quick'] or
+        args['solve'] or args['bills']):
+        log = project_setup.check(args['project_name'])
+    print('Writing {} results summaries'.format(args['summary']))
+    summaries.report(args['project_name'], args['summary'], log)
 #-------------------------------------------------------------------------------
 # Terminate Logger
 log.info("Logging terminated at {}".format(time.ctime()))
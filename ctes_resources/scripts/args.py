@@ -11,17 +11,74 @@ def args():
     parser = argparse.ArgumentParser(description="CTES Optimization Processor.")
 
     # Create arguments
+    parser.add_argument('-b', '--bills', action='store_const', const=True,
+        help='compute baseline and optimal bills from solver outputs ' \
+            'into results.json; use with -p')
+    parser.add_argument('-c', '--convert', action='store_const', const=True,
+        help='convert the building simulation .eso files to columnar ' \
+        'stores (done at setup; use after adding or replacing .eso files)')
+    parser.add_argument('-d', '--decompose', action='store_const', const=True,
+        help='solve the prepared AMPL files by plant-wise decomposition ' \
+            'with the local solver; use with -p')
+    parser.add_argument('-e', '--ensemble', type=str,
+        help='sample the DR event ensemble defined in the given JSON file ' \
+            'and export selected scenarios; use with -p after -r')
+    parser.add_argument('-f', '--fresh', action='store_const', const=True,
+        help='ignore pre-processing checkpoints and rerun every stage; use ' \
+            'with -r')
+    parser.add_argument('-g', '--worker', type=str,
+        help='run as a sharded pre-processing worker on the queue in the ' \
+        'given shared directory (see -m)')
     parser.add_argument('-i', '--input_path', type=str, action='append',
         help=('specify source directory for input building energy simulation ' \
             'files; may be used multiple times'))
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+        help='number of local worker processes to start with -m')
+    parser.add_argument('-k', '--link', type=str, default='copy',
+        choices=['copy', 'hardlink', 'reflink', 'symlink'],
+        help='how setup brings input files into the project (falls back to ' \
+        'copy where a link can not be made); use with -s')
+    parser.add_argument('-l', '--watch', action='store_const', const=True,
+        help='watch the project inputs and re-run the affected ' \
+            'pre-processing stages on every change; use with -p')
+    parser.add_argument('-m', '--shard', type=str,
+        help='run project pre-processing as the coordinator of a work ' \
+        'queue in the given shared directory; use with -p, and -j or -g')
+    parser.add_argument('-n', '--operate', type=str, nargs='?', const='',
+        help='schedule the installed storage over the next hours from the ' \
+            'given timestep or date (MM-DD[THH:MM]), or from the saved ' \
+            'operations state if none is given; use with -p after -x')
     parser.add_argument('-o', '--overwrite', action='store_const', const=True,
         help='overwrite existing project')
     parser.add_argument('-p', '--project_name', type=str,
         default='ctes_project', help='specify name of project directory')
+    parser.add_argument('-q', '--quick', action='store_const', const=True,
+        help='solve the prepared AMPL files quickly by LP relaxation and ' \
+            'rounding with the local solver; use with -p')
     parser.add_argument('-r', '--run', action='store_const', const=True,
         help='run project pre-optimization processor; use with -p')
     parser.add_argument('-s', '--setup', action='store_const', const=True,
         help='set up initial project structure; use with -i and -p')
+    parser.add_argument('-v', '--precision_check', action='store_const',
+        const=True, help='pre-process the project with float64 and float32 ' \
+        'time series and compare the AMPL files; use with -p')
+    parser.add_argument('-w', '--sweep', type=str,
+        help='run a scenario sweep defined in the given JSON file; use ' \
+            'with -p')
+    parser.add_argument('-x', '--solve', action='store_const', const=True,
+        help='run the prepared AMPL files through the locally configured ' \
+            'solver; use with -p')
+    parser.add_argument('-t', '--benchmark', type=str,
+        help='benchmark the local solver over the instances and settings ' \
+            'defined in the given JSON file; use with -p')
+    parser.add_argument('-y', '--summary', type=str,
+        choices=['hourly', 'daily', 'monthly', 'shape'],
+        help='write the community series of every result set at the given ' \
+            'resolution from the results summaries (with a plot if ' \
+            'matplotlib is installed); use with -p')
+    parser.add_argument('-z', '--sensitivity', type=str,
+        help='run the cost sensitivity study defined in the given JSON ' \
+            'file on one in-memory model with the local solver; use with -p')
     parser.add_argument('-u', '--utility', action='store_const', const=True,
         help='update utility rate only')
 
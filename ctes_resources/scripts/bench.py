@@ -0,0 +1,161 @@
+# bench.py
+# CTES Optimization Processor
+# Solver benchmark over generated model instances
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Benchmark files are JSON of the form:
+# {
+#   "label": "baseline",
+#   "instances": {"timesteps": [1, 4], "segments": [2, 3]},
+#   "ampl_files": ["../other_project/ampl_files"],
+#   "solve": {"no_full": [true, false], "zbar": [null, 2], "plants": [null],
+#             "days": [7, 28], "time_limit": [60], "mip_gap": [null],
+#             "threads": [1, 4]},
+#   "repeats": 1,
+#   "workers": 4
+# }
+# Instances are generated by pre-processing the project for every
+# combination of the "instances" settings (as a sweep does, into
+# 'benchmark/instances'); without "instances" the project's own 'ampl_files'
+# is used. "ampl_files" adds existing AMPL file folders as they are.
+#
+# Each instance is built and solved with the in-memory model (model.py) and
+# HiGHS for every combination of the "solve" settings:
+#   no_full    - restrict full storage operation to DR timesteps
+#   zbar       - upper bound on the units of each CTES type per plant
+#   plants     - number of plants to include (the first n; null for all)
+#   days       - horizon length from the start of the year (null for all)
+#   time_limit - solver time limit [s]
+#   mip_gap    - relative MIP gap
+#   threads    - solver threads
+# One row per solve is appended to 'benchmark/results.csv' (rows, columns,
+# nonzeros, build and solve times, status, objective, bound, and gap), with
+# the label and time, so runs before and after a model change can be
+# compared in the same file.
+
+import csv
+import itertools
+import json
+import os
+import time
+
+import highspy
+import numpy as np
+
+import model
+import sweep
+
+SOLVE_DEFAULTS = {
+    'no_full': [True],
+    'zbar': [None],
+    'plants': [None],
+    'days': [None],
+    'time_limit': [None],
+    'mip_gap': [None],
+    'threads': [None]
+}
+FIELDS = ['label', 'date', 'instance', 'N', 'I', 'T', 'S', 'timesteps',
+    'no_full', 'zbar', 'plants', 'days', 'time_limit', 'mip_gap', 'threads',
+    'repeat', 'rows', 'columns', 'nonzeros', 'integers', 'load_time',
+    'build_time', 'solve_time', 'status', 'objective', 'bound', 'gap']
+
+#-------------------------------------------------------------------------------
+def run(project, bench_file, log):
+    with open(bench_file, 'r') as f:
+        spec = json.load(f)
+    f.close()
+    label = spec.get('label', os.path.splitext(os.path.basename(
+        bench_file))[0])
+    path = os.path.join(project, 'benchmark')
+    os.makedirs(path, exist_ok=True)
+    instances = generate(project, spec, path, log)
+    keys = sorted(SOLVE_DEFAULTS.keys())
+    grid = dict(SOLVE_DEFAULTS, **spec.get('solve', {}))
+    settings = [dict(zip(keys, v)) for v in itertools.product(*[grid[k]
+        for k in keys])]
+    repeats = spec.get('repeats', 1)
+    msg = "Benchmark '{}': {} instances x {} settings x {} repeats".format(
+        label, len(instances), len(settings), repeats)
+    print(msg)
+    log.info(msg)
+    out = os.path.join(path, 'results.csv')
+    new = not os.path.isfile(out)
+    with open(out, 'a', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        if new:
+            writer.writeheader()
+        # Solves run one at a time so that the times are comparable
+        for name, ampl_path in instances:
+            start = time.time()
+            params = model.load(ampl_path)
+            load_time = time.time() - start
+            for s in settings:
+                for r in range(repeats):
+                    row = solve(params, s)
+                    row.update({'label': label, 'date': time.strftime(
+                        "%Y-%m-%d %H:%M:%S"), 'instance': name,
+                        'repeat': r + 1, 'load_time': round(load_time, 3)})
+                    writer.writerow(row)
+                    f.flush()
+                    log.info(" {} {}: {} in {} s, objective {}, gap " \
+                        "{}".format(name, s, row['status'],
+                        row['solve_time'], row['objective'], row['gap']))
+    f.close()
+    print("Benchmark complete: see '{}'".format(out))
+    return out
+#-------------------------------------------------------------------------------
+# Pre-process the project for each instance setting (see sweep.generate;
+# instances that fail are left out); returns (name, path) pairs
+def generate(project, spec, path, log):
+    instances = [(os.path.basename(os.path.dirname(os.path.abspath(p))), p)
+        for p in spec.get('ampl_files', [])]
+    if not spec.get('instances'):
+        if not instances:
+            instances.append((os.path.basename(os.path.abspath(project)),
+                os.path.join(project, 'ampl_files')))
+        return instances
+    scenarios = sweep.expand({'grid': spec['instances']}, tariffs=False)
+    log.info("Generating {} benchmark instances".format(len(scenarios)))
+    index = sweep.generate(project, scenarios, os.path.join(path,
+        'instances'), spec.get('workers'), log) or []
+    for s in index:
+        if s['status'] == 'written':
+            instances.append((s['name'], s['path']))
+    return instances
+#-------------------------------------------------------------------------------
+# Build and solve one instance with one set of settings; returns the
+# results row
+def solve(params, s):
+    T = params['T']
+    if s['days'] is not None:
+        params = horizon(params, s['days'])
+    if s['zbar'] is not None:
+        params = dict(params, zbar=np.minimum(params['zbar'], s['zbar']))
+    plants = None
+    if s['plants'] is not None:
+        plants = range(min(s['plants'], params['N']))
+    m = model.build(params, plants=plants, no_full=s['no_full'])
+    # Apply the thread count to a fresh solver scheduler
+    highspy.Highs.resetGlobalScheduler(True)
+    result = m.solve(time_limit=s['time_limit'], mip_gap=s['mip_gap'],
+        threads=s['threads'])
+    row = dict(s, **m.stats())
+    row.update({
+        'N': len(plants) if plants is not None else params['N'],
+        'I': params['I'],
+        'T': params['T'],
+        'S': max(params['S']),
+        'timesteps': T // 8760 if T % 8760 == 0 else '',
+        'build_time': round(m.build_time, 3),
+        'solve_time': round(result['solve_time'], 3),
+        'status': result['status']
+    })
+    for k in ['objective', 'bound', 'gap']:
+        row[k] = result[k]
+    return row
+#-------------------------------------------------------------------------------
+# Limit the model parameters to the first 'days' of the horizon
+def horizon(params, days):
+    T = params['T']
+    return model.window(params, 0, int(round(days * 24 * T / 8760)))
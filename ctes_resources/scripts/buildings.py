@@ -5,78 +5,189 @@
 # July 2021
 
 import csv
-import esoreader
 import json
 import os
-import sys
 
+import numpy as np
+
+import common
 import data_writer
+import eso_store
+
+# Parsed .eso files, kept so that repeated runs (eg. scenario sweeps) only
+# pay the text parse once per file
+eso_cache = {}
 
-def run(project, log):
+def run(project, log, overrides=None):
     log.info('Executing buildings.run')
-    # Create dictionary for all preprocess data
+    preprocess = setup(project, log, overrides)
+    preprocess["weather"] = primary_weather(project, preprocess, log)
+    # Process building energy simulation data files listed in
+    # ctes_district.csv
+    for id, bldg, type in district(project):
+        if type == "SET BEFORE RUNNING!":
+            preprocess['community']['building_names'].append(bldg)
+            print("Error! Must specify HVAC/CTES type before running.")
+        else:
+            merge(preprocess, parse(preprocess['program_manager'], bldg,
+                type, log), bldg, type)
+    # Execute district loop setup actions if any exist
+    district_output(project, preprocess, log)
+    return preprocess
+#-------------------------------------------------------------------------------
+# Program manager settings and an empty community
+def setup(project, log, overrides=None):
     preprocess = {}
-    district_flag = False
     # Load program_manager.json to obtain timestep information
     with open(os.path.join(project, 'program_manager.json'), 'r') as f:
         preprocess['program_manager'] = json.load(f)
     f.close()
+    # Apply program manager overrides (eg. from a scenario sweep)
+    if overrides:
+        preprocess['program_manager'].update(overrides)
     # Load community_schema.json and initialize indices
-    with open(os.path.join('ctes_resources', 'schemas',
+    with open(os.path.join(common.RESOURCES, 'schemas',
         'community_schema.json'), 'r') as f:
         preprocess['community'] = json.load(f)
     f.close()
-    # Get weather data
+    return preprocess
+#-------------------------------------------------------------------------------
+# Weather file names and the one used for the main project outputs
+def weather_files(project, pm):
+    wx = sorted([w for w in os.listdir(os.path.join(project,
+        'weather_files')) if w.endswith('.epw')])
+    return wx, pm.get('weather') or (wx[0] if wx else None)
+#-------------------------------------------------------------------------------
+def primary_weather(project, prep, log):
+    # With several .epw files the program manager 'weather' entry (default:
+    # first file) is used here and weathers.run processes storage for each
+    # of them
     log.info("Getting weather data")
-    wx = os.listdir(os.path.join(project, 'weather_files'))
-    if len(wx) > 1:
-        msg = 'Too many weather files present. Only one .epw allowed'
+    wx, primary = weather_files(project, prep['program_manager'])
+    if len(wx) == 0:
+        msg = 'No .epw weather file present'
         log.error(msg)
-        sys.exit(msg)
-    else:
-        preprocess["weather"] = weather(os.path.join(
-            project, 'weather_files', wx[0]),
-            preprocess['program_manager']['timesteps'], log)
-    # Open ctes_district.csv and begin processing building energy simulation
-    # data files
+        raise common.InputError(msg)
+    if primary not in wx:
+        msg = "Weather file '{}' not found".format(primary)
+        log.error(msg)
+        raise common.InputError(msg)
+    if len(wx) > 1:
+        log.info(" {} weather files present; using '{}'".format(len(wx),
+            primary))
+    return weather(os.path.join(project, 'weather_files', primary),
+        prep['program_manager']['timesteps'], log)
+#-------------------------------------------------------------------------------
+# Building id, name, and ctes type from ctes_district.csv
+def district(project):
+    rows = []
     with open(os.path.join(project, 'ctes_district.csv'), 'r') as p:
         # Skip header
         line = p.readline().strip("\n")
-        # Get first building id, name, ctes type
         line = p.readline().strip("\n")
-        # Iterate through buildings in .csv file
         while len(line.split(",")) > 1:
-            # Parse line
-            [id, bldg, type] = line.split(",")
-            preprocess['community']['building_names'].append(bldg)
-            # Call appropriate method
-            if type == 'rtu':
-                # Call rtu method
-                preprocess = rtu(preprocess, bldg, log)
-            elif type == 'chiller':
-                # Call chiller method
-                preprocess = chiller(preprocess, bldg, log)
-            elif type == "SET BEFORE RUNNING!":
-                print("Error! Must specify HVAC/CTES type before running.")
-            else:
-                # Call district cooling aggregator
-                district_flag = True
-                preprocess = district_aggregator(preprocess, bldg, type, log)
-                if type not in preprocess['community']['district_plant_names']:
-                    preprocess['community']['district_plant_names'].append(type)
-            # Advance to the next building
+            rows.append(line.split(","))
             line = p.readline().strip("\n")
-        # Execute district loop setup actions if flag exists
-        if district_flag:
-            msg = "District cooling loop identified. Program will exit so " \
-                "that you may perform district plant simulations before " \
-                "proceeding."
-            print(msg)
-            log.warning(msg)
-            for d in preprocess['community']['district_plant_names']:
-                data_writer.plant_load_profiles(d, preprocess[d],
-                    os.path.join(project, "project_workspace"), log)
-    return preprocess
+    p.close()
+    return rows
+#-------------------------------------------------------------------------------
+# Parse one building on its own; plant indices start from zero
+def parse(pm, bldg, type, log, folder='building_simulations'):
+    part = {'program_manager': pm, 'community': {'chiller_count': 0,
+        'plant_count': 0, 'rtu_count': 0}}
+    # Call appropriate method
+    if type == 'rtu':
+        part = rtu(part, bldg, log)
+    elif type == 'chiller':
+        part = chiller(part, bldg, log, folder)
+    else:
+        part = district_aggregator(part, bldg, type, log)
+    # Series go from the resampled arrays straight to float32 if the
+    # program manager asks for it. Chiller series feed the threshold tests of
+    # the discharge and charging curves, so they are reduced after storage
+    # processing instead.
+    memo = {}
+    for k in part[bldg].keys():
+        part[bldg][k] = listed(part[bldg][k], memo, None if 'chiller' in k
+            else pm)
+    return listed(part, memo)
+#-------------------------------------------------------------------------------
+# Series of a parsed building (arrays) in the form of the preprocess dict
+# (see common.from_array). Arrays shared by several keys stay shared.
+def listed(obj, memo, pm=None):
+    if isinstance(obj, dict):
+        for k in obj.keys():
+            obj[k] = listed(obj[k], memo, pm)
+        return obj
+    if isinstance(obj, np.ndarray):
+        if id(obj) not in memo:
+            memo[id(obj)] = common.from_array(obj, pm)
+        return memo[id(obj)]
+    return obj
+#-------------------------------------------------------------------------------
+# Add a parsed building to the community, offsetting its plant indices
+def merge(prep, part, bldg, type):
+    c = prep['community']
+    c['building_names'].append(bldg)
+    prep[bldg] = part[bldg]
+    if type in ['rtu', 'chiller']:
+        for k in prep[bldg].keys():
+            if 'rtu' in k or 'chiller' in k:
+                if isinstance(prep[bldg][k], dict):
+                    prep[bldg][k]['index'] += c['plant_count']
+        for k in ['chiller_count', 'plant_count', 'rtu_count']:
+            c[k] += part['community'][k]
+    else:
+        # Aggregate district cooling loads
+        if type in prep:
+            for k in prep[type].keys():
+                prep[type][k] = (np.asarray(prep[type][k], float) +
+                    np.asarray(part[type][k], float)).tolist()
+        else:
+            prep[type] = part[type]
+        if type not in c['district_plant_names']:
+            c['district_plant_names'].append(type)
+    return prep
+#-------------------------------------------------------------------------------
+# Write the load profiles of each district loop and add the district plants
+# whose simulations are finished to the community, after the buildings, as
+# chiller buildings named for the loop. 'parts' holds the parsed plants (or
+# None) in 'district_plant_names' order; without it they are parsed here.
+# Loops still waiting for their plant simulation are listed in
+# 'district_plants_pending'.
+def district_output(project, prep, log, parts=None):
+    c = prep['community']
+    c['district_plants_pending'] = []
+    for i, d in enumerate(list(c['district_plant_names'])):
+        loads = prep[d]
+        data_writer.plant_load_profiles(d, loads,
+            os.path.join(project, "project_workspace"), log)
+        part = plant(prep['program_manager'], d, log) if parts is None \
+            else parts[i]
+        if part is None:
+            c['district_plants_pending'].append(d)
+            continue
+        merge(prep, part, d, 'chiller')
+        prep[d].update(loads)
+    if c['district_plants_pending']:
+        msg = "District plant simulations needed for {}: simulate each " \
+            "plant with its load profiles from 'project_workspace' and " \
+            "save the results as 'district_plant_simulations/<loop>.eso' " \
+            "(with '<loop>_chiller<n>.dat' files); pre-processing " \
+            "continues from there when they are present".format(
+            ", ".join(c['district_plants_pending']))
+        print(msg)
+        log.warning(msg)
+    return
+#-------------------------------------------------------------------------------
+# Parse a district plant simulation, or None if it has not been run yet
+def plant(pm, dist, log):
+    folder = 'district_plant_simulations'
+    if not os.path.isfile(os.path.join(pm['project_name'], folder,
+        dist + '.eso')):
+        return None
+    log.info("Processing district plant '{}'".format(dist))
+    return parse(pm, dist, 'chiller', log, folder)
 #-------------------------------------------------------------------------------
 # Method to process buildings with district cooling
 def district_aggregator(prep, bldg, type, log):
@@ -86,10 +197,9 @@ def district_aggregator(prep, bldg, type, log):
     prep[bldg] = {}
     ts = prep['program_manager']['timesteps']
     # Open and read .eso file:
-    dd, data = esoreader.read(os.path.join(
+    dd, data = read_eso(os.path.join(
         prep['program_manager']['project_name'],'building_simulations',
-        bldg + '.eso'))
-    log.info(" Loaded .eso file")
+        bldg + '.eso'), log)
     # Get total facility electricity and check file length
     key = dd.index["TimeStep", None, "Electricity:Facility"]
     interpolate, aggregate = check_file_length(data, key, ts, log)
@@ -107,50 +217,45 @@ def district_aggregator(prep, bldg, type, log):
         data[key], ts, aggregate, interpolate, False, log)
     # Log summary values for easy/later reference and verification
     log.info(" Peak Cooling Thermal Load [kWt]: {}".format(
-        round(max(prep[bldg]["rate_cooling_district_Wt"]) /
+        round(float(prep[bldg]["rate_cooling_district_Wt"].max()) /
             1000, 2)))
     log.info(" Total Cooling Thermal Energy [MWht]: {}".format(
-        round(sum(prep[bldg]["rate_cooling_district_Wt"]) /
+        round(float(prep[bldg]["rate_cooling_district_Wt"].sum()) /
             1e6, 2)))
     log.info(" Maximum district cooling mass flow rate " \
         "[kg/s]: {}".format(
-            round(max(prep[bldg]["mass_flow_district_kg_s"]), 2)))
-    # Create district (if it doesn't exist)
-    if type in prep:
-        pass
-    else:
-        prep[type] = {}
-        prep[type]["rate_cooling_district_Wt"] = [0 for i in range(len(
-            prep[bldg]["rate_cooling_district_Wt"]))]
-        prep[type]["mass_flow_district_kg_s"] = [0 for i in range(len(
-            prep[bldg]["mass_flow_district_kg_s"]))]
-    # Aggregate results
-    for t in range(len(prep[bldg]["rate_cooling_district_Wt"])):
-        prep[type]["rate_cooling_district_Wt"][t] += (
-            prep[bldg]["rate_cooling_district_Wt"][t])
-        prep[type]["mass_flow_district_kg_s"][t] += (
-            prep[bldg]["mass_flow_district_kg_s"][t])
+            round(float(prep[bldg]["mass_flow_district_kg_s"].max()), 2)))
+    # No cooling electricity in the building; the district plant's is
+    # counted with the plant
+    prep[bldg]['rate_elec_cooling_W'] = np.zeros(len(
+        prep[bldg]['rate_electricity_W']))
+    prep[bldg]['rate_elec_non_cooling_W'] = prep[bldg]['rate_electricity_W']
+    # The district's loads (summed over its buildings by merge)
+    prep[type] = {
+        "rate_cooling_district_Wt":
+            prep[bldg]["rate_cooling_district_Wt"].copy(),
+        "mass_flow_district_kg_s": prep[bldg]["mass_flow_district_kg_s"].copy()
+    }
     return prep
 #-------------------------------------------------------------------------------
-# Method to process buildings with chillers
-def chiller(prep, bldg, log):
+# Method to process buildings (or district plants, from 'folder') with
+# chillers
+def chiller(prep, bldg, log, folder='building_simulations'):
     log.info("Processing {} for central CTES optimization".format(bldg))
     # Setup useful objects
     prep[bldg] = {}
     ts = prep['program_manager']['timesteps']
     # Open and read .eso file:
-    dd, data = esoreader.read(os.path.join(
-        prep['program_manager']['project_name'],'building_simulations',
-        bldg + '.eso'))
-    log.info(" Loaded .eso file")
+    dd, data = read_eso(os.path.join(
+        prep['program_manager']['project_name'], folder, bldg + '.eso'), log)
     # Get total facility electricity and check file length
     key = dd.index["TimeStep", None, "Electricity:Facility"]
     interpolate, aggregate = check_file_length(data, key, ts, log)
     # Load total facility electricity data into preprocessor dictionary
     prep[bldg]["rate_electricity_W"] = get_timestep_values(data[key], ts,
         aggregate, interpolate, True, log)
-    prep[bldg]['rate_elec_cooling_W'] = [0 for i in range(len(
-        prep[bldg]['rate_electricity_W']))]
+    prep[bldg]['rate_elec_cooling_W'] = np.zeros(len(
+        prep[bldg]['rate_electricity_W']))
     prep[bldg]['rate_elec_non_cooling_W'] = prep[bldg]['rate_electricity_W']
     # Get chiller cooling rates and extract chiller names
     cecr = dd.find_variable("Chiller Evaporator Cooling Rate")
@@ -164,7 +269,7 @@ def chiller(prep, bldg, log):
         prep['community']['plant_count'] += 1
         # Setup chiller schema
         c = "chiller{}".format(idx)
-        with open(os.path.join('ctes_resources', 'schemas',
+        with open(os.path.join(common.RESOURCES, 'schemas',
             'chiller_schema.json'), 'r') as f:
             prep[bldg][c] = json.load(f)
         f.close()
@@ -174,8 +279,7 @@ def chiller(prep, bldg, log):
         prep[bldg][c]['index'] = prep['community']['plant_count']
         # Load values from chillerXX.dat file
         prep[bldg][c] = chiller_data(prep[bldg][c], bldg, c, os.path.join(
-            prep['program_manager']['project_name'], 'building_simulations'),
-            log)
+            prep['program_manager']['project_name'], folder), log)
         # Load timeseries data
         # Chiller evaporator cooling rate
         key = dd.index["TimeStep", cname, "Chiller Evaporator Cooling Rate"]
@@ -204,20 +308,18 @@ def chiller(prep, bldg, log):
             prep[bldg][c]["temp_evap_inlet_C"] = get_timestep_values(
                 data[key], ts, aggregate, interpolate, False, log)
         except:
-            prep[bldg][c]["temp_evap_outlet_C"] = [
-                6.67 for i in range(len(prep[bldg][c]["rate_cooling_Wt"]))]
+            prep[bldg][c]["temp_evap_outlet_C"] = np.full(len(
+                prep[bldg][c]["rate_cooling_Wt"]), 6.67)
         # Calculate chiller cop for the timestep
-        prep[bldg][c]["cop"] = [i / j if j > 0 else 99 for i,j in zip(
-            prep[bldg][c]["rate_electricity_W"],
-            prep[bldg][c]["rate_cooling_Wt"])]
+        e = prep[bldg][c]["rate_electricity_W"]
+        q = prep[bldg][c]["rate_cooling_Wt"]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prep[bldg][c]["cop"] = np.where(q > 0, e / q, 99)
         # Total cooling electricity and non-cooling electricity rates
-        for t in range(len(prep[bldg][c]['rate_electricity_W'])):
-            prep[bldg]['rate_elec_cooling_W'][t] += (
-                prep[bldg][c]['rate_electricity_W'][t])
-            prep[bldg]['rate_elec_non_cooling_W'][t] += -(
-                prep[bldg][c]['rate_electricity_W'][t])
-            if prep[bldg][c]['rate_electricity_W'][t] > 0:
-                prep[bldg][c]['timesteps_load'].append(t+1)
+        prep[bldg]['rate_elec_cooling_W'] += e
+        prep[bldg]['rate_elec_non_cooling_W'] -= e
+        prep[bldg][c]['timesteps_load'] += (np.nonzero(e > 0)[0] +
+            1).tolist()
     return prep
 #-------------------------------------------------------------------------------
 # Method to get chiller data from chillerXX.dat files
@@ -277,18 +379,17 @@ def rtu(prep, bldg, log):
     prep[bldg] = {}
     ts = prep['program_manager']['timesteps']
     # Open and read .eso file:
-    dd, data = esoreader.read(os.path.join(
+    dd, data = read_eso(os.path.join(
         prep['program_manager']['project_name'],'building_simulations',
-        bldg + '.eso'))
-    log.info(" Loaded .eso file")
+        bldg + '.eso'), log)
     # Get total facility electricity and check file length
     key = dd.index["TimeStep", None, "Electricity:Facility"]
     interpolate, aggregate = check_file_length(data, key, ts, log)
     # Load total facility electricity data into preprocessor dictionary
     prep[bldg]['rate_electricity_W'] = get_timestep_values(data[key], ts,
         aggregate, interpolate, True, log)
-    prep[bldg]['rate_elec_cooling_W'] = [0 for i in range(len(
-        prep[bldg]['rate_electricity_W']))]
+    prep[bldg]['rate_elec_cooling_W'] = np.zeros(len(
+        prep[bldg]['rate_electricity_W']))
     prep[bldg]['rate_elec_non_cooling_W'] = prep[bldg]['rate_electricity_W']
     # Collect data variables from .eso
     cr = dd.find_variable('Cooling Coil Total Cooling Rate')
@@ -301,7 +402,7 @@ def rtu(prep, bldg, log):
         prep['community']['plant_count'] += 1
         # Setup rtu schema
         rtu = "rtu{}".format(j)
-        with open(os.path.join('ctes_resources', 'schemas',
+        with open(os.path.join(common.RESOURCES, 'schemas',
             'rtu_schema.json'), 'r') as r:
             prep[bldg][rtu] = json.load(r)
         r.close()
@@ -324,19 +425,35 @@ def rtu(prep, bldg, log):
         prep[bldg][rtu]['temp_wb_evaporator_C'] = (get_timestep_values(
                 data[key], ts, aggregate, interpolate, False, log))
         # COP
-        prep[bldg][rtu]['cop'] = [c / e if e > 0 else 99 for c,e in zip(
-            prep[bldg][rtu]['rate_cooling_Wt'],
-            prep[bldg][rtu]['rate_electricity_W'])]
+        # (interpolation can leave zero cooling with residual electricity)
+        q = prep[bldg][rtu]['rate_cooling_Wt']
+        e = prep[bldg][rtu]['rate_electricity_W']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prep[bldg][rtu]['cop'] = np.where((e > 0) & (q > 0), q / e, 99)
         # Total cooling electricity and non-cooling electricity rates
-        for t in range(len(prep[bldg][rtu]['rate_electricity_W'])):
-            prep[bldg]['rate_elec_cooling_W'][t] += (
-                prep[bldg][rtu]['rate_electricity_W'][t])
-            prep[bldg]['rate_elec_non_cooling_W'][t] += -(
-                prep[bldg][rtu]['rate_electricity_W'][t])
-            if prep[bldg][rtu]['rate_electricity_W'][t] > 0:
-                prep[bldg][rtu]['timesteps_load'].append(t+1)
+        prep[bldg]['rate_elec_cooling_W'] += e
+        prep[bldg]['rate_elec_non_cooling_W'] -= e
+        prep[bldg][rtu]['timesteps_load'] += (np.nonzero(e > 0)[0] +
+            1).tolist()
     return prep
 #-------------------------------------------------------------------------------
+# Method to read an .eso file from its columnar store (see eso_store.py),
+# reusing a previous read if unchanged. The text file is parsed, and the
+# store written, only if the store is missing or out of date.
+def read_eso(path, log):
+    stamp = os.path.getmtime(path)
+    if path in eso_cache and eso_cache[path][0] == stamp:
+        log.info(" Reused parsed .eso file")
+        return eso_cache[path][1]
+    store = eso_store.load(path)
+    if store is None:
+        store = eso_store.convert(path)
+        log.info(" Loaded .eso file and wrote its columnar store")
+    else:
+        log.info(" Loaded .eso columnar store")
+    eso_cache[path] = (stamp, store)
+    return eso_cache[path][1]
+#-------------------------------------------------------------------------------
 def check_file_length(data, key, ts, log):
     # This script checks the .eso for length and timestep
     # Can't handle .eso's with multiple run periods though...
@@ -345,7 +462,7 @@ def check_file_length(data, key, ts, log):
     if len(data[key]) < 8760 or len(data[key]) % 8760 != 0:
         log.error(" .eso file does not contain a 1-year simulation")
         log.info("Program terminated early!")
-        sys.exit("Failed in 'get_sim_data' module")
+        raise common.InputError("Failed in 'get_sim_data' module")
     elif len(data[key]) < 8760 * ts:
         log.warning(" Building simulation timestep is greater than the " \
                     "desired optimization timestep. " \
@@ -358,7 +475,7 @@ def check_file_length(data, key, ts, log):
             log.error(" Building simulation and optimization timesteps " \
                 "must be factors of each other")
             log.info("Program terminated early!")
-            sys.exit("Timestep mis-match (interpolator)")
+            raise common.InputError("Timestep mis-match (interpolator)")
     elif len(data[key]) > 8760 * ts:
         log.info(" Building simulation data is of greater precision than " \
                  "the optimization timestep; data will be aggregated " \
@@ -369,7 +486,7 @@ def check_file_length(data, key, ts, log):
             log.error(" Building simulation and optimization timesteps " \
                 "must be factors of each other")
             log.info("Program terminated early!")
-            sys.exit("Timestep mis-match (aggregator)")
+            raise common.InputError("Timestep mis-match (aggregator)")
     elif len(data[key]) == 8760 * ts:
         aggregate = 1
         log.info(" Simulation and optimization timesteps match")
@@ -384,7 +501,8 @@ def missing_variable(key, required, log):
         log.error(" Timestep data for the required variable '{}' was not " \
             "found in the .eso".format(key))
         log.info("Program terminated early!")
-        sys.exit("Failed to find all required simulation output variables")
+        raise common.InputError(
+            "Failed to find all required simulation output variables")
     else:
         log.info(" Timestep data for optional variable '{}' was not " \
             "found in the .eso".format(key))
@@ -393,30 +511,23 @@ def missing_variable(key, required, log):
 def get_timestep_values(values, ts, aggregate, interpolate,
     convertJtoW, log):
     # This method gets the pertinent timestep values and processes them either
-    # by aggregation/averaging or interpolation
+    # by aggregation/averaging or interpolation, as a new float64 array
+    values = np.asarray(values, dtype=np.float64)
     # perform conversion from energy [J] to power [W]
     if convertJtoW:
         ts_sim = len(values) // 8760
-        values = [v * ts_sim / 3600 for v in values]
+        values = values * ts_sim / 3600
     # perform aggregation (all terms must be in units of power)
     if aggregate >= 1:
-        opt_vals = []
-        for i in range((ts * 8760)):
-            v = 0
-            for j in range(aggregate):
-                v += float(values[i*aggregate + j]) / aggregate
-            opt_vals.append(v)
-    # perform interpolation (all terms must be in units of power)
+        opt_vals = (values[:ts * 8760 * aggregate] / aggregate).reshape(
+            ts * 8760, aggregate).sum(axis=1)
+    # perform interpolation (all terms must be in units of power): the
+    # first value is repeated, then each value ramps from the previous one
     if interpolate > 1:
-        opt_vals = []
-        for i in range(len(values)):
-            if len(opt_vals) == 0:
-                for j in range(interpolate):
-                    opt_vals.append(values[i])
-            else:
-                delta = (values[i] - values[i-1]) / interpolate
-                for j in range(interpolate):
-                    opt_vals.append(opt_vals[-1] + delta)
+        delta = np.repeat(np.diff(values, prepend=values[:1]) / interpolate,
+            interpolate)
+        delta[0] = values[0]
+        opt_vals = np.add.accumulate(delta)
     return opt_vals
 #-------------------------------------------------------------------------------
 # Method to get wet and drybulb temps from weather file (.epw)
@@ -445,7 +556,7 @@ def weather(wx, ts, log):
         log.error("The wetbulb and drybulb temperature arrays are not of " \
                   "equal length.")
         log.info("Program terminated early!")
-        sys.exit("Failed in 'get_wx' module.")
+        raise common.InputError("Failed in 'get_wx' module.")
     log.info("The following data was extracted from the weather file:")
     log.info(" * {} wetbulb temperatures".format(len(Twb)))
     log.info(" * {} drybulb temperatures".format(len(Tdb)))
@@ -0,0 +1,141 @@
+# cluster.py
+# CTES Optimization Processor
+# Collapse near-identical RTUs into weighted aggregate plants
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import copy
+import numpy as np
+
+import common
+
+#-------------------------------------------------------------------------------
+def run(prep, log):
+    # Optional reduction stage, configured in program_manager.json as
+    # "cluster": {"scope": "building" or "community", "tolerance": 0.05}
+    settings = prep['program_manager'].get('cluster')
+    if not settings:
+        return prep
+    scope = settings.get('scope', 'building')
+    tol = settings.get('tolerance', 0.05)
+    log.info("Clustering RTUs by {} with tolerance {}".format(scope, tol))
+    # Group candidate RTUs by building or across the community
+    groups = {}
+    for b in prep['community']['building_names']:
+        for k in prep[b].keys():
+            if 'rtu' in k:
+                g = b if scope == 'building' else 'community'
+                groups.setdefault(g, []).append((b, k))
+    # Cluster each group and replace members with an aggregate plant
+    prep['community']['plant_clusters'] = []
+    count = 0
+    for g in groups.values():
+        for members in leader_clusters(prep, g, tol):
+            count += len(members)
+            prep['community']['plant_clusters'].append(
+                aggregate(prep, members))
+    # Renumber plant indices in writer order
+    index = 0
+    prep['community']['rtu_count'] = 0
+    for b in prep['community']['building_names']:
+        for k in prep[b].keys():
+            if 'rtu' in k or 'chiller' in k:
+                index += 1
+                prep[b][k]['index'] = index
+                if 'rtu' in k:
+                    prep['community']['rtu_count'] += 1
+    prep['community']['plant_count'] = index
+    for c in prep['community']['plant_clusters']:
+        c['index'] = prep[c['building']][c['plant']]['index']
+    # Report the reduction and the accuracy loss (the largest profile
+    # distance of a member from the plant standing in for it)
+    worst = max([c['max_deviation'] for c in
+        prep['community']['plant_clusters']] + [0])
+    msg = "Clustering reduced {} RTUs to {} plants (max profile deviation " \
+        "{:.2%}, tolerance {:.2%})".format(count,
+        prep['community']['rtu_count'], worst, tol)
+    print(msg)
+    log.info(msg)
+    return prep
+#-------------------------------------------------------------------------------
+# Greedy leader clustering; plants join the first leader within tolerance
+def leader_clusters(prep, plants, tol):
+    # Largest plants lead their clusters
+    plants = sorted(plants, key=lambda p: -sum(
+        prep[p[0]][p[1]]['rate_cooling_Wt']))
+    leaders = []
+    clusters = []
+    for p in plants:
+        for i in range(len(leaders)):
+            if distance(prep[p[0]][p[1]], prep[leaders[i][0]][
+                leaders[i][1]]) <= tol:
+                clusters[i].append(p)
+                break
+        else:
+            leaders.append(p)
+            clusters.append([p])
+    return clusters
+#-------------------------------------------------------------------------------
+# Largest normalized RMS difference between load, COP and wetbulb profiles
+def distance(a, b):
+    la = np.asarray(a['rate_cooling_Wt'], dtype=float)
+    lb = np.asarray(b['rate_cooling_Wt'], dtype=float)
+    d_load = rms(la - lb) / max(rms(lb), 1e-6)
+    # COP only compared where both units run (99 is the no-load sentinel)
+    on = (la > 0) & (lb > 0)
+    if on.any():
+        ca = np.asarray(a['cop'], dtype=float)[on]
+        cb = np.asarray(b['cop'], dtype=float)[on]
+        d_cop = rms(ca - cb) / max(rms(cb), 1e-6)
+    else:
+        d_cop = 0 if not (la > 0).any() and not (lb > 0).any() else 1
+    wa = np.asarray(a['temp_wb_evaporator_C'], dtype=float)
+    wb = np.asarray(b['temp_wb_evaporator_C'], dtype=float)
+    d_wb = rms(wa - wb) / max(np.ptp(wb), 1)
+    return max(d_load, d_cop, d_wb)
+#-------------------------------------------------------------------------------
+def rms(v):
+    return float(np.sqrt(np.mean(np.square(v))))
+#-------------------------------------------------------------------------------
+# Replace cluster members with a single aggregate plant in the leader's place
+def aggregate(prep, members):
+    b, k = members[0]
+    leader = prep[b][k]
+    agg = copy.deepcopy(leader)
+    # Sums in double precision (members may hold float32 series)
+    load = np.sum([prep[m[0]][m[1]]['rate_cooling_Wt'] for m in members],
+        axis=0, dtype=float)
+    elec = np.sum([prep[m[0]][m[1]]['rate_electricity_W'] for m in members],
+        axis=0, dtype=float)
+    agg['rate_cooling_Wt'] = load.tolist()
+    agg['rate_electricity_W'] = elec.tolist()
+    agg['temp_wb_evaporator_C'] = np.mean([prep[m[0]][m[1]][
+        'temp_wb_evaporator_C'] for m in members], axis=0,
+        dtype=float).tolist()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        agg['cop'] = np.where((elec > 0) & (load > 0), load / elec,
+            99).tolist()
+    agg['timesteps_load'] = [t + 1 for t in range(len(elec)) if elec[t] > 0]
+    # Units charging in parallel (scales the plant charging limit, see
+    # data_writer.ampl)
+    agg['multiplicity'] = len(members)
+    # Record the mapping back to the original plants
+    cluster = {
+        'building': b,
+        'plant': k,
+        'multiplicity': len(members),
+        'members': [],
+        'max_deviation': max([distance(prep[m[0]][m[1]], leader)
+            for m in members])
+    }
+    for m in members:
+        cluster['members'].append({
+            'building': m[0],
+            'plant': m[1],
+            'name': prep[m[0]][m[1]]['name'],
+            'index': prep[m[0]][m[1]]['index']
+        })
+        del prep[m[0]][m[1]]
+    agg['members'] = [m['name'] for m in cluster['members']]
+    prep[b][k] = common.compact(agg, prep['program_manager'])
+    return cluster
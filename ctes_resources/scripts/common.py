@@ -0,0 +1,125 @@
+# common.py
+# CTES Optimization Processor
+# Shared resource location, error types, and helpers
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import array
+import logging
+import logging.handlers
+import multiprocessing
+import os
+
+import numpy as np
+
+# 'ctes_resources' directory, independent of the working directory
+RESOURCES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#-------------------------------------------------------------------------------
+# Errors raised in place of exiting the interpreter; ctes.py reports them as
+# before, and pipeline.Pipeline callers may catch them per project
+class CtesError(Exception):
+    pass
+
+# Project missing or not set up
+class SetupError(CtesError):
+    pass
+
+# Building simulation or weather inputs that can not be processed
+class InputError(CtesError):
+    pass
+
+# Utility rate that can not be generated
+class TariffError(CtesError):
+    pass
+
+# Processed plant models that fail the checks in validate.py
+class ValidationError(CtesError):
+    pass
+
+#-------------------------------------------------------------------------------
+# Worker processes log through the logging module. A pool started with
+# initializer=log_worker and initargs=(queue,), for the queue of
+# log_listener(log), sends their records back to 'log' (a logger, or the
+# logging module for the root logger) in this process. Stop the returned
+# listener once the pool is shut down.
+def log_listener(log):
+    queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(queue, Forward(log if
+        isinstance(log, logging.Logger) else logging.getLogger()))
+    listener.start()
+    return queue, listener
+#-------------------------------------------------------------------------------
+def log_worker(queue):
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(logging.handlers.QueueHandler(queue))
+    root.setLevel(logging.DEBUG)
+#-------------------------------------------------------------------------------
+# Handler passing records on to a logger
+class Forward(logging.Handler):
+    def __init__(self, log):
+        logging.Handler.__init__(self)
+        self.log = log
+
+    def emit(self, record):
+        self.log.handle(record)
+#-------------------------------------------------------------------------------
+# Annualized cost of one unit of each CTES type [$/yr]. Types without a plant
+# are written with zero cost, capacity, and lifetime; their cost is zero
+# rather than 0/0.
+def unit_cost(k, qbar, yrs):
+    k, qbar, yrs = np.broadcast_arrays(np.asarray(k, float),
+        np.asarray(qbar, float), np.asarray(yrs, float))
+    return np.divide(k * qbar, yrs, out=np.zeros(yrs.shape), where=yrs > 0)
+#-------------------------------------------------------------------------------
+# Storage product keys from a program manager 'utss' or 'ctes' entry, which
+# may be one ctes_types.json key or a list of them
+def products(value):
+    if isinstance(value, list):
+        return value
+    return [value]
+#-------------------------------------------------------------------------------
+# Reduce the time series in 'obj' (a dict, modified in place, or a list) to
+# float32 if the program manager asks for it (see precision.py). Lists shared
+# by several keys stay shared.
+def compact(obj, pm, memo=None):
+    if pm.get('precision') != 'float32':
+        return obj
+    if memo is None:
+        memo = {}
+    T = 8760 * pm['timesteps']
+    if isinstance(obj, dict):
+        for k in obj.keys():
+            obj[k] = compact(obj[k], pm, memo)
+        return obj
+    if not isinstance(obj, list) or len(obj) != T:
+        return obj
+    if id(obj) not in memo:
+        if series(obj):
+            memo[id(obj)] = array.array('f', obj)
+        elif (all([isinstance(v, list) and numbers(v) for v in obj]) and
+            any([series(v) for v in obj])):
+            memo[id(obj)] = [array.array('f', v) for v in obj]
+        else:
+            memo[id(obj)] = obj
+    return memo[id(obj)]
+#-------------------------------------------------------------------------------
+# A time series parsed as an array, in the form compact leaves it: an
+# array.array('f') if the program manager asks for float32, else a list
+def from_array(a, pm=None):
+    if (pm is not None and pm.get('precision') == 'float32' and
+        len(a) == 8760 * pm['timesteps']):
+        f = array.array('f')
+        f.frombytes(np.ascontiguousarray(a, dtype=np.float32).tobytes())
+        return f
+    return a.tolist()
+#-------------------------------------------------------------------------------
+# A list of numbers that are not all integers (timestep sets stay lists)
+def series(v):
+    return numbers(v) and any([isinstance(i, float) for i in v])
+#-------------------------------------------------------------------------------
+def numbers(v):
+    return all([isinstance(i, (int, float)) and not isinstance(i, bool)
+        for i in v])
@@ -11,9 +11,15 @@ import csv
 import datetime
 import os
 import random
-import sys
 
-def run(ts_opt, log):
+import common
+
+def run(ts_opt, log, tariff=None):
+    # 'tariff' optionally overrides the rate structure below. Each of the
+    # 'energy' and 'demand' entries is a list of periods of the form
+    # {"rate": $, "months": [...], "days": [...], "hours": [...]}.
+    # 'dr_events' maps month to event days; 'dr_rate' and 'dr_hours' set the
+    # energy charge and hours for those events.
     # set up eSrates hash/dict:
     erates = {"energy_cost": [],
         "demand_cost": [],
@@ -56,11 +62,35 @@ def run(ts_opt, log):
     # log.info(" Demand response events are signaled via demand charges")
 
     # Special energy charge periods
-    e_tou.extend([0.25 for i in range(4)])
-    e_months.extend([[6], [7], [8], [9]])
-    e_dom.extend([[7,16,30], [11,18,26],
-        [4,23,30], [7,20,26]])
-    e_peak.extend([list(range(15,20)) for i in range(4)])
+    dr_rate = 0.25
+    dr_hours = list(range(15,20))
+    dr_events = {6: [7,16,30], 7: [11,18,26], 8: [4,23,30], 9: [7,20,26]}
+
+    # Apply tariff specification
+    if tariff:
+        if 'energy' in tariff:
+            e_tou = [p['rate'] for p in tariff['energy']]
+            e_months = [p['months'] for p in tariff['energy']]
+            e_dom = [p['days'] for p in tariff['energy']]
+            e_peak = [p['hours'] for p in tariff['energy']]
+        if 'demand' in tariff:
+            d_cost = [p['rate'] for p in tariff['demand']]
+            d_months = [p['months'] for p in tariff['demand']]
+            d_days = [p['days'] for p in tariff['demand']]
+            d_peak = [p['hours'] for p in tariff['demand']]
+        dr_rate = tariff.get('dr_rate', dr_rate)
+        dr_hours = tariff.get('dr_hours', dr_hours)
+        if 'dr_events' in tariff:
+            dr_events = {int(m): v for m, v in tariff['dr_events'].items()}
+        log.info(" Tariff specification applied: {}".format(tariff))
+
+    # Energy periods from this index on are demand response events
+    dr_start = len(e_tou)
+    for m in sorted(dr_events.keys()):
+        e_tou.append(dr_rate)
+        e_months.append([m])
+        e_dom.append(dr_events[m])
+        e_peak.append(dr_hours)
     log.info(" Demand response events are signaled via TOU energy charges")
 
     # Determine total number of timesteps from ts per hour
@@ -85,12 +115,12 @@ def run(ts_opt, log):
                         # Add time-of-day escalating perturbations
                         perturb = (h % 23) * 0.00001
                         rate[t] = e_tou[j] + perturb
-                        if rate[t] > 0.24:
+                        if j >= dr_start:
                             erates["DR_timesteps"].append(t + 1)
                 except:
                     log.error("Failed to generate TOU energy rates.")
                     log.info("Program terminated early!")
-                    sys.exit("See log file.")
+                    raise common.TariffError("See log file.")
 
         erates["energy_cost"].extend(rate)
 
@@ -127,60 +157,3 @@ def run(ts_opt, log):
         log.info(" {} demand periods were created".format(len(d_sets)))
 
     return erates
-
-    #
-    #
-    #     file3 = open('ampl inputs/Tp.dat', 'w', newline='')
-    #     with file3:
-    #         writer = csv.writer(file3, dialect='excel')
-    #         for j in range(len(d_peak)):
-    #             writer.writerow([i for i in d_sets[j]])
-    #
-    #     file0 = open(amp_path + 'fixed_params.dat', 'a', newline='')
-    #     with file0:
-    #         wrt = csv.writer(file0, dialect='excel')
-    #         wrt.writerow([len(d_counts)])
-    #         wrt.writerow(d_cost)
-    #         wrt.writerow(d_counts)
-    #     log.info("The fixed parameter file was successfully updated.")
-    #
-    # ## Calculate baseline electricity costs
-    # profile = []
-    # with open(amp_path + 'district_power.dat', 'r', newline='') as file4:
-    #     for line in file4:
-    #         profile.append(float(line.rstrip()))
-    # if len(profile) != opt_steps:
-    #     print("Array Length ERROR!!! Line 114")
-    # base_d_cost = [0 for i in range(len(d_cost))]
-    # base_e_cost = sum([profile[i] * rate[i] / ts_opt for i in range(len(profile))])
-    # for i in range(len(d_cost)):
-    #     base_d_cost[i] = d_cost[i] * max([profile[j-1] for j in d_sets[i]])
-    #
-    # ## Write baseline costs to file
-    # with open(pre_path + 'basecosts.dat', 'w') as file0:
-    #     file0.write(str(round(sum(base_d_cost, base_e_cost),2)) + "\n")
-    #     file0.write(str(round(base_e_cost,2)) + "\n")
-    #     file0.write(str(round(sum(base_d_cost),2)))
-    #
-    # ## Calculate baseline non-cooling electricity costs
-    # profile_cool = []
-    # with open(pre_path + 'district_power_coils.dat', 'r', newline='') as file5:
-    #     for line in file5:
-    #         profile_cool.append(float(line.rstrip()))
-    # profile_nocool = [(profile[i] - profile_cool[i]) for i in range(len(profile))]
-    # if len(profile_nocool) != opt_steps:
-    #     print("Array Length ERROR!!! Line 133")
-    # nocool_d_cost = [0 for i in range(len(d_cost))]
-    # nocool_e_cost = sum([profile_nocool[i] * rate[i] / ts_opt for i in range(len(profile_nocool))])
-    # for i in range(len(d_cost)):
-    #     nocool_d_cost[i] = d_cost[i] * max([profile_nocool[j-1] for j in d_sets[i]])
-    #
-    # ## Calculate baseline costs due exclusively to cooling
-    # cool_e_cost = base_e_cost - nocool_e_cost
-    # cool_d_cost = [base_d_cost[i] - nocool_d_cost[i] for i in range(len(base_d_cost))]
-    #
-    # ## Write baseline cooling costs to file
-    # with open(pre_path + 'basecosts_cool.dat', 'w') as file9:
-    #     file9.write(str(round(sum(cool_d_cost, cool_e_cost),2)) + "\n")
-    #     file9.write(str(round(cool_e_cost,2)) + "\n")
-    #     file9.write(str(round(sum(cool_d_cost),2)))
@@ -4,15 +4,27 @@
 # Karl Heine, kheine@mines.edu, heinek@erau.edu
 # July 2021
 
+import array
 import csv
+import hashlib
+import io
 import json
 import os
 
+import common
+
+# Default charging limit (kWt per unit) of each storage class, used when a
+# product in ctes_types.json has no 'rate_charge_limit_kWt'
+QIX = {'utss': 20, 'central': 71}
+# Manifests of the output directories currently being written by ampl()
+manifests = {}
+
 #-------------------------------------------------------------------------------
 def write_json(dictionary, path, filename, log):
     log.info("Writing file: {}".format(filename))
     with open(os.path.join(path,filename), 'w') as f:
-        json.dump(dictionary, f)
+        # float32 time series (see precision.py) are written as lists
+        json.dump(dictionary, f, default=list)
     f.close()
     return
 #-------------------------------------------------------------------------------
@@ -24,38 +36,127 @@ def plant_load_profiles(dname, district, path, log):
     return
 #-------------------------------------------------------------------------------
 def multiline(vals, path, filename, log):
-    with open(os.path.join(path, filename), "w", newline="") as f:
-        wtr = csv.writer(f, delimiter=" ")
-        for i in range(len(vals)):
-            wtr.writerow([vals[i]])
+    f = io.StringIO(newline="")
+    wtr = csv.writer(f, delimiter=" ")
+    for i in range(len(vals)):
+        wtr.writerow([vals[i]])
+    put(f.getvalue(), path, filename)
 
     log.info(" Successfully wrote {} values to file '{}' in '{}'".format(
         len(vals), filename, path))
     return
 #-------------------------------------------------------------------------------
 def multiline_lists(vals, path, filename, log):
-    with open(os.path.join(path, filename), "w", newline="") as f:
-        wtr = csv.writer(f, delimiter=",")
-        for i in range(len(vals)):
-            wtr.writerow(vals[i])
+    f = io.StringIO(newline="")
+    wtr = csv.writer(f, delimiter=",")
+    for i in range(len(vals)):
+        wtr.writerow(vals[i])
+    put(f.getvalue(), path, filename)
 
     log.info(" Successfully wrote {} lists to file '{}' in '{}'".format(
         len(vals), filename, path))
     return
 #-------------------------------------------------------------------------------
-def ampl(prep, log):
-    # Writes all the files for use by AMPL
+# Write text to a file, unless the directory's manifest shows the file
+# already holds it and it has not been modified since; changed files are
+# replaced atomically
+def put(text, path, filename):
+    data = text.encode()
+    target = os.path.join(path, filename)
+    man = manifests.get(os.path.abspath(path))
+    if man is None:
+        with open(target, 'wb') as f:
+            f.write(data)
+        f.close()
+        return
+    digest = hashlib.sha1(data).hexdigest()
+    old = man['previous'].get(filename, {})
+    if (old.get('sha1') == digest and os.path.isfile(target) and
+        stamp(target) == (len(data), old.get('mtime'))):
+        man['files'][filename] = old
+        man['skipped'] += len(data)
+        man['skipped_ct'] += 1
+        return
+    tmp = target + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    f.close()
+    os.replace(tmp, target)
+    man['files'][filename] = {'sha1': digest, 'bytes': len(data),
+        'mtime': stamp(target)[1]}
+    man['written'] += len(data)
+    man['written_ct'] += 1
+    return
+#-------------------------------------------------------------------------------
+# Size and modification time [ns] of a file
+def stamp(target):
+    st = os.stat(target)
+    return (st.st_size, st.st_mtime_ns)
+#-------------------------------------------------------------------------------
+# Start and finish change-aware writing to a directory
+# ('manifest.json' holds the digest, size, and modification time of each file
+# written). Files in the previous manifest that are not written again (eg.
+# plant files after the plant count shrinks) are removed on closing.
+def open_manifest(path):
+    previous = {}
+    try:
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            previous = json.load(f)
+        f.close()
+    except (OSError, ValueError):
+        pass
+    # An interrupted write leaves a manifest of names only, so every file is
+    # rewritten next time and stale files are still found
+    if os.path.isfile(os.path.join(path, 'manifest.json')):
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump({k: {} for k in previous.keys()}, f, indent=1,
+                sort_keys=True)
+        f.close()
+    manifests[os.path.abspath(path)] = {'previous': previous, 'files': {},
+        'written': 0, 'written_ct': 0, 'skipped': 0, 'skipped_ct': 0,
+        'removed_ct': 0}
+#-------------------------------------------------------------------------------
+def close_manifest(path, log):
+    man = manifests.pop(os.path.abspath(path))
+    for filename in sorted(man['previous'].keys()):
+        if (filename not in man['files'] and
+            os.path.isfile(os.path.join(path, filename))):
+            os.remove(os.path.join(path, filename))
+            man['removed_ct'] += 1
+            log.info(" Removed stale file '{}' in '{}'".format(filename,
+                path))
+    tmp = os.path.join(path, 'manifest.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(man['files'], f, indent=1, sort_keys=True)
+    f.close()
+    os.replace(tmp, os.path.join(path, 'manifest.json'))
+    log.info("AMPL files: {} written ({:.2f} MB), {} unchanged ({:.2f} MB) " \
+        "skipped, {} stale removed".format(man['written_ct'],
+        man['written'] / 1e6, man['skipped_ct'], man['skipped'] / 1e6,
+        man['removed_ct']))
+    return man
+#-------------------------------------------------------------------------------
+def ampl(prep, log, ampl_path=None):
+    # Writes all the files for use by AMPL (to the project's ampl_files folder
+    # unless another path is given)
     # Create useful variables, lists, and locally-used dictionaries
     segments = []
+    segs_fixed = 0
+    segs_used = 0
     T_full_ct = []
     T_part_ct = []
-    yrs = {'utss': 0, 'central': 0}
-    k = {'utss': 0, 'central': 0}
-    z_bar = {'utss': [], 'central': []}
-    qbar = {'utss': 0, 'central': 0}
+    # Storage types I: each UTSS product, then each central CTES product
+    pm = prep['program_manager']
+    types = [('utss', p) for p in common.products(pm['utss'])] + \
+        [('central', p) for p in common.products(pm['ctes'])]
+    consts = {'yrs': [0 for t in types], 'k': [0 for t in types],
+        'qbar': [0 for t in types], 'qIX': [QIX[c] for c, p in types],
+        'zbar': [[] for t in types]}
     # Define write path
-    project_path = prep['program_manager']['project_name']
-    ampl_path = os.path.join(project_path, 'ampl_files')
+    if ampl_path is None:
+        project_path = prep['program_manager']['project_name']
+        ampl_path = os.path.join(project_path, 'ampl_files')
+    open_manifest(ampl_path)
     ## Timeseries values
     # Community aggregate power demand profile (W->kW)
     vals = [round(v / 1000, 2) for v in prep['community']['rate_electricity_W']]
@@ -70,8 +171,12 @@ def ampl(prep, log):
     vals = prep['utility_rate']["DR_timesteps"]
     multiline(vals, ampl_path, "Tr.dat", log)
     # Timeseries by cooling plant (rtu, chiller, or district plant)
+    plants = []
     for b in prep['community']['building_names']:
         for n in prep[b]:
+            if 'rtu' in n or 'chiller' in n:
+                plants.append({'index': prep[b][n]['index'], 'key':
+                    "{}/{}".format(b, prep[b][n]['name'])})
             if 'rtu' in n:
                 # Electricity Rate (W->kW)
                 vals = [round(v / 1000, 2) for v in
@@ -83,19 +188,26 @@ def ampl(prep, log):
                     prep[b][n]['rate_cooling_Wt']]
                 multiline(vals, ampl_path, "l{}.dat".format(
                     prep[b][n]['index']), log)
-                # Max Charging Rate (Wt->kWt)
-                vals = [round(v / 1000, 2) for v in
+                # Max Charging Rate (Wt->kWt) of all the units an aggregate
+                # plant stands for (see cluster.py)
+                m = prep[b][n]['multiplicity']
+                vals = [round(m * v / 1000, 2) for v in
                     prep[b][n]['utss']['rate_charge_max_Wt']]
                 multiline(vals, ampl_path, "qNX{}.dat".format(
                     prep[b][n]['index']), log)
-                # Max Discharging Rate (Wt->kWt)
-                vals = [round(v / 1000, 2) for v in
-                    prep[b][n]['utss']['rate_discharge_max_Wt']]
-                multiline(vals, ampl_path, "qIY{}.dat".format(
+                # Max Discharging Rate by storage type (Wt->kWt)
+                vals = storage_types(types, 'utss', prep[b][n]['utss'],
+                    prep[b][n]['utss']['rate_discharge_max_Wt'], consts)
+                multiline_lists(vals, ampl_path, "qIY{}.dat".format(
                     prep[b][n]['index']), log)
+                vals = [max(v) for v in vals]
                 multiline(vals, ampl_path, "lbar{}.dat".format(
                     prep[b][n]['index']), log)
                 segments.append(1)
+                # Segments used by timestep
+                vals = [1 for v in prep[b][n]['rate_cooling_Wt']]
+                multiline(vals, ampl_path, "St{}.dat".format(
+                    prep[b][n]['index']), log)
                 # Charging Efficiency
                 vals = [round(1/v, 5) for v in prep[b][n]['utss']['cop_charge']]
                 multiline(vals, ampl_path, "lambdaX{}.dat".format(
@@ -114,15 +226,6 @@ def ampl(prep, log):
                     8760 * prep['program_manager']['timesteps'])])
                 multiline_lists(Tsets, ampl_path, "Tsets{}.dat".format(
                     prep[b][n]['index']), log)
-                # Get lifespan of utss
-                if yrs['utss'] == 0:
-                    yrs['utss'] = prep[b][n]['utss']['lifespan_yrs']
-                    k['utss'] = prep[b][n]['utss']['cost_per_kWt']
-                    qbar['utss'] = round(
-                        prep[b][n]['utss']['capacity_nominal_Wt'] / 1000, 2)
-                # Set z_bar values
-                z_bar['utss'].append(prep[b][n]['utss']['install_limit'])
-                z_bar['central'].append(0)
             elif 'chiller' in n:
                 # Electricity Rate (W->kW)
                 vals = [round(v / 1000, 2) for v in
@@ -139,22 +242,26 @@ def ampl(prep, log):
                     prep[b][n]['charging_performance']['rate_cooling_max_Wt']]
                 multiline(vals, ampl_path, "qNX{}.dat".format(
                     prep[b][n]['index']), log)
-                # Max Discharging Rate
-                vals = [round(v / 1000, 2) for v in prep[b][n]
-                    ['discharging_performance']['rate_discharge_max_Wt']]
-                multiline(vals, ampl_path, "qIY{}.dat".format(
+                # Max Discharging Rate by storage type (Wt->kWt)
+                vals = storage_types(types, 'central', prep[b][n]['ctes'],
+                    prep[b][n]['discharging_performance']
+                    ['rate_discharge_max_Wt'], consts)
+                multiline_lists(vals, ampl_path, "qIY{}.dat".format(
                     prep[b][n]['index']), log)
                 # Charging Efficiency
                 vals = [round(v, 5) for v in
                     prep[b][n]['charging_performance']['slope']]
                 multiline(vals, ampl_path, "lambdaX{}.dat".format(
                     prep[b][n]['index']), log)
-                # Discharging Efficiency
+                # Discharging Efficiency (rows padded to the maximum number
+                # of segments when adaptive linearization is used)
+                S = prep['program_manager']['segments']
                 vals = []
                 for s in range(len(prep[b][n]
                     ['discharging_performance']['slopes'])):
                     vals.append([round(i, 5) for i in prep[b][n]
                         ['discharging_performance']['slopes'][s]])
+                    vals[-1].extend([0 for i in range(S - len(vals[-1]))])
                 multiline_lists(vals, ampl_path, "lambdaY{}.dat".format(
                     prep[b][n]['index']), log)
                 # Discharging Efficiency Ranges (Wt->kWt)
@@ -163,9 +270,19 @@ def ampl(prep, log):
                     ['discharging_performance']['ranges'])):
                     vals.append([round(i / 1000, 5) for i in prep[b][n]
                         ['discharging_performance']['ranges'][s]])
+                    vals[-1].extend([0 for i in range(S - len(vals[-1]))])
                 multiline_lists(vals, ampl_path, "lbar{}.dat".format(
                     prep[b][n]['index']), log)
-                segments.append(prep['program_manager']['segments'])
+                segments.append(S)
+                # Segments used by timestep
+                vals = [len(v) for v in
+                    prep[b][n]['discharging_performance']['slopes']]
+                multiline(vals, ampl_path, "St{}.dat".format(
+                    prep[b][n]['index']), log)
+                for t in (prep[b][n]['discharging_performance']
+                    ['timesteps_partial_storage']):
+                    segs_fixed += S
+                    segs_used += vals[t-1]
                 # Tsets
                 Tsets = []
                 T_full_ct.append(len(prep[b][n]['discharging_performance']
@@ -178,21 +295,12 @@ def ampl(prep, log):
                     ['timesteps'])
                 multiline_lists(Tsets, ampl_path, "Tsets{}.dat".format(
                     prep[b][n]['index']), log)
-                # Get lifespan of utss
-                if yrs['central'] == 0:
-                    yrs['central'] = prep[b][n]['ctes']['lifespan_yrs']
-                    k['central'] = prep[b][n]['ctes']['cost_per_kWt']
-                    qbar['central'] = round(
-                        prep[b][n]['ctes']['capacity_nominal_Wt'] / 1000, 2)
-                # Set z_bar values
-                z_bar['utss'].append(0)
-                z_bar['central'].append(prep[b][n]['ctes']['install_limit'])
 
     ## Constants and set sizes
-    # read D, I, N, T, {d in 1..D} Td_ct[d], {n in 1..N} TYf_ct[n], {n in 1..N} TYp_ct[n], Tr_ct, delta, {i in 1..I} yrs[i], {n in UTSS} zbar[1,n], {d in 1..D} c_d[d] < fixed_params.dat;
+    # read D, I, N, T, {d in 1..D} Td_ct[d], {n in 1..N} TYf_ct[n], {n in 1..N} TYp_ct[n], Tr_ct, delta, {i in 1..I} yrs[i], {i in 1..I} k[i], {d in 1..D} c_d[d], {i in 1..I, n in 1..N} zbar[i,n], {n in 1..N} S[n], {i in 1..I} qbar[i], {i in 1..I} qIX[i] < fixed_params.dat;
     vals = []
     vals.append([len(prep['utility_rate']['demand_pd_ts_ct'])])
-    vals.append([2])
+    vals.append([len(types)])
     vals.append([prep['community']['plant_count']])
     vals.append([prep['program_manager']['timesteps'] * 8760])
     vals.append(prep['utility_rate']['demand_pd_ts_ct'])
@@ -200,15 +308,28 @@ def ampl(prep, log):
     vals.append(T_part_ct)
     vals.append([len(prep['utility_rate']['DR_timesteps'])])
     vals.append([1 / prep['program_manager']['timesteps']])
-    vals.append([yrs['utss'], yrs['central']])
-    vals.append([k['utss'], k['central']])
+    vals.append(consts['yrs'])
+    vals.append(consts['k'])
     vals.append(prep['utility_rate']['demand_cost'])
-    vals.append(z_bar['utss'])
-    vals.append(z_bar['central'])
+    vals += consts['zbar']
     vals.append(segments)
-    vals.append([qbar['utss'], qbar['central']])
+    vals.append(consts['qbar'])
+    vals.append(consts['qIX'])
 
     multiline_lists(vals, ampl_path, "fixed_params.dat", log)
+    # Plant and storage type names by index (not read by AMPL; used to map
+    # a previous solution onto these files, see warm.py)
+    put(json.dumps({'T': prep['program_manager']['timesteps'] * 8760,
+        'types': ["{}:{}".format(c, p) for c, p in types],
+        'plants': [p['key'] for p in sorted(plants, key=lambda p:
+        p['index'])]}, indent=1), ampl_path, "plants.json")
+
+    # Report partial storage variable reduction from adaptive linearization
+    if prep['program_manager'].get('segment_tolerance'):
+        log.info("Adaptive linearization: {} partial storage (LYp) " \
+            "variables vs. {} with fixed segmentation ({} fewer)".format(
+                segs_used, segs_fixed, segs_fixed - segs_used))
+    close_manifest(ampl_path, log)
 
 #
 #     ## Write constants file (fixed_params.dat)
@@ -230,13 +351,41 @@ def ampl(prep, log):
 #
     return
 #-------------------------------------------------------------------------------
+# Max discharging rate rows (kWt, one column per storage type) for a plant of
+# storage class 'cls', with zeros for the types of the other class. Also
+# collects the per-type constants and install limits into 'consts'.
+def storage_types(types, cls, storage, rates, consts):
+    # The primary product's rates are 'rates'; others are kept with the
+    # product. Pre-processing results without products hold only the primary.
+    products = storage.get('products') or [dict(storage,
+        name=[p for c, p in types if c == cls][0])]
+    found = {}
+    for i, p in enumerate(products):
+        found[p['name']] = (p, rates if i == 0 else p['rate_discharge_max_Wt'])
+    cols = []
+    for i, (c, name) in enumerate(types):
+        if c != cls:
+            cols.append([0 for v in rates])
+            consts['zbar'][i].append(0)
+            continue
+        p, r = found[name]
+        cols.append([round(v / 1000, 2) for v in r])
+        consts['zbar'][i].append(p['install_limit'])
+        if consts['yrs'][i] == 0:
+            consts['yrs'][i] = p['lifespan_yrs']
+            consts['k'][i] = p['cost_per_kWt']
+            consts['qbar'][i] = round(p['capacity_nominal_Wt'] / 1000, 2)
+            if p.get('rate_charge_limit_kWt'):
+                consts['qIX'][i] = p['rate_charge_limit_kWt']
+    return [list(v) for v in zip(*cols)]
+#-------------------------------------------------------------------------------
 def data_structure(dictionary, path, log):
     log.info("Writing data summary in project workspace folder")
     # iterate through dictionary levels:
     with open(path, "w") as f:
         for l1, v1 in dictionary.items():
             f.write("\n  {}: ".format(l1))
-            if isinstance(v1, list):
+            if isinstance(v1, (list, array.array)):
                 f.write("{} items".format(len(v1)))
             elif isinstance(v1, float):
                 f.write("float")
@@ -247,7 +396,7 @@ def data_structure(dictionary, path, log):
             elif isinstance(v1, dict):
                 for l2, v2 in v1.items():
                     f.write("\n    {}: ".format(l2))
-                    if isinstance(v2, list):
+                    if isinstance(v2, (list, array.array)):
                         f.write("{} items".format(len(v2)))
                     elif isinstance(v2, float):
                         f.write("float")
@@ -258,7 +407,7 @@ def data_structure(dictionary, path, log):
                     elif isinstance(v2, dict):
                         for l3, v3 in v2.items():
                             f.write("\n      {}: ".format(l3))
-                            if isinstance(v3, list):
+                            if isinstance(v3, (list, array.array)):
                                 f.write("{} items".format(len(v3)))
                             elif isinstance(v3, float):
                                 f.write("float")
@@ -269,7 +418,7 @@ def data_structure(dictionary, path, log):
                             elif isinstance(v3, dict):
                                 for l4, v4 in v3.items():
                                     f.write("\n        {}: ".format(l4))
-                                    if isinstance(v4, list):
+                                    if isinstance(v4, (list, array.array)):
                                         f.write("{} items".format(len(v4)))
                                     elif isinstance(v4, float):
                                         f.write("float")
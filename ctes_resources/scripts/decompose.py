@@ -0,0 +1,142 @@
+# decompose.py
+# CTES Optimization Processor
+# Plant-wise Lagrangian decomposition of the CTES optimization
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+import common
+import model
+import summaries
+
+# Parameters held by each worker process
+_params = None
+_settings = None
+
+#-------------------------------------------------------------------------------
+def run(project, log, settings=None):
+    # Settings (program_manager.json 'decomposition' entry):
+    #   workers - process pool size (default: all cores)
+    #   iterations - maximum number of price updates
+    #   gap - relative duality gap at which to stop
+    #   time_limit - time limit for each subproblem solve [s]
+    #   no_full - restrict full storage operation to DR timesteps
+    settings = dict({'workers': None, 'iterations': 50, 'gap': 0.01,
+        'time_limit': None, 'no_full': True}, **(settings or {}))
+    if settings['iterations'] < 1:
+        raise common.InputError("Decomposition needs at least one " \
+            "iteration, not {}".format(settings['iterations']))
+    ampl_path = os.path.join(project, 'ampl_files')
+    results_path = os.path.join(project, 'optimization_results')
+    log.info("Executing plant-wise decomposition: {}".format(settings))
+    start = time.time()
+    params = model.load(ampl_path)
+    T = params['T']
+    # Master problem over the community profile and demand peaks
+    master = master_model(params)
+    # Initial prices: energy cost plus demand charges spread over each period
+    a = model.ENERGY_MULTIPLIER * params['c_e'] * params['delta']
+    mu = a.copy()
+    for d in range(params['D']):
+        if len(params['Td'][d]):
+            mu[params['Td'][d]] += params['c_d'][d] / len(params['Td'][d])
+    lower = -np.inf
+    upper = np.inf
+    gap = np.inf
+    best = None
+    theta = 1.0
+    stall = 0
+    history = []
+    with concurrent.futures.ProcessPoolExecutor(settings['workers'],
+        initializer=init_worker, initargs=(ampl_path, settings)) as pool:
+        for it in range(settings['iterations']):
+            # Solve plant subproblems concurrently at the current prices
+            series = list(pool.map(solve_plant, range(params['N']),
+                [mu] * params['N']))
+            # Solve the master problem at the current prices
+            master.c[:T] = a - mu
+            master.highs.changeColsCost(T, np.arange(T), a - mu)
+            m = master.solve()
+            P = m['x'][:T]
+            # Dual function value (lower bound)
+            L = (m['objective'] + float(np.dot(mu, params['p'])) +
+                sum([s['bound'] for s in series]))
+            if L > lower:
+                lower = L
+                stall = 0
+            else:
+                stall += 1
+            # Feasible community solution from the plant schedules (upper bound)
+            c = model.costs(params, series)
+            if c['annual_cost'] < upper:
+                upper = c['annual_cost']
+                best = series
+            gap = (upper - lower) / max(abs(upper), 1e-6)
+            history.append({'iteration': it + 1, 'lower_bound': L,
+                'upper_bound': c['annual_cost'], 'gap': gap})
+            log.info(" Iteration {}: lower bound {:.2f}, upper bound {:.2f}, " \
+                "gap {:.4%}".format(it + 1, lower, upper, gap))
+            if gap <= settings['gap']:
+                break
+            # Subgradient step on the dualized community profile constraint
+            g = params['p'] + np.sum([s['net'] for s in series], axis=0) - P
+            if not np.any(g):
+                break
+            if stall >= 5:
+                theta /= 2
+                stall = 0
+            step = theta * (upper - L) / float(np.dot(g, g))
+            mu = np.maximum(mu + step * g, 0)
+    # Report and write the best feasible solution
+    msg = "Decomposition finished after {} iterations: objective {:.2f}, " \
+        "lower bound {:.2f}, duality gap {:.4%} ({:.1f} s)".format(
+            len(history), upper, lower, gap, time.time() - start)
+    print(msg)
+    log.info(msg)
+    model.write_outputs(params, best, results_path, log)
+    summaries.write(ampl_path, results_path, log)
+    with open(os.path.join(results_path, 'decomposition.json'), 'w') as f:
+        json.dump({'objective': upper, 'lower_bound': lower, 'gap': gap,
+            'settings': settings, 'iterations': history}, f, indent=2)
+    f.close()
+    return best
+#-------------------------------------------------------------------------------
+# Community profile and demand peaks, with plant net power as a priced input
+def master_model(params):
+    T = params['T']
+    m = model.Model()
+    # Upper bound on the community profile keeps the dual function finite
+    P_max = params['p'].copy()
+    for pl in params['plants']:
+        P_max += np.maximum(pl['lambdaX'], 0) * pl['qNX']
+    P = m.add_vars('P', T, ub=P_max)
+    Pd = m.add_vars('Pd', params['D'], cost=params['c_d'])
+    for d in range(params['D']):
+        Td = params['Td'][d]
+        rows = m.add_rows(len(Td), lo=0)
+        m.add_terms(rows, Pd[d], 1)
+        m.add_terms(rows, P[Td], -1)
+    m.finalize()
+    m.to_highs()
+    return m
+#-------------------------------------------------------------------------------
+def init_worker(ampl_path, settings):
+    global _params, _settings
+    _params = model.load(ampl_path)
+    _settings = settings
+#-------------------------------------------------------------------------------
+# Solve one plant at the given community power prices
+def solve_plant(n, prices):
+    m = model.build(_params, plants=[n], prices=prices,
+        no_full=_settings['no_full'])
+    r = m.solve(time_limit=_settings['time_limit'], threads=1)
+    s = model.plant_series(m, r['x'], _params, n)
+    s['objective'] = r['objective']
+    s['bound'] = r['bound']
+    return s
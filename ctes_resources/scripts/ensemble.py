@@ -0,0 +1,196 @@
+# ensemble.py
+# CTES Optimization Processor
+# Monte Carlo ensemble of demand response event calendars
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Ensemble files are JSON of the form:
+# {
+#   "scenarios": 5000,
+#   "seed": 1,
+#   "tariff": null,
+#   "months": [6, 7, 8, 9],
+#   "events": {"distribution": "poisson", "lam": 3},
+#   "weekdays": true,
+#   "dr_rate": {"distribution": "uniform", "low": 0.2, "high": 0.3},
+#   "dr_start": [14, 15, 16],
+#   "dr_duration": 5,
+#   "export": {"count": 10, "select": "quantile"}
+# }
+# 'events' is the number of event days per month. 'events', 'dr_rate',
+# 'dr_start' (hour) and 'dr_duration' (hours) may each be a constant, a list
+# to sample uniformly from, or a distribution {"distribution": <numpy
+# Generator method>, <arguments>}. 'tariff' is the base rate structure as
+# in create_erate.run; its own 'dr_events' are replaced by the sampled ones.
+# The calendars are evaluated as a (scenario x timestep) rate array in
+# batches of 'batch' scenarios against the baseline community profile from
+# preprocess.json, so the project must have been run with -r first.
+
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+import create_erate
+import data_writer
+
+#-------------------------------------------------------------------------------
+def run(project, ensemble_file, log):
+    with open(ensemble_file, 'r') as f:
+        spec = json.load(f)
+    f.close()
+    spec = dict({'scenarios': 1000, 'seed': None, 'batch': 256,
+        'tariff': None, 'months': [6, 7, 8, 9], 'events': 3,
+        'weekdays': False, 'dr_rate': 0.25, 'dr_start': 15, 'dr_duration': 5,
+        'export': {'count': 10, 'select': 'quantile'}}, **spec)
+    log.info("Executing DR event ensemble '{}' with {} scenarios".format(
+        ensemble_file, spec['scenarios']))
+    start = time.time()
+    with open(os.path.join(project, 'project_workspace', 'preprocess.json'),
+        'r') as f:
+        prep = json.load(f)
+    f.close()
+    ts = prep['program_manager']['timesteps']
+    # Base rates without DR events
+    tariff = dict(spec['tariff'] or {}, dr_events={})
+    base = create_erate.run(ts, log, tariff)
+    cal = sample(spec, np.random.default_rng(spec['seed']))
+    # Baseline community profile [kW] and the fixed demand bill
+    p = np.array(prep['community']['rate_electricity_W']) / 1000
+    d_bill = sum([c * p[np.array(Td, dtype=int) - 1].max() for c, Td in zip(
+        base['demand_cost'], base['demand_pd_timesteps']) if len(Td)])
+    # Energy bills for all scenarios, one batch of rate rows at a time
+    grid = timestep_grid(ts)
+    base_rate = np.array(base['energy_cost'])
+    S = spec['scenarios']
+    e_bill = np.zeros(S)
+    for b in range(0, S, spec['batch']):
+        e_bill[b:b + spec['batch']] = rates(cal, slice(b, b + spec['batch']),
+            base_rate, grid) @ p / ts
+    bills = e_bill + d_bill
+    msg = "Evaluated {} DR event calendars in {:.2f} s: baseline bill " \
+        "mean {:.2f}, 5th-95th percentile {:.2f}-{:.2f}".format(S,
+        time.time() - start, bills.mean(), *np.percentile(bills, [5, 95]))
+    print(msg)
+    log.info(msg)
+    # Write the ensemble and export the selected scenarios
+    ens_path = os.path.join(project, 'ensemble')
+    os.makedirs(ens_path, exist_ok=True)
+    with open(os.path.join(ens_path, 'bills.csv'), 'w') as f:
+        f.write("scenario,event_days,dr_rate,dr_start,dr_duration," \
+            "energy_bill,demand_bill,total_bill\n")
+        for s in range(S):
+            f.write("{},{},{:.5f},{},{},{:.2f},{:.2f},{:.2f}\n".format(s,
+                cal['days'][s].sum(), cal['rate'][s], cal['start'][s],
+                cal['duration'][s], e_bill[s], d_bill, bills[s]))
+    f.close()
+    index = []
+    for s, weight in select(bills, spec['export'], spec['seed']):
+        name = 'scenario_{}'.format(s)
+        path = os.path.join(ens_path, name, 'ampl_files')
+        os.makedirs(path, exist_ok=True)
+        erates = copy.deepcopy(base)
+        erates['energy_cost'] = rates(cal, slice(s, s + 1), base_rate,
+            grid)[0].tolist()
+        dr = np.nonzero(events(cal, slice(s, s + 1), grid)[0])[0] + 1
+        erates['DR_timesteps'] = dr.tolist() + base['DR_timesteps']
+        data_writer.ampl(dict(prep, utility_rate=erates), log, path)
+        index.append({
+            'name': name,
+            'path': path,
+            'weight': weight,
+            'baseline_bill': round(float(bills[s]), 2),
+            'dr_rate': float(cal['rate'][s]),
+            'dr_hours': list(range(int(cal['start'][s]),
+                int(cal['start'][s] + cal['duration'][s]))),
+            'dr_days': (np.nonzero(cal['days'][s])[0] + 1).tolist()
+        })
+        log.info(" Scenario '{}' (weight {:.4f}) written to '{}'".format(
+            name, weight, path))
+    with open(os.path.join(ens_path, 'index.json'), 'w') as f:
+        json.dump({
+            'scenarios': S,
+            'demand_bill': round(float(d_bill), 2),
+            'baseline_bill': {
+                'mean': round(float(bills.mean()), 2),
+                'std': round(float(bills.std()), 2),
+                'percentiles': {str(q): round(float(v), 2) for q, v in zip(
+                    [0, 5, 25, 50, 75, 95, 100], np.percentile(bills,
+                    [0, 5, 25, 50, 75, 95, 100]))}
+            },
+            'exported': index
+        }, f, indent=2)
+    f.close()
+    print("Ensemble complete: see '{}'".format(os.path.join(ens_path,
+        'index.json')))
+    return index
+#-------------------------------------------------------------------------------
+# Draw 'size' values from a constant, a list, or a distribution
+def draw(rng, value, size):
+    if isinstance(value, dict):
+        args = {k: v for k, v in value.items() if k != 'distribution'}
+        return getattr(rng, value['distribution'])(size=size, **args)
+    if isinstance(value, list):
+        return rng.choice(value, size)
+    return np.full(size, value)
+#-------------------------------------------------------------------------------
+# Sample event days (scenario x day of year), rates, and hours
+def sample(spec, rng):
+    S = spec['scenarios']
+    doy = np.arange(365)
+    date = np.datetime64('2006-01-01') + doy
+    month = date.astype('datetime64[M]').astype(int) % 12 + 1
+    # 2006-01-01 is a Sunday
+    weekday = (doy + 6) % 7 < 5
+    days = np.zeros((S, 365), bool)
+    for m in spec['months']:
+        eligible = doy[(month == m) & (weekday | (not spec['weekdays']))]
+        count = np.clip(np.round(draw(rng, spec['events'], S)), 0,
+            len(eligible))
+        # Choose 'count' distinct days per scenario by ranking random keys
+        rank = rng.random((S, len(eligible))).argsort(axis=1).argsort(axis=1)
+        days[:, eligible] = rank < count[:, None]
+    return {
+        'days': days,
+        'rate': draw(rng, spec['dr_rate'], S).astype(float),
+        'start': np.clip(np.round(draw(rng, spec['dr_start'], S)), 0,
+            23).astype(int),
+        'duration': np.clip(np.round(draw(rng, spec['dr_duration'], S)), 1,
+            24).astype(int)
+    }
+#-------------------------------------------------------------------------------
+# Day of year and hour of each timestep
+def timestep_grid(ts):
+    minutes = np.arange(int(8760 * ts)) * 60 // ts
+    return {'day': minutes // 1440, 'hour': (minutes // 60) % 24}
+#-------------------------------------------------------------------------------
+# DR event timesteps for a slice of scenarios as a (scenario x timestep) mask
+def events(cal, rows, grid):
+    start = cal['start'][rows, None]
+    hours = np.arange(24)
+    in_hours = (hours >= start) & (hours < start + cal['duration'][rows, None])
+    return cal['days'][rows][:, grid['day']] & in_hours[:, grid['hour']]
+#-------------------------------------------------------------------------------
+# Energy rates for a slice of scenarios as a (scenario x timestep) array
+def rates(cal, rows, base_rate, grid):
+    # Same time-of-day perturbation as create_erate.run
+    dr_rate = cal['rate'][rows, None] + (grid['hour'] % 23) * 0.00001
+    return np.where(events(cal, rows, grid), dr_rate, base_rate)
+#-------------------------------------------------------------------------------
+# Choose exported scenarios and their probability weights
+def select(bills, export, seed):
+    count = min(export.get('count', 10), len(bills))
+    if count == 0:
+        return []
+    if export.get('select', 'quantile') == 'random':
+        rng = np.random.default_rng(seed)
+        chosen = rng.choice(len(bills), count, replace=False)
+        return [(int(s), 1 / count) for s in chosen]
+    # One representative per equal-probability bin of the bill distribution
+    order = np.argsort(bills, kind='stable')
+    chosen = []
+    for b in np.array_split(order, count):
+        chosen.append((int(b[len(b) // 2]), len(b) / len(bills)))
+    return chosen
@@ -0,0 +1,130 @@
+# eso_store.py
+# CTES Optimization Processor
+# Columnar binary store of building simulation (.eso) outputs
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Each .eso is parsed once (at setup, with -c, or on first use) into
+# 'project_workspace/eso_store/<building>/':
+#   index.json - data dictionary, source file size and time, and the array
+#                and row of every variable
+#   <n>.npy    - float64 array with one row per variable reporting n values
+#                (eg. all TimeStep variables of a 15 minute simulation)
+# Reading a store memory-maps only the rows that are used. A store whose
+# .eso has changed since it was written is converted again.
+
+import concurrent.futures
+import json
+import os
+
+import esoreader
+import numpy as np
+
+#-------------------------------------------------------------------------------
+class Series:
+    # Variable id -> values, a read-only view of the memory-mapped arrays
+    # (used in place of the esoreader data dictionary)
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+        self.arrays = {}
+
+    def __getitem__(self, id):
+        name, row = self.rows[id]
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.path, name),
+                mmap_mode='r')
+        return self.arrays[name][row]
+#-------------------------------------------------------------------------------
+# Store folder for an .eso in a project's 'building_simulations' folder
+def store_path(eso):
+    eso = os.path.abspath(eso)
+    return os.path.join(os.path.dirname(os.path.dirname(eso)),
+        'project_workspace', 'eso_store',
+        os.path.splitext(os.path.basename(eso))[0])
+#-------------------------------------------------------------------------------
+def stamp(eso):
+    st = os.stat(eso)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+#-------------------------------------------------------------------------------
+# Parse an .eso and write its store; returns the parsed (dd, data)
+def convert(eso):
+    source = stamp(eso)
+    dd, data = esoreader.read(eso)
+    path = store_path(eso)
+    os.makedirs(path, exist_ok=True)
+    # Drop the old index first, so that a partly written store is never read
+    if os.path.isfile(os.path.join(path, 'index.json')):
+        os.remove(os.path.join(path, 'index.json'))
+    # Group the series by length so that each array is rectangular
+    groups = {}
+    for id in sorted(dd.variables.keys()):
+        groups.setdefault(len(data[id]), []).append(id)
+    variables = []
+    for n, ids in groups.items():
+        name = "{}.npy".format(n)
+        tmp = os.path.join(path, name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, np.array([data[id] for id in ids],
+                dtype=np.float64).reshape(len(ids), n))
+        os.replace(tmp, os.path.join(path, name))
+        for row, id in enumerate(ids):
+            variables.append([id] + dd.variables[id] + [name, row])
+    index = {
+        'source': source,
+        'version': dd.version,
+        'timestamp': dd.timestamp,
+        'variables': variables
+    }
+    with open(os.path.join(path, 'index.json.tmp'), 'w') as f:
+        json.dump(index, f)
+    f.close()
+    os.replace(os.path.join(path, 'index.json.tmp'),
+        os.path.join(path, 'index.json'))
+    return dd, data
+#-------------------------------------------------------------------------------
+# Worker entry for convert_all; the parse is not sent back
+def build(eso):
+    convert(eso)
+    return eso
+#-------------------------------------------------------------------------------
+# Open the store of an .eso as (dd, data), or None if it is missing or out
+# of date
+def load(eso):
+    path = store_path(eso)
+    try:
+        with open(os.path.join(path, 'index.json'), 'r') as f:
+            index = json.load(f)
+        f.close()
+    except (OSError, ValueError):
+        return None
+    if index['source'] != stamp(eso):
+        return None
+    dd = esoreader.DataDictionary(index['version'], index['timestamp'])
+    rows = {}
+    for id, freq, key, variable, unit, name, row in index['variables']:
+        dd.variables[id] = [freq, key, variable, unit]
+        rows[id] = (name, row)
+    dd.build_index()
+    dd.ids = set(dd.variables.keys())
+    return dd, Series(path, rows)
+#-------------------------------------------------------------------------------
+# Convert every building and district plant .eso in a project that has no
+# up-to-date store
+def convert_all(project, log, workers=None):
+    esos = []
+    for folder in ['building_simulations', 'district_plant_simulations']:
+        sims = os.path.join(project, folder)
+        if os.path.isdir(sims):
+            esos += [os.path.join(sims, f) for f in sorted(os.listdir(sims))
+                if f.endswith('.eso')]
+    todo = [e for e in esos if load(e) is None]
+    log.info("Converting {} of {} .eso files to columnar stores".format(
+        len(todo), len(esos)))
+    print("Converting {} of {} .eso files to columnar stores".format(
+        len(todo), len(esos)))
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for eso in pool.map(build, todo):
+            log.info(" {} converted to '{}'".format(os.path.basename(eso),
+                store_path(eso)))
+    return todo
@@ -0,0 +1,184 @@
+# jobs.py
+# CTES Optimization Processor
+# Run prepared AMPL file sets through a locally configured solver
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Replaces the scp round trip in xfer.py. Each job copies the solver files
+# and one 'ampl_files' directory into a scratch directory, runs the solver
+# command there, and collects the .out files and solver log into the job's
+# results directory. Each job starts from the previous solution in its
+# results directory, if there is one (see warm.py).
+
+import concurrent.futures
+import glob
+import json
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import common
+import model
+import summaries
+import warm
+
+# Solver files copied into each job directory
+SOLVER_FILES = os.path.join(common.RESOURCES, 'solver_files')
+
+#-------------------------------------------------------------------------------
+def job(name, ampl_path, results_path):
+    return {'name': name, 'ampl_path': ampl_path, 'results_path': results_path}
+#-------------------------------------------------------------------------------
+def run(jobs, settings, status_path, log):
+    # Settings (program_manager.json 'solver' entry):
+    #   command - solver command run in the job directory; '{threads}' is
+    #       replaced by the thread cap. None solves in-process with HiGHS.
+    #   workers - number of jobs run concurrently
+    #   timeout - time limit for each job [s]
+    #   threads - solver thread cap for each job
+    #   warm_start - start from the previous solution of each job
+    #   compare_cold - also solve cold (into '<results>/cold') to measure
+    #       the time saved by the warm start
+    settings = dict({'command': 'ampl ctes.run', 'workers': 1,
+        'timeout': None, 'threads': 1, 'warm_start': True,
+        'compare_cold': False}, **(settings or {}))
+    log.info("Running {} solver job(s): {}".format(len(jobs), settings))
+    status = Status(status_path, jobs)
+    with concurrent.futures.ThreadPoolExecutor(settings['workers']) as pool:
+        futures = [pool.submit(execute, j, settings, status, log)
+            for j in jobs]
+        concurrent.futures.wait(futures)
+    counts = {}
+    for j in jobs:
+        s = status.jobs[j['name']]['state']
+        counts[s] = counts.get(s, 0) + 1
+    msg = "Solver jobs finished: {}".format(counts)
+    print(msg)
+    log.info(msg)
+    return status.jobs
+#-------------------------------------------------------------------------------
+def execute(j, settings, status, log):
+    status.update(j['name'], state='running', start=time.ctime())
+    os.makedirs(j['results_path'], exist_ok=True)
+    s = None
+    if settings['warm_start']:
+        s = warm.start(j['ampl_path'], j['results_path'], log)
+    if s is not None and settings['compare_cold']:
+        cold = dict(j, results_path=os.path.join(j['results_path'], 'cold'))
+        os.makedirs(cold['results_path'], exist_ok=True)
+        state, code, elapsed = solve(cold, settings, None, log)
+        if state == 'done':
+            s['cold_time'] = elapsed
+    state, code, elapsed = solve(j, settings, s, log)
+    status.update(j['name'], state=state, returncode=code,
+        end=time.ctime(), elapsed_s=round(elapsed, 2),
+        warm_start=s is not None)
+    log.info(" Job '{}' {} in {:.1f} s".format(j['name'], state, elapsed))
+    if state != 'done':
+        return state
+    warm.save(j['ampl_path'], j['results_path'], elapsed,
+        elapsed if s is None else s['cold_time'], log)
+    summaries.write(j['ampl_path'], j['results_path'], log)
+    if s is not None and np.isfinite(s['cold_time']):
+        msg = "Job '{}': warm start solved in {:.1f} s vs. {:.1f} s " \
+            "cold ({:.1f} s saved)".format(j['name'], elapsed,
+            s['cold_time'], s['cold_time'] - elapsed)
+        print(msg)
+        log.info(msg)
+        status.update(j['name'], cold_s=round(s['cold_time'], 2))
+    return state
+#-------------------------------------------------------------------------------
+# Run one job, with the start 's' if given; returns the state, return code,
+# and time
+def solve(j, settings, s, log):
+    start = time.time()
+    solver_log = os.path.join(j['results_path'], 'solver.log')
+    try:
+        if settings['command'] is None:
+            state, code = in_process(j, settings, solver_log, s, log)
+        else:
+            state, code = external(j, settings, solver_log, s)
+    except Exception as e:
+        state, code = 'failed', None
+        log.error(" Job '{}' failed: {}".format(j['name'], e))
+    return state, code, time.time() - start
+#-------------------------------------------------------------------------------
+def external(j, settings, solver_log, s=None):
+    # Stage solver and data files in a scratch directory
+    work = tempfile.mkdtemp(prefix='ctes_{}_'.format(j['name']))
+    try:
+        for f in glob.glob(os.path.join(SOLVER_FILES, '*')):
+            shutil.copy(f, work)
+        for f in glob.glob(os.path.join(j['ampl_path'], '*')):
+            shutil.copy(f, work)
+        if s is not None:
+            warm.ampl_run(s, work)
+        # Cap threads for the solver and any libraries it uses
+        env = dict(os.environ)
+        for v in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']:
+            env[v] = str(settings['threads'])
+        command = settings['command'].replace('{threads}',
+            str(settings['threads']))
+        with open(solver_log, 'w') as f:
+            # Own process group so a timeout stops the whole solver tree
+            p = subprocess.Popen(command, shell=True, cwd=work, env=env,
+                stdout=f, stderr=subprocess.STDOUT, start_new_session=True)
+            try:
+                code = p.wait(timeout=settings['timeout'])
+                state = 'done' if code == 0 else 'failed'
+            except subprocess.TimeoutExpired:
+                os.killpg(p.pid, signal.SIGKILL)
+                p.wait()
+                f.write("\nTimed out after {} s\n".format(settings['timeout']))
+                state, code = 'timeout', None
+        # Collect results and solver logs
+        for f in glob.glob(os.path.join(work, '*.out')) + glob.glob(
+            os.path.join(work, '*.log')):
+            shutil.copy(f, j['results_path'])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return state, code
+#-------------------------------------------------------------------------------
+def in_process(j, settings, solver_log, s, log):
+    # Solve with the in-memory model and HiGHS
+    params = model.load(j['ampl_path'])
+    m = model.build(params)
+    r = m.solve(time_limit=settings['timeout'], threads=settings['threads'],
+        log_file=solver_log, start=None if s is None else warm.columns(m,
+        params, s))
+    if r['x'] is None:
+        return ('timeout' if 'limit' in r['status'].lower() else 'failed',
+            None)
+    series = [model.plant_series(m, r['x'], params, n)
+        for n in range(params['N'])]
+    model.write_outputs(params, series, j['results_path'], log)
+    return 'done', 0
+#-------------------------------------------------------------------------------
+class Status:
+    # Progress tracking file, rewritten atomically on every change
+    def __init__(self, path, jobs):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+        for j in jobs:
+            self.jobs[j['name']] = {'state': 'queued',
+                'ampl_path': j['ampl_path'],
+                'results_path': j['results_path']}
+        self.write()
+
+    def update(self, name, **kwargs):
+        with self.lock:
+            self.jobs[name].update(kwargs)
+            self.write()
+
+    def write(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.jobs, f, indent=2)
+        os.replace(tmp, self.path)
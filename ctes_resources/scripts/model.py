@@ -0,0 +1,520 @@
+# model.py
+# CTES Optimization Processor
+# Build the ctes.mod formulation in memory and solve it with a local solver
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import csv
+import os
+import time
+
+import highspy
+import numpy as np
+from scipy import sparse
+
+import common
+
+# Constants set in ctes.mod and ctes.dat
+QIX = [20, 71]  # max rate of charging for each CTES type [kWth], if not in
+# fixed_params.dat
+ETA = 0.9975  # timestep loss rate
+EPSILON = 0.95  # discharge effectiveness
+ENERGY_MULTIPLIER = 1.31  # multiplier on energy charges in the objective
+
+#-------------------------------------------------------------------------------
+# Read the AMPL data files written by data_writer.ampl. Files are read as
+# token streams, the same way ctes.dat reads them.
+def load(ampl_path):
+    fixed = [[float(v) for v in row] for row in csv.reader(
+        open(os.path.join(ampl_path, 'fixed_params.dat'), 'r'))]
+    D, I, N, T = [int(fixed[i][0]) for i in range(4)]
+    # fixed_params.dat holds one zbar row per CTES type
+    params = {
+        'D': D,
+        'I': I,
+        'N': N,
+        'T': T,
+        'Td_ct': [int(v) for v in fixed[4]],
+        'TYf_ct': [int(v) for v in fixed[5]],
+        'TYp_ct': [int(v) for v in fixed[6]],
+        'delta': fixed[8][0],
+        'yrs': np.array(fixed[9]),
+        'k': np.array(fixed[10]),
+        'c_d': np.array(fixed[11]),
+        'zbar': np.array(fixed[12:12 + I]),
+        'S': [int(v) for v in fixed[12 + I]],
+        'qbar': np.array(fixed[13 + I]),
+        'qIX': np.array(fixed[14 + I] if len(fixed) > 14 + I else QIX[:I],
+            dtype=float),
+        'c_e': tokens(ampl_path, 'cost_elec.dat'),
+        'p': tokens(ampl_path, 'p.dat'),
+        'Tr': np.unique(tokens(ampl_path, 'Tr.dat')[:int(fixed[7][0])]
+            ).astype(int) - 1,
+        'Td': [],
+        'plants': []
+    }
+    # Demand period timestep sets (0-based)
+    v = tokens(ampl_path, 'Td.dat').astype(int) - 1
+    start = 0
+    for ct in params['Td_ct']:
+        params['Td'].append(v[start:start + ct])
+        start += ct
+    # Per-plant parameters
+    for n in range(N):
+        params['plants'].append(plant(ampl_path, n + 1, T, params['S'][n],
+            params['TYf_ct'][n], params['TYp_ct'][n]))
+    return params
+#-------------------------------------------------------------------------------
+def plant(ampl_path, n, T, S, TYf_ct, TYp_ct):
+    pl = {}
+    for name in ['l', 'pN', 'lambdaX', 'qNX']:
+        pl[name] = tokens(ampl_path, "{}{}.dat".format(name, n))
+    # Max discharging rate by timestep and CTES type
+    pl['qIY'] = tokens(ampl_path, "qIY{}.dat".format(n)).reshape(T, -1)
+    for name in ['lambdaY', 'lbar']:
+        pl[name] = tokens(ampl_path, "{}{}.dat".format(name, n)).reshape(T, S)
+    # Segments used by timestep (fixed segmentation if missing)
+    if os.path.isfile(os.path.join(ampl_path, "St{}.dat".format(n))):
+        pl['St'] = tokens(ampl_path, "St{}.dat".format(n)).astype(int)
+    else:
+        pl['St'] = np.full(T, S)
+    v = tokens(ampl_path, "Tsets{}.dat".format(n)).astype(int)
+    pl['TYf'] = np.unique(v[:TYf_ct]) - 1
+    pl['TYp'] = np.unique(v[TYf_ct:TYf_ct + TYp_ct]) - 1
+    # Drop any set members outside 1..T
+    pl['TYf'] = pl['TYf'][(pl['TYf'] >= 0) & (pl['TYf'] < T)]
+    pl['TYp'] = pl['TYp'][(pl['TYp'] >= 0) & (pl['TYp'] < T)]
+    return pl
+#-------------------------------------------------------------------------------
+# Parameters of 'steps' timesteps from 'start' (0-based). Timestep sets are
+# renumbered from the start of the window; demand periods keep their index
+# and are empty where they fall outside it.
+def window(params, start, steps):
+    T = params['T']
+    end = min(T, start + steps)
+    if start == 0 and end == T:
+        return params
+    inside = lambda v: v[(v >= start) & (v < end)] - start
+    plants = params['plants']
+    params = dict(params, T=end - start, c_e=params['c_e'][start:end],
+        p=params['p'][start:end], Tr=inside(params['Tr']),
+        Td=[inside(Td) for Td in params['Td']], plants=[])
+    for pl in plants:
+        pl = dict(pl)
+        for k in ['l', 'pN', 'lambdaX', 'qNX', 'qIY', 'lambdaY', 'lbar',
+            'St']:
+            pl[k] = pl[k][start:end]
+        for k in ['TYf', 'TYp']:
+            pl[k] = inside(pl[k])
+        params['plants'].append(pl)
+    return params
+#-------------------------------------------------------------------------------
+def tokens(path, filename):
+    with open(os.path.join(path, filename), 'r') as f:
+        return np.array(f.read().replace(',', ' ').split(), dtype=float)
+#-------------------------------------------------------------------------------
+class Model:
+    # Sparse MILP in the form: min c'x s.t. row_lb <= Ax <= row_ub,
+    # lb <= x <= ub, with named index arrays for each variable block
+    def __init__(self):
+        self.ncol = 0
+        self.nrow = 0
+        self.var = {}
+        self._c = []
+        self._lb = []
+        self._ub = []
+        self._int = []
+        self._rlb = []
+        self._rub = []
+        self._r = []
+        self._k = []
+        self._v = []
+        self.highs = None
+        self.build_time = 0
+
+    def add_vars(self, name, count, lb=0, ub=np.inf, cost=0, integer=False):
+        idx = np.arange(self.ncol, self.ncol + count)
+        self.ncol += count
+        self._c.append(np.broadcast_to(np.asarray(cost, float), count))
+        self._lb.append(np.broadcast_to(np.asarray(lb, float), count))
+        self._ub.append(np.broadcast_to(np.asarray(ub, float), count))
+        self._int.append(np.full(count, integer))
+        self.var[name] = idx
+        return idx
+
+    def add_rows(self, count, lo=-np.inf, hi=np.inf):
+        idx = np.arange(self.nrow, self.nrow + count)
+        self.nrow += count
+        self._rlb.append(np.broadcast_to(np.asarray(lo, float), count))
+        self._rub.append(np.broadcast_to(np.asarray(hi, float), count))
+        return idx
+
+    def add_terms(self, rows, cols, vals):
+        rows, cols = np.broadcast_arrays(rows, cols)
+        self._r.append(rows)
+        self._k.append(cols)
+        self._v.append(np.broadcast_to(np.asarray(vals, float), rows.shape))
+
+    def finalize(self):
+        # Collapse block lists into arrays
+        self.c = np.concatenate(self._c) if self._c else np.zeros(0)
+        self.lb = np.concatenate(self._lb) if self._lb else np.zeros(0)
+        self.ub = np.concatenate(self._ub) if self._ub else np.zeros(0)
+        self.integer = (np.concatenate(self._int) if self._int
+            else np.zeros(0, bool))
+        self.row_lb = np.concatenate(self._rlb) if self._rlb else np.zeros(0)
+        self.row_ub = np.concatenate(self._rub) if self._rub else np.zeros(0)
+        if self._r:
+            r = np.concatenate(self._r)
+            k = np.concatenate(self._k)
+            v = np.concatenate(self._v)
+        else:
+            r, k, v = [np.zeros(0, int)] * 2 + [np.zeros(0)]
+        self.A = sparse.coo_matrix((v, (r, k)),
+            shape=(self.nrow, self.ncol)).tocsc()
+        self.A.sum_duplicates()
+        self._c = self._lb = self._ub = self._int = None
+        self._rlb = self._rub = self._r = self._k = self._v = None
+        return self
+
+    def set_bounds(self, cols, lb, ub):
+        # Change column bounds in place, and in the solver instance if built
+        cols = np.asarray(cols)
+        self.lb[cols] = lb
+        self.ub[cols] = ub
+        if self.highs is not None:
+            self.highs.changeColsBounds(len(cols), cols.astype(np.int32),
+                self.lb[cols], self.ub[cols])
+
+    def set_costs(self, cols, costs):
+        # Change objective coefficients in place, and in the solver instance
+        # if built; a re-solve starts from the current basis
+        cols = np.asarray(cols)
+        self.c[cols] = costs
+        if self.highs is not None:
+            self.highs.changeColsCost(len(cols), cols.astype(np.int32),
+                self.c[cols])
+
+    def stats(self):
+        return {
+            'rows': self.nrow,
+            'columns': self.ncol,
+            'nonzeros': int(self.A.nnz),
+            'integers': int(self.integer.sum())
+        }
+
+    def to_highs(self, threads=None):
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', False)
+        if threads:
+            h.setOptionValue('threads', int(threads))
+        lp = highspy.HighsLp()
+        lp.num_col_ = self.ncol
+        lp.num_row_ = self.nrow
+        lp.col_cost_ = self.c
+        lp.col_lower_ = self.lb
+        lp.col_upper_ = self.ub
+        lp.row_lower_ = self.row_lb
+        lp.row_upper_ = self.row_ub
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.num_col_ = self.ncol
+        lp.a_matrix_.num_row_ = self.nrow
+        lp.a_matrix_.start_ = self.A.indptr
+        lp.a_matrix_.index_ = self.A.indices
+        lp.a_matrix_.value_ = self.A.data
+        if self.integer.any():
+            lp.integrality_ = [highspy.HighsVarType.kInteger if i else
+                highspy.HighsVarType.kContinuous for i in self.integer]
+        h.passModel(lp)
+        self.highs = h
+        return h
+
+    def solve(self, time_limit=None, mip_gap=None, threads=None, log_file=None,
+        start=None):
+        # Solve with HiGHS; the solver instance is kept for re-solves.
+        # 'start' is a (columns, values) MIP start, which may be partial.
+        if self.highs is None:
+            self.to_highs(threads)
+        h = self.highs
+        if start is not None and len(start[0]) > 0:
+            h.setSolution(len(start[0]), np.asarray(start[0], np.int32),
+                np.asarray(start[1], float))
+        if time_limit:
+            h.setOptionValue('time_limit', float(time_limit))
+        if mip_gap is not None:
+            h.setOptionValue('mip_rel_gap', float(mip_gap))
+        if log_file:
+            h.setOptionValue('output_flag', True)
+            h.setOptionValue('log_to_console', False)
+            h.setOptionValue('log_file', log_file)
+        start = time.time()
+        h.run()
+        result = {
+            'status': h.modelStatusToString(h.getModelStatus()),
+            'solve_time': time.time() - start,
+            'objective': None,
+            'bound': None,
+            'gap': None,
+            'x': None
+        }
+        info = h.getInfo()
+        if info.primal_solution_status == 2:
+            result['x'] = np.array(h.getSolution().col_value)
+            result['objective'] = info.objective_function_value
+            if self.integer.any():
+                result['bound'] = info.mip_dual_bound
+                result['gap'] = info.mip_gap
+            else:
+                result['bound'] = info.objective_function_value
+                result['gap'] = 0
+        return result
+#-------------------------------------------------------------------------------
+# Build the ctes.mod formulation. 'plants' restricts the model to a subset of
+# plants. If 'prices' ($ per kW at each timestep) are given, the community
+# profile and demand constraints are dropped and each plant's net power is
+# priced instead (plant subproblem). 'initial' is the tank inventory of each
+# plant [kWh] before the first timestep (eg. for a window of the year, see
+# window); without it the tanks start empty, as in ctes.mod.
+def build(params, plants=None, prices=None, relax=False, no_full=True,
+    initial=None):
+    start = time.time()
+    m = Model()
+    T = params['T']
+    delta = params['delta']
+    if plants is None:
+        plants = range(params['N'])
+    # Community net power terms from each plant: (timesteps, cols, coeffs)
+    net = []
+    for n in plants:
+        net.extend(add_plant(m, params, n, relax, no_full,
+            None if initial is None else initial[n]))
+    if prices is None:
+        # Community power profile and demand peaks
+        P = m.add_vars('P', T, cost=ENERGY_MULTIPLIER * params['c_e'] * delta)
+        Pd = m.add_vars('Pd', params['D'], cost=params['c_d'])
+        # profile: P[t] - sum of plant net power >= p[t]
+        rows = m.add_rows(T, lo=params['p'])
+        m.add_terms(rows, P, 1)
+        for t, cols, v in net:
+            m.add_terms(rows[t], cols, -np.asarray(v))
+        # peak_demand: Pd[d] - P[t] >= 0
+        for d in range(params['D']):
+            Td = params['Td'][d]
+            rows = m.add_rows(len(Td), lo=0)
+            m.add_terms(rows, Pd[d], 1)
+            m.add_terms(rows, P[Td], -1)
+    m.finalize()
+    if prices is not None:
+        # Price each plant's contribution to the community profile
+        for t, cols, v in net:
+            np.add.at(m.c, cols, prices[t] * np.asarray(v))
+    m.build_time = time.time() - start
+    return m
+#-------------------------------------------------------------------------------
+# Change the cost parameters of a built model in place: storage cost 'k' and
+# lifetime 'yrs' by CTES type, demand charges 'c_d' by period, and the
+# multiplier on energy charges. Parameters not given take their values from
+# 'params'. Models built with 'prices' have no community profile to reprice.
+def reprice(m, params, k=None, yrs=None, c_d=None,
+    energy_multiplier=ENERGY_MULTIPLIER):
+    I = params['I']
+    k = params['k'] if k is None else np.broadcast_to(k, I)
+    yrs = params['yrs'] if yrs is None else np.broadcast_to(yrs, I)
+    z_cost = common.unit_cost(k, params['qbar'], yrs)[:I]
+    for key, cols in m.var.items():
+        if isinstance(key, tuple) and key[0] == 'Z':
+            m.set_costs(cols, z_cost)
+    if 'P' in m.var:
+        m.set_costs(m.var['P'], energy_multiplier * params['c_e'] *
+            params['delta'])
+        m.set_costs(m.var['Pd'], params['c_d'] if c_d is None else
+            np.broadcast_to(c_d, params['D']))
+    return m
+#-------------------------------------------------------------------------------
+def add_plant(m, params, n, relax, no_full, q0=None):
+    pl = params['plants'][n]
+    T = params['T']
+    I = params['I']
+    delta = params['delta']
+    t_all = np.arange(T)
+    f = pl['TYf']
+    p = pl['TYp']
+    # Membership helpers
+    f_pos = np.full(T, -1)
+    f_pos[f] = np.arange(len(f))
+    p_pos = np.full(T, -1)
+    p_pos[p] = np.arange(len(p))
+    ## Variables
+    Z = m.add_vars(('Z', n), I, ub=params['zbar'][:I, n],
+        cost=common.unit_cost(params['k'], params['qbar'], params['yrs']),
+        integer=not relax)
+    LX = m.add_vars(('LX', n), T, ub=pl['qNX'])  # charge_limit_plant
+    if q0 is None:
+        # init_soc
+        Q = m.add_vars(('Q', n), T, ub=np.r_[0, np.full(T - 1, np.inf)])
+        prev = np.r_[-1, Q[:-1]]
+        t0 = 1
+    else:
+        # Inventory carried over from before the first timestep (fixed)
+        Q = m.add_vars(('Q', n), T)
+        prev = np.r_[m.add_vars(('Q0', n), 1, lb=q0, ub=q0), Q[:-1]]
+        t0 = 0
+    PX = m.add_vars(('PX', n), T)
+    # no_full: full storage operation only during DR events
+    a_ub = np.ones(len(f))
+    if no_full:
+        a_ub[~np.isin(f, params['Tr'])] = 0
+    alpha = m.add_vars(('alpha', n), len(f), ub=a_ub, integer=not relax)
+    LYf = m.add_vars(('LYf', n), len(f))
+    PYf = m.add_vars(('PYf', n), len(f))
+    PYp = m.add_vars(('PYp', n), len(p))
+    # Partial storage segments, only where s < St[n,t]
+    LYp = []
+    for s in range(params['S'][n]):
+        sel = np.nonzero(pl['St'][p] > s)[0]
+        idx = m.add_vars(('LYp', n, s), len(sel), ub=pl['lbar'][p[sel], s])
+        m.var[('LYp_pos', n, s)] = sel
+        LYp.append((sel, idx))
+    qIX = params['qIX'][:I]
+    ## Constraints
+    # charge_limit_ctes
+    rows = m.add_rows(T, hi=0)
+    m.add_terms(rows, LX, 1)
+    for i in range(I):
+        m.add_terms(rows, Z[i], -qIX[i])
+    # discharge_full_load
+    rows = m.add_rows(len(f), lo=0, hi=0)
+    m.add_terms(rows, LYf, 1)
+    m.add_terms(rows, alpha, -pl['l'][f])
+    # discharge_full_rate
+    rows = m.add_rows(len(f), hi=0)
+    m.add_terms(rows, LYf, 1)
+    for i in range(I):
+        m.add_terms(rows, Z[i], -pl['qIY'][f, i])
+    # discharge_part_load (bounds hold outside TYf)
+    for s, (sel, idx) in enumerate(LYp):
+        both = f_pos[p[sel]] >= 0
+        rows = m.add_rows(int(both.sum()), hi=pl['lbar'][p[sel][both], s])
+        m.add_terms(rows, idx[both], 1)
+        m.add_terms(rows, alpha[f_pos[p[sel][both]]],
+            pl['lbar'][p[sel][both], s])
+    # discharge_part_rate
+    rows = m.add_rows(len(p), hi=0)
+    for sel, idx in LYp:
+        m.add_terms(rows[sel], idx, 1)
+    for i in range(I):
+        m.add_terms(rows, Z[i], -pl['qIY'][p, i])
+    # tank_inventory (t > 1, or from q0)
+    rows = m.add_rows(T - t0, lo=0, hi=0)
+    m.add_terms(rows, Q[t0:], 1)
+    m.add_terms(rows, prev[t0:], -ETA)
+    m.add_terms(rows, LX[t0:], -delta)
+    for sel, idx in LYp:
+        keep = p[sel] >= t0
+        m.add_terms(rows[p[sel][keep] - t0], idx[keep], delta)
+    both = (f_pos[p] >= 0) & (p >= t0)
+    m.add_terms(rows[p[both] - t0], LYf[f_pos[p[both]]], -delta)
+    # max_soc
+    rows = m.add_rows(T, hi=0)
+    m.add_terms(rows, Q, 1)
+    for i in range(I):
+        m.add_terms(rows, Z[i], -params['qbar'][i])
+    # soc_full (t > 1, or from q0)
+    keep = f >= t0
+    rows = m.add_rows(int(keep.sum()), hi=0)
+    m.add_terms(rows, LYf[keep], delta)
+    m.add_terms(rows, prev[f[keep]], -ETA)
+    # soc_part (t > 1, or from q0)
+    keep = p >= t0
+    rows = m.add_rows(int(keep.sum()), hi=0)
+    row_of = np.full(len(p), -1)
+    row_of[keep] = rows
+    for sel, idx in LYp:
+        ok = row_of[sel] >= 0
+        m.add_terms(row_of[sel][ok], idx[ok], delta)
+    m.add_terms(rows, prev[p[keep]], -ETA)
+    # pwr_part
+    rows = m.add_rows(len(p), hi=0)
+    m.add_terms(rows, PYp, 1)
+    for s, (sel, idx) in enumerate(LYp):
+        m.add_terms(rows[sel], idx, -EPSILON * pl['lambdaY'][p[sel], s])
+    # pwr_full
+    rows = m.add_rows(len(f), hi=0)
+    m.add_terms(rows, PYf, 1)
+    m.add_terms(rows, alpha, -EPSILON * pl['pN'][f])
+    # pwr_charge
+    rows = m.add_rows(T, hi=0)
+    m.add_terms(rows, LX, pl['lambdaX'])
+    m.add_terms(rows, PX, -1)
+    # Net contribution to the community profile (as written in ctes.mod)
+    both = f_pos[p] >= 0
+    return [(t_all, PX, 1), (p, PYp, -1),
+        (p[both], PYf[f_pos[p[both]]], 1)]
+#-------------------------------------------------------------------------------
+# Expand a plant's solution values to full-length timeseries
+def plant_series(m, x, params, n):
+    pl = params['plants'][n]
+    T = params['T']
+    f = pl['TYf']
+    p = pl['TYp']
+    s = {}
+    for name in ['LX', 'Q', 'PX']:
+        s[name] = x[m.var[(name, n)]]
+    for name in ['alpha', 'LYf', 'PYf']:
+        s[name] = np.zeros(T)
+        s[name][f] = x[m.var[(name, n)]]
+    s['PYp'] = np.zeros(T)
+    s['PYp'][p] = x[m.var[('PYp', n)]]
+    s['LYp'] = np.zeros(T)
+    for k in range(params['S'][n]):
+        np.add.at(s['LYp'], p[m.var[('LYp_pos', n, k)]],
+            x[m.var[('LYp', n, k)]])
+    s['Z'] = x[m.var[('Z', n)]]
+    # Net power contribution to the community profile
+    s['net'] = s['PX'].copy()
+    s['net'][p] -= s['PYp'][p] - s['PYf'][p]
+    return s
+#-------------------------------------------------------------------------------
+# Objective terms for a set of plant series and the community profile
+def costs(params, series):
+    T = params['T']
+    P = np.maximum(params['p'] + np.sum([s['net'] for s in series], axis=0),
+        0)
+    Pd = np.array([P[Td].max() if len(Td) else 0 for Td in params['Td']])
+    unit = common.unit_cost(params['k'], params['qbar'], params['yrs'])
+    capex = sum([float(np.dot(unit, s['Z'])) for s in series])
+    result = {
+        'P': P,
+        'Pd': Pd,
+        'e_bill': float(np.dot(params['c_e'], P) * params['delta']),
+        'd_bill': float(np.dot(params['c_d'], Pd)),
+        'capex': capex
+    }
+    result['annual_cost'] = (ENERGY_MULTIPLIER * result['e_bill'] +
+        result['d_bill'] + capex)
+    return result
+#-------------------------------------------------------------------------------
+# Write results in the same form as ctes.run
+def write_outputs(params, series, path, log):
+    c = costs(params, series)
+    with open(os.path.join(path, 'soln.out'), 'w') as f:
+        f.write("annual_cost = {:.2f}\n".format(c['annual_cost']))
+        f.write("e_bill = {:.2f}\n".format(c['e_bill']))
+        f.write("d_bill = {:.2f}\n".format(c['d_bill']))
+        f.write("capex = {:.2f}\n".format(c['capex']))
+        f.write("Z [*,*]\n")
+        for n in range(len(series)):
+            f.write("{} {}\n".format(n + 1, " ".join(
+                [str(int(round(z))) for z in series[n]['Z']])))
+    np.savetxt(os.path.join(path, 'P.out'), c['P'], fmt='%.2f')
+    np.savetxt(os.path.join(path, 'Pd.out'), c['Pd'], fmt='%.2f')
+    np.savetxt(os.path.join(path, 'Z.out'), np.array([s['Z'] for s in series]),
+        fmt='%d')
+    for name in ['PX', 'PYf', 'PYp', 'alpha', 'Q', 'LX', 'LYf', 'LYp']:
+        np.savetxt(os.path.join(path, '{}.out'.format(name)),
+            np.column_stack([s[name] for s in series]), fmt='%.2f')
+    load = np.column_stack([params['plants'][n]['l'] + s['LX'] - s['LYf'] -
+        s['LYp'] for n, s in enumerate(series)])
+    np.savetxt(os.path.join(path, 'load.out'), load, fmt='%.2f')
+    log.info(" Wrote solution files to '{}'".format(path))
+    return c
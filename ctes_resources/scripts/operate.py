@@ -0,0 +1,277 @@
+# operate.py
+# CTES Optimization Processor
+# Receding-horizon dispatch of installed storage
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Once storage is installed, schedules charging and discharging for the next
+# 'horizon' hours with the units of 'optimization_results/Z.out' fixed. Each
+# run slices the window from the AMPL files of the project (re-run the
+# pre-processing with updated loads or weather first), starts the tanks from
+# the carried-over inventory, and holds the month-to-date demand peaks as
+# lower bounds on the demand charges, so that only new peaks are paid for.
+# The schedule is written to 'operations/<timestep>/' in the form of ctes.run
+# outputs, and the state is advanced over the first 'commit' hours into
+# 'operations/state.json':
+#   timestep - next timestep to schedule (1-based)
+#   Q        - tank inventory by plant [kWh]; replace with metered values
+#   peaks    - peak of each demand period so far [kW]
+# Every solve appends its timing (load, build, solve, and total, against
+# the time limit) to 'operations/timing.csv'. A window that can not be
+# solved within the time limit is scheduled with the storage idle.
+#
+# The Operator keeps the AMPL parameters and the built window models between
+# calls (pipeline.Pipeline holds one per project); a window solved again with
+# a new state only has its bounds changed. Parameters are reloaded when the
+# AMPL files or Z.out change.
+
+import collections
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+import common
+import model
+import warm
+
+SETTINGS = {
+    'horizon': 48,
+    'commit': 24,
+    'time_limit': 10,
+    'no_full': True,
+    'threads': None,
+    'models': 4
+}
+FIELDS = ['date', 'start', 'steps', 'N', 'cached_params', 'cached_model',
+    'load_time', 'build_time', 'solve_time', 'total_time', 'time_limit',
+    'within_limit', 'status', 'objective', 'gap']
+
+#-------------------------------------------------------------------------------
+class Operator:
+    # Settings (program_manager.json 'operations' entry):
+    #   horizon - hours scheduled from the start
+    #   commit - hours applied before the next run
+    #   time_limit - latency budget for loading, building, and solving [s]
+    #   no_full - restrict full storage operation to DR timesteps
+    #   threads - solver threads
+    #   models - number of built windows kept
+    def __init__(self, ampl_path, z_file, settings=None):
+        self.ampl_path = ampl_path
+        self.z_file = z_file
+        self.settings = dict(SETTINGS, **(settings or {}))
+        self.params = None
+        self.Z = None
+        self.stamps = None
+        self.reload_time = 0
+        self.models = collections.OrderedDict()
+
+    def load(self):
+        # Parameters and units, reloaded if their files changed; returns
+        # True if the cached ones were used
+        start = time.time()
+        if not os.path.isfile(self.z_file):
+            raise common.InputError("No installed storage in '{}'; solve " \
+                "the project first".format(self.z_file))
+        stamps = [(e.name, e.stat().st_size, e.stat().st_mtime_ns)
+            for e in os.scandir(self.ampl_path) if e.is_file()]
+        st = os.stat(self.z_file)
+        stamps.append((self.z_file, st.st_size, st.st_mtime_ns))
+        if stamps == self.stamps:
+            return True
+        self.params = model.load(self.ampl_path)
+        self.Z = np.loadtxt(self.z_file, ndmin=2)
+        if self.Z.shape != (self.params['N'], self.params['I']):
+            raise common.InputError("Z.out has {} units, not {} plants x {} " \
+                "types; solve the project again".format(self.Z.shape,
+                self.params['N'], self.params['I']))
+        self.stamps = stamps
+        self.models.clear()
+        self.reload_time = time.time() - start
+        return False
+
+    def schedule(self, start, Q, peaks, log):
+        # Schedule from timestep 'start' (0-based) with tank inventory Q
+        # [kWh] and demand period peaks [kW]; returns the window, series,
+        # community profile, and timing
+        begin = time.time()
+        s = self.settings
+        cached = self.load()
+        # A reload by an earlier call of load (eg. in run) counts here
+        if cached and self.reload_time:
+            begin -= self.reload_time
+            cached = False
+        self.reload_time = 0
+        stats = {'cached_params': cached}
+        params = self.params
+        steps = int(round(s['horizon'] / params['delta']))
+        if not 0 <= start < params['T']:
+            raise common.InputError("Start timestep {} is outside 1..{}".format(
+                start + 1, params['T']))
+        stats['load_time'] = time.time() - begin
+        key = (start, steps)
+        stats['cached_model'] = key in self.models
+        if stats['cached_model']:
+            m, window = self.models[key]
+            self.models.move_to_end(key)
+            for n in range(params['N']):
+                m.set_bounds(m.var[('Q0', n)], Q[n], Q[n])
+        else:
+            window = model.window(params, start, steps)
+            m = model.build(window, no_full=s['no_full'], initial=Q)
+            for n in range(params['N']):
+                m.set_bounds(m.var[('Z', n)], self.Z[n], self.Z[n])
+            self.models[key] = (m, window)
+            if len(self.models) > s['models']:
+                self.models.popitem(last=False)
+        m.set_bounds(m.var['Pd'], peaks, np.inf)
+        stats['build_time'] = time.time() - begin - stats['load_time']
+        # The solver gets what is left of the time limit
+        left = s['time_limit'] - (time.time() - begin) if s['time_limit'] \
+            else None
+        r = m.solve(time_limit=max(left, 0.01) if left is not None else None,
+            threads=s['threads'])
+        stats['solve_time'] = r['solve_time']
+        if r['x'] is None:
+            log.warning(" Window from timestep {} not solved ({}); storage " \
+                "left idle".format(start + 1, r['status']))
+            x = idle(m, window, Q, peaks)
+        else:
+            x = r['x']
+        series = [model.plant_series(m, x, window, n)
+            for n in range(window['N'])]
+        stats.update({
+            'start': start + 1,
+            'steps': window['T'],
+            'N': window['N'],
+            'status': r['status'] if r['x'] is not None else 'idle',
+            'objective': r['objective'],
+            'gap': r['gap'],
+            'total_time': time.time() - begin,
+            'time_limit': s['time_limit']
+        })
+        stats['within_limit'] = (not s['time_limit'] or
+            stats['total_time'] <= s['time_limit'])
+        return {'window': window, 'series': series, 'P': x[m.var['P']],
+            'stats': stats}
+#-------------------------------------------------------------------------------
+# Solution with the storage idle: the tanks only lose inventory
+def idle(m, window, Q, peaks):
+    x = np.zeros(m.ncol)
+    decay = model.ETA ** np.arange(1, window['T'] + 1)
+    for n in range(window['N']):
+        x[m.var[('Z', n)]] = m.lb[m.var[('Z', n)]]
+        x[m.var[('Q0', n)]] = Q[n]
+        x[m.var[('Q', n)]] = Q[n] * decay
+    P = np.maximum(window['p'], 0)
+    x[m.var['P']] = P
+    x[m.var['Pd']] = [max(peaks[d], P[Td].max() if len(Td) else 0)
+        for d, Td in enumerate(window['Td'])]
+    return x
+#-------------------------------------------------------------------------------
+# Run one window for a project, from 'start' (1-based timestep or
+# 'MM-DD[THH:MM]') or the timestep of the saved state, and advance the state;
+# an Operator from an earlier call is reused if given
+def run(project, log, settings=None, start=None, operator=None):
+    path = os.path.join(project, 'operations')
+    os.makedirs(path, exist_ok=True)
+    if operator is None:
+        operator = Operator(os.path.join(project, 'ampl_files'),
+            os.path.join(project, 'optimization_results', 'Z.out'), settings)
+    operator.load()
+    params = operator.params
+    names = labels(operator.ampl_path, params['N'])
+    state = read_state(path, names, params, log)
+    t = state['timestep'] if start is None else timestep(start,
+        params['delta'])
+    result = operator.schedule(t - 1, state['Q'], state['peaks'], log)
+    stats = result['stats']
+    out = os.path.join(path, str(t))
+    os.makedirs(out, exist_ok=True)
+    model.write_outputs(result['window'], result['series'], out, log)
+    # Advance the state over the committed hours
+    c = min(int(round(operator.settings['commit'] / params['delta'])),
+        result['window']['T'])
+    P = result['P']
+    peaks = [max(state['peaks'][d], float(P[Td[Td < c]].max()) if
+        (Td < c).any() else 0) for d, Td in enumerate(result['window']['Td'])]
+    state = {
+        'timestep': t + c,
+        'Q': {names[n]: round(float(s['Q'][c - 1]), 3) for n, s in
+            enumerate(result['series'])},
+        'peaks': [round(float(p), 3) for p in peaks]
+    }
+    write_json(os.path.join(path, 'state.json'), state)
+    timing(path, stats)
+    msg = "Scheduled {} timesteps from {} ({}) in {:.2f} s: load {:.2f} s, " \
+        "build {:.2f} s, solve {:.2f} s{}".format(stats['steps'], t,
+        stats['status'], stats['total_time'], stats['load_time'],
+        stats['build_time'], stats['solve_time'], "" if
+        stats['within_limit'] else " (over the {} s limit)".format(
+        stats['time_limit']))
+    print(msg)
+    log.info(msg)
+    if not stats['within_limit']:
+        log.warning(msg)
+    return dict(result, state=state, operator=operator)
+#-------------------------------------------------------------------------------
+# Plant names from plants.json, or plant numbers
+def labels(ampl_path, N):
+    plants = warm.names(ampl_path)
+    if plants is not None and len(plants['plants']) == N:
+        return list(plants['plants'])
+    return [str(n + 1) for n in range(N)]
+#-------------------------------------------------------------------------------
+# Saved state, or empty tanks and no peaks at the start of the year. Plants
+# without a saved inventory start empty.
+def read_state(path, names, params, log):
+    state = {'timestep': 1, 'Q': {}, 'peaks': []}
+    try:
+        with open(os.path.join(path, 'state.json'), 'r') as f:
+            state.update(json.load(f))
+        f.close()
+    except OSError:
+        log.info(" No operations state; starting from empty tanks")
+    missing = [n for n in names if n not in state['Q']]
+    if missing and state['Q']:
+        log.warning(" No inventory for {} plants; starting them " \
+            "empty".format(len(missing)))
+    peaks = state['peaks']
+    if len(peaks) != params['D']:
+        peaks = [0] * params['D']
+    return {'timestep': state['timestep'],
+        'Q': np.array([state['Q'].get(n, 0) for n in names], float),
+        'peaks': np.array(peaks, float)}
+#-------------------------------------------------------------------------------
+# 1-based timestep from a timestep number or a date ('MM-DD[THH:MM]')
+def timestep(start, delta):
+    if str(start).isdigit():
+        return int(start)
+    try:
+        at = np.datetime64('2006-' + str(start), 'm')
+    except ValueError:
+        raise common.InputError("Start '{}' is not a timestep or " \
+            "'MM-DD[THH:MM]'".format(start))
+    minutes = (at - np.datetime64('2006-01-01T00:00')).astype(int)
+    return int(minutes // int(round(delta * 60))) + 1
+#-------------------------------------------------------------------------------
+def write_json(path, obj):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(obj, f, indent=2)
+    f.close()
+    os.replace(path + '.tmp', path)
+#-------------------------------------------------------------------------------
+def timing(path, stats):
+    out = os.path.join(path, 'timing.csv')
+    new = not os.path.isfile(out)
+    row = {k: round(v, 3) if isinstance(v, float) else v
+        for k, v in stats.items()}
+    row['date'] = time.strftime("%Y-%m-%d %H:%M:%S")
+    with open(out, 'a', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
+    f.close()
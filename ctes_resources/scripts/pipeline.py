@@ -0,0 +1,174 @@
+# pipeline.py
+# CTES Optimization Processor
+# In-process API for pre-processing, solving, and bill computation
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Usage from a long-lived process (with 'ctes_resources/scripts' on the
+# path):
+#   with pipeline.Pipeline(workers=4) as p:
+#       for name in projects:
+#           try:
+#               prep = p.preprocess(pipeline.Config(name))
+#               summary = p.solve(pipeline.Config(name), 'quick')
+#               bills = p.bills(pipeline.Config(name))
+#           except common.CtesError as e:
+#               ...
+# The process pool, and the parsed .eso cache held by its workers, is kept
+# between projects. Each project logs to its own 'ctes_processor.log'
+# unless a logger is given. Pool stages log through the logging module; their
+# records are passed back to the logger of the project being processed.
+# Storage operation windows (operate) keep each project's parameters and
+# built models between calls.
+
+import concurrent.futures
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+
+import common
+import create_erate
+import data_writer
+import decompose
+import jobs
+import operate
+import project_setup
+import quick
+import results
+import stages
+import summaries
+
+#-------------------------------------------------------------------------------
+class Config:
+    # Settings for one project:
+    #   project - project directory
+    #   overrides - values applied over program_manager.json
+    #   tariff - rate structure override for create_erate.run
+    #   fresh - ignore pre-processing checkpoints
+    def __init__(self, project, overrides=None, tariff=None, fresh=False):
+        self.project = project
+        self.overrides = overrides
+        self.tariff = tariff
+        self.fresh = fresh
+
+    def program_manager(self):
+        with open(os.path.join(self.project, 'program_manager.json'),
+            'r') as f:
+            pm = json.load(f)
+        f.close()
+        pm.update(self.overrides or {})
+        return pm
+#-------------------------------------------------------------------------------
+class Pipeline:
+    def __init__(self, workers=None, log=None):
+        self.forward = common.Forward(logging.getLogger())
+        self.queue = multiprocessing.Queue()
+        self.listener = logging.handlers.QueueListener(self.queue,
+            self.forward)
+        self.listener.start()
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers,
+            initializer=common.log_worker, initargs=(self.queue,))
+        self.log = log
+        self.loggers = {}
+        self.operators = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        self.listener.stop()
+        for l in self.loggers.values():
+            for h in list(l.handlers):
+                l.removeHandler(h)
+                h.close()
+        self.loggers.clear()
+
+    def logger(self, config):
+        # Injected logger, or one logger per project writing to its own file;
+        # pool stage records go to it from here on
+        if self.log is not None:
+            self.forward.log = self.log
+            return self.log
+        project = os.path.abspath(config.project)
+        if project not in self.loggers:
+            l = logging.getLogger('ctes.{}'.format(project))
+            l.setLevel(logging.DEBUG)
+            l.propagate = False
+            h = logging.FileHandler(os.path.join(project, 'project_workspace',
+                'ctes_processor.log'))
+            h.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+            l.addHandler(h)
+            self.loggers[project] = l
+        self.forward.log = self.loggers[project]
+        return self.loggers[project]
+
+    def preprocess(self, config):
+        # Staged pre-processing ('ctes.py -r'); returns the preprocess dict
+        project_setup.verify(config.project)
+        return stages.preprocess(config.project, self.logger(config),
+            fresh=config.fresh, overrides=config.overrides,
+            tariff=config.tariff, pool=self.pool)
+
+    def utility(self, config):
+        # New utility rate only ('ctes.py -u'); returns the preprocess dict
+        project_setup.verify(config.project)
+        log = self.logger(config)
+        with open(os.path.join(config.project, 'project_workspace',
+            'preprocess.json'), 'r') as f:
+            prep = json.load(f)
+        f.close()
+        prep['program_manager']['project_name'] = config.project
+        prep['utility_rate'] = create_erate.run(
+            prep['program_manager']['timesteps'], log, config.tariff)
+        data_writer.data_structure(prep, os.path.join(config.project,
+            'project_workspace', 'preprocessor_data_structure.txt'), log)
+        data_writer.write_json(prep, os.path.join(config.project,
+            'project_workspace'), "preprocess.json", log)
+        data_writer.ampl(prep, log)
+        return prep
+
+    def solve(self, config, method='quick'):
+        # 'quick', 'decompose', or 'jobs' with the program manager settings
+        project_setup.verify(config.project)
+        log = self.logger(config)
+        pm = config.program_manager()
+        if method == 'quick':
+            return quick.run(config.project, log, pm.get('quick'))
+        if method == 'decompose':
+            return decompose.run(config.project, log, pm.get('decomposition'))
+        if method == 'jobs':
+            return jobs.run([jobs.job(config.project,
+                os.path.join(config.project, 'ampl_files'),
+                os.path.join(config.project, 'optimization_results'))],
+                pm.get('solver'), os.path.join(config.project,
+                'project_workspace', 'solver_status.json'), log)
+        raise ValueError("Unknown solve method '{}'".format(method))
+
+    def operate(self, config, start=None):
+        # One receding-horizon window ('ctes.py -n'); the parameters and
+        # built windows are kept between calls for each project
+        project_setup.verify(config.project)
+        project = os.path.abspath(config.project)
+        r = operate.run(config.project, self.logger(config),
+            config.program_manager().get('operations'), start,
+            self.operators.get(project))
+        self.operators[project] = r['operator']
+        return r
+
+    def bills(self, config):
+        # results.json contents for the project and its scenarios
+        project_setup.verify(config.project)
+        return results.run(config.project, self.logger(config))
+
+    def summary(self, config, resolution='daily'):
+        # Community series at one resolution ('ctes.py -y'); returns the
+        # .csv files written
+        project_setup.verify(config.project)
+        return summaries.report(config.project, resolution,
+            self.logger(config))
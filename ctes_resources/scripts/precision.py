@@ -0,0 +1,100 @@
+# precision.py
+# CTES Optimization Processor
+# Reduced-precision storage of time series
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## With "precision": "float32" in program_manager.json, each time series
+# (a list of 8760 x timesteps values, or of per-timestep lists such as the
+# chiller discharge slopes) is kept as an array.array('f') once the stage
+# that builds it is done with it: as a building is parsed (each series is
+# resampled from the .eso store as an array and stored as float32 directly,
+# see common.from_array), after processing the storage of each plant, and
+# after clustering (see common.compact). Chiller and weather series stay
+# double precision until the storage models have used them, since the
+# chiller curves test them against thresholds (eg. minimum part load) and a
+# float32 input can flip a test. This takes 4 bytes per value instead of a
+# list entry and a Python float (about 32 bytes), which matters for 5 minute
+# runs ("timesteps": 12).
+#
+# Values read from the arrays are Python floats, so every calculation, and
+# every accumulation (community sums, energy totals, cluster sums), is still
+# done in double precision; community profiles are never reduced. The AMPL
+# files are written with 2-5 decimals, so the float32 inputs change them by
+# at most one unit in the last written digit, where a value falls next to a
+# rounding boundary. To verify this for a project run 'ctes.py -p <project>
+# -v', which pre-processes the project at both precisions into
+# 'project_workspace/precision_check' and compares every written value.
+
+import decimal
+import os
+import re
+
+import aggregator
+import buildings
+import cluster
+import create_erate
+import data_writer
+import storage
+
+PRECISIONS = ['float64', 'float32']
+
+#-------------------------------------------------------------------------------
+# Pre-process a project at each precision and compare the AMPL files
+def check(project, log):
+    path = os.path.join(project, 'project_workspace', 'precision_check')
+    for p in PRECISIONS:
+        print("Pre-processing with {} time series".format(p))
+        prep = buildings.run(project, log, {'project_name': project,
+            'precision': p})
+        prep = cluster.run(prep, log)
+        prep = storage.run(project, prep, log)
+        prep = aggregator.run(prep, log)
+        prep['utility_rate'] = create_erate.run(
+            prep['program_manager']['timesteps'], log)
+        os.makedirs(os.path.join(path, p), exist_ok=True)
+        data_writer.ampl(prep, log, os.path.join(path, p))
+    return compare(os.path.join(path, PRECISIONS[0]), os.path.join(path,
+        PRECISIONS[1]), log)
+#-------------------------------------------------------------------------------
+# Compare the values of two sets of AMPL files. A value passes if it differs
+# by no more than one unit in its last written digit. Returns the files that
+# fail.
+def compare(path_a, path_b, log):
+    failed = []
+    values = 0
+    changed = 0
+    for f in sorted(os.listdir(path_a)):
+        if not f.endswith('.dat'):
+            continue
+        a = tokens(os.path.join(path_a, f))
+        b = tokens(os.path.join(path_b, f))
+        if len(a) != len(b):
+            log.error(" {}: {} vs. {} values".format(f, len(a), len(b)))
+            failed.append(f)
+            continue
+        worst = 0
+        for x, y in zip(a, b):
+            if x == y:
+                continue
+            changed += 1
+            unit = decimal.Decimal(1).scaleb(max(x.as_tuple().exponent,
+                y.as_tuple().exponent))
+            worst = max(worst, abs(x - y) / unit)
+        values += len(a)
+        if worst > 1:
+            log.error(" {}: values differ by up to {} units in the last " \
+                "written digit".format(f, round(float(worst), 2)))
+            failed.append(f)
+    msg = "Precision check: {} of {} written values differ, {} of the " \
+        "files by more than one unit in the last written digit".format(
+            changed, values, len(failed))
+    print(msg)
+    log.info(msg)
+    return failed
+#-------------------------------------------------------------------------------
+def tokens(path):
+    with open(path, 'r') as f:
+        text = f.read()
+    f.close()
+    return [decimal.Decimal(v) for v in re.split(r'[,\s]+', text) if v]
@@ -4,14 +4,18 @@
 # Karl Heine, kheine@mines.edu, heinek@erau.edu
 # July 2021
 
+import concurrent.futures
 import csv
+import hashlib
 import json
 import logging as log
 import os
 import shutil
-import sys
 import time
 
+import common
+import eso_store
+
 def run(args):
     # Check for existance of input directories
     input_paths = []
@@ -45,8 +49,8 @@ def run(args):
         shutil.rmtree(args['project_name'])
         os.mkdir(args['project_name'])
     else:
-        sys.exit('Error: project already exists with that name. Use -o to ' \
-            'overwrite existing project.')
+        raise common.SetupError('Error: project already exists with that ' \
+            'name. Use -o to overwrite existing project.')
 
     for f in folders:
         os.mkdir(os.path.join(args['project_name'], f))
@@ -63,52 +67,39 @@ def run(args):
     log.info("Arguments: {}".format(args))
     print('Logger initialized: see project_workspace folder for .log file')
 
-    # Scrub input file paths for .osm, .eso, .epw, and chiller.dat files
-    chillers = []
-    esos = []
-    osms = []
-    wx = []
-    for p in input_paths:
-        for file in os.listdir(p):
-            filename = file
-            if file.endswith('.eso'):
-                if file == 'eplusout.eso':
-                    filename = input("WARNING: File is named 'eplusout.eso'. " \
-                        "Please specify a new file name for use in this " \
-                        "project: ")
-                elif file in esos:
-                    filename = input("WARNING: Filename {} already exists'. " \
-                        "Please specify a new file name for use in this " \
-                        "project: ".format(file))
-                esos.append(filename)
-                shutil.copy(os.path.join(p,file),
-                    os.path.join(args['project_name'],'building_simulations',
-                        filename))
-                log.info("{} added to project".format(filename))
-            elif file.endswith('.osm'):
-                if file in osms:
-                    filename = input("WARNING: Filename {} already exists'. " \
-                        "Please specify a new file name for use in this " \
-                        "project: ".format(file))
-                osms.append(filename)
-                shutil.copy(os.path.join(p,file),
-                    os.path.join(args['project_name'],'seed_models', filename))
-                log.info("{} added to project".format(filename))
-            elif file.endswith('.epw'):
-                wx.append(file)
-                shutil.copy(os.path.join(p,file),
-                    os.path.join(args['project_name'],'weather_files', file))
-                log.info("{} added to project".format(filename))
-            elif 'chiller' in file and file.endswith('.dat'):
-                if file in chillers:
-                    filename = input("WARNING: Filename {} already exists'. " \
-                        "Please specify a new file name for use in this " \
-                        "project: ".format(file))
-                chillers.append(filename)
-                shutil.copy(os.path.join(p,file),
-                    os.path.join(args['project_name'],'building_simulations',
-                        filename))
-                log.info("{} added to project".format(filename))
+    # Scrub input file paths for .osm, .eso, .epw, and chiller.dat files and
+    # name each one in the project
+    plan = []
+    for src, folder, filename in name_files(input_paths, folders):
+        file = os.path.basename(src)
+        if filename != file:
+            print("WARNING: '{}' in '{}' added to project as '{}'".format(
+                file, os.path.dirname(src), filename))
+            log.warning("'{}' in '{}' renamed to '{}'".format(file,
+                os.path.dirname(src), filename))
+        plan.append((src, folder, filename))
+
+    # Bring the files in concurrently and record them in a manifest
+    manifest = {}
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        futures = [pool.submit(ingest, src, os.path.join(args['project_name'],
+            folder, filename), args.get('link') or 'copy')
+            for src, folder, filename in plan]
+        for (src, folder, filename), fut in zip(plan, futures):
+            manifest[folder + '/' + filename] = fut.result()
+            log.info("{} added to project ({})".format(filename,
+                manifest[folder + '/' + filename]['method']))
+    with open(os.path.join(args['project_name'], 'project_workspace',
+        'setup_manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    f.close()
+    esos = [n for s, f, n in plan if n.endswith('.eso')]
+    osms = [n for s, f, n in plan if n.endswith('.osm')]
+    wx = [n for s, f, n in plan if n.endswith('.epw')]
+    chillers = [n for s, f, n in plan if n.endswith('.dat')]
+
+    # Parse each building simulation once for all later runs
+    eso_store.convert_all(args['project_name'], log)
 
     # Report summary of files transferred into project
     log.info("Expected project contents: {} .eso files, {} .osm files, {} " \
@@ -131,6 +122,11 @@ def run(args):
         'project_name': args['project_name'],
         'timesteps': 4,
         'segments': 3,
+        'segment_tolerance': None,
+        'cluster': None,
+        'weather': None,
+        'weather_workers': None,
+        'precision': 'float64',
         'utss': 'ib40',
         'ctes': '1170c'
     }
@@ -147,16 +143,127 @@ def run(args):
 
     return
 
-def check(project):
-    # Check for project directory
-    if not os.path.isdir(project):
-        sys.exit("Project '{}' does not exist; " \
-        "perform setup with -s first".format(project))
+# Project folder for an input file, or None if the file is not used
+def destination(file):
+    if file.endswith('.eso'):
+        return 'building_simulations'
+    elif file.endswith('.osm'):
+        return 'seed_models'
+    elif file.endswith('.epw'):
+        return 'weather_files'
+    elif 'chiller' in file and file.endswith('.dat'):
+        return 'building_simulations'
+    return None
 
-    # Check for districts.csv
-    if not os.path.isfile(os.path.join(project, 'ctes_district.csv')):
-        sys.exit("ctes_district.csv file is missing; " \
-            "re-create file manually or by re-performing setup with -s")
+# Source, project folder, and project name of each input file. Input folders
+# are read in the given order and files in name order, so that renamed files
+# are the same every time. Simulations are named first; a chiller .dat is
+# named after the simulation of its folder, '<building>_<chiller>.dat', as
+# buildings.chiller_data reads it.
+def name_files(input_paths, folders):
+    plan = []
+    taken = {f: [] for f in folders}
+    for p in input_paths:
+        files = sorted(os.listdir(p), key=lambda f: (not f.endswith('.eso'),
+            f))
+        buildings = {}
+        for file in files:
+            folder = destination(file)
+            if folder is None:
+                continue
+            if file.endswith('.eso'):
+                filename = project_name(file, p, taken[folder])
+                buildings[file[:-4]] = filename[:-4]
+            elif file.endswith('.dat'):
+                filename = chiller_name(file, p, buildings, taken[folder])
+            else:
+                filename = project_name(file, p, taken[folder])
+            plan.append((os.path.join(p, file), folder, filename))
+    return plan
+
+# Name for a file from input folder 'path' that is not in 'taken'. An
+# 'eplusout.eso' is named after its folder; a name already in use gets the
+# folder name as a prefix, then a number.
+def project_name(file, path, taken):
+    folder = os.path.basename(os.path.normpath(path))
+    name = file
+    if file == 'eplusout.eso':
+        name = folder + '.eso'
+    return unique(name, folder, taken)
+
+# Name for a chiller .dat from input folder 'path', given the project names
+# of the simulations in the folder by their input names. A .dat prefixed
+# with a simulation name follows that simulation; one that is not, in a
+# folder with a single simulation, gets its name as a prefix.
+def chiller_name(file, path, buildings, taken):
+    folder = os.path.basename(os.path.normpath(path))
+    name = file
+    for old, new in sorted(buildings.items(), key=lambda b: -len(b[0])):
+        if file.startswith(old + '_'):
+            name = new + file[len(old):]
+            break
+    else:
+        if len(buildings) == 1:
+            name = list(buildings.values())[0] + '_' + file
+    return unique(name, folder, taken)
+
+def unique(name, folder, taken):
+    if name in taken:
+        name = folder + '_' + name
+    base, ext = os.path.splitext(name)
+    i = 2
+    while name in taken:
+        name = '{}_{}{}'.format(base, i, ext)
+        i += 1
+    taken.append(name)
+    return name
+
+# Link or copy one input file into the project ('copy', 'hardlink',
+# 'reflink', or 'symlink'; links fall back to a copy where they can not be
+# made, eg. across file systems). Returns the manifest entry for the file.
+def ingest(src, dst, link):
+    method = link
+    try:
+        if link == 'hardlink':
+            os.link(src, dst)
+        elif link == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+        elif link == 'reflink':
+            reflink(src, dst)
+        else:
+            method = 'copy'
+            shutil.copy(src, dst)
+    except OSError:
+        if os.path.lexists(dst):
+            os.remove(dst)
+        method = 'copy'
+        shutil.copy(src, dst)
+    h = hashlib.sha1()
+    with open(dst, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    f.close()
+    return {
+        'source': os.path.abspath(src),
+        'method': method,
+        'size': os.path.getsize(dst),
+        'sha1': h.hexdigest()
+    }
+
+# Copy-on-write clone of a file (Linux FICLONE); raises OSError where the
+# file system or platform does not support it
+def reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflink is not supported on this platform")
+    FICLONE = 0x40049409
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copymode(src, dst)
+
+def check(project):
+    verify(project)
 
     # The above checks imply that the setup process was executed. Now create
     # the logger and pass back to the main program.
@@ -174,3 +281,16 @@ def check(project):
     log.info('Initial setup check: passed')
 
     return log
+
+def verify(project):
+    # Check for project directory
+    if not os.path.isdir(project):
+        raise common.SetupError("Project '{}' does not exist; " \
+        "perform setup with -s first".format(project))
+
+    # Check for districts.csv
+    if not os.path.isfile(os.path.join(project, 'ctes_district.csv')):
+        raise common.SetupError("ctes_district.csv file is missing; " \
+            "re-create file manually or by re-performing setup with -s")
+
+    return
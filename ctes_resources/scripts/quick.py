@@ -0,0 +1,91 @@
+# quick.py
+# CTES Optimization Processor
+# Fast approximate solve: LP relaxation followed by a rounding heuristic
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import os
+import time
+
+import numpy as np
+
+import model
+import summaries
+
+#-------------------------------------------------------------------------------
+def run(project, log, settings=None):
+    # Settings (program_manager.json 'quick' entry):
+    #   time_limit - time limit for each LP solve [s]
+    #   no_full - restrict full storage operation to DR timesteps
+    settings = dict({'time_limit': None, 'no_full': True}, **(settings or {}))
+    log.info("Executing LP relaxation and rounding heuristic: {}".format(
+        settings))
+    start = time.time()
+    params = model.load(os.path.join(project, 'ampl_files'))
+    m = model.build(params, relax=True, no_full=settings['no_full'])
+    # LP relaxation (continuous Z and alpha) gives the lower bound
+    lp = m.solve(time_limit=settings['time_limit'])
+    if lp['x'] is None:
+        msg = "LP relaxation failed: {}".format(lp['status'])
+        log.error(msg)
+        return None
+    log.info(" LP relaxation bound: {:.2f}".format(lp['bound']))
+    x = lp['x']
+    # Round Z per plant and alpha during DR events; alpha is fixed at zero
+    # outside Tr
+    fixed = {}
+    for n in range(params['N']):
+        cols = m.var[('Z', n)]
+        fixed[('Z', n)] = (cols, np.clip(np.round(x[cols]), m.lb[cols],
+            m.ub[cols]))
+        cols = m.var[('alpha', n)]
+        in_Tr = np.isin(params['plants'][n]['TYf'], params['Tr'])
+        fixed[('alpha', n)] = (cols, np.where(in_Tr, np.round(x[cols]), 0))
+    heuristic = fix_and_solve(m, fixed.values(), settings)
+    if heuristic['x'] is None:
+        # Repair: drop full storage operation, which is always feasible
+        log.info(" Rounded full storage schedule infeasible; repairing")
+        for n in range(params['N']):
+            cols = m.var[('alpha', n)]
+            fixed[('alpha', n)] = (cols, np.zeros(len(cols)))
+        heuristic = fix_and_solve(m, fixed.values(), settings)
+    if heuristic['x'] is None:
+        # eg. the time limit was reached
+        msg = "Rounded solution could not be repaired: {}".format(
+            heuristic['status'])
+        log.error(msg)
+        return None
+    series = [model.plant_series(m, heuristic['x'], params, n)
+        for n in range(params['N'])]
+    # Report and write outputs in the same form as the full solve
+    path = os.path.join(project, 'optimization_results')
+    c = model.write_outputs(params, series, path, log)
+    summaries.write(os.path.join(project, 'ampl_files'), path, log)
+    gap = (c['annual_cost'] - lp['bound']) / max(abs(c['annual_cost']), 1e-6)
+    summary = {
+        'lp_bound': lp['bound'],
+        'objective': c['annual_cost'],
+        'gap': gap,
+        'Z': [s['Z'].tolist() for s in series],
+        'solve_time': time.time() - start
+    }
+    with open(os.path.join(path, 'quick.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    f.close()
+    msg = "Quick solve: objective {:.2f}, LP bound {:.2f}, gap {:.4%} " \
+        "({:.1f} s)".format(c['annual_cost'], lp['bound'], gap,
+        summary['solve_time'])
+    print(msg)
+    log.info(msg)
+    return summary
+#-------------------------------------------------------------------------------
+# Fix column values and re-solve the remaining LP from the current basis
+def fix_and_solve(m, fixed, settings):
+    lb = m.lb.copy()
+    ub = m.ub.copy()
+    for cols, vals in fixed:
+        lb[cols] = vals
+        ub[cols] = vals
+    m.highs.changeColsBounds(m.ncol, np.arange(m.ncol), lb, ub)
+    return m.solve(time_limit=settings['time_limit'])
@@ -0,0 +1,151 @@
+# results.py
+# CTES Optimization Processor
+# Load solver outputs and compute baseline and optimal utility bills
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+import common
+
+#-------------------------------------------------------------------------------
+def run(project, log):
+    # Populate results_schema.json for the project and every sweep, ensemble,
+    # or weather scenario with solver outputs
+    with open(os.path.join(common.RESOURCES, 'schemas',
+        'results_schema.json'), 'r') as f:
+        schema = json.load(f)
+    f.close()
+    res_list = []
+    start = time.time()
+    for ampl_path, results_path in pairs(project):
+        if not os.path.isfile(os.path.join(results_path, 'P.out')):
+            continue
+        res = bills(load_inputs(ampl_path), load_outputs(results_path),
+            copy.deepcopy(schema))
+        with open(os.path.join(results_path, 'results.json'), 'w') as f:
+            json.dump(res, f, indent=2)
+        f.close()
+        res_list.append(res)
+        log.info(" Results written to '{}': total bill {} -> {}".format(
+            results_path, res['cost']['baseline']['total_bill'],
+            res['cost']['optimal']['total_bill']))
+    msg = "Computed bills for {} result set(s) in {:.2f} s".format(
+        len(res_list), time.time() - start)
+    print(msg)
+    log.info(msg)
+    return res_list
+#-------------------------------------------------------------------------------
+# AMPL files and results folders of the project and every sweep, ensemble,
+# or weather scenario
+def pairs(project):
+    found = [(os.path.join(project, 'ampl_files'),
+        os.path.join(project, 'optimization_results'))]
+    for d in ['sweep', 'ensemble', 'weather']:
+        path = os.path.join(project, d)
+        if os.path.isdir(path):
+            for s in sorted(os.listdir(path)):
+                found.append((os.path.join(path, s, 'ampl_files'),
+                    os.path.join(path, s, 'optimization_results')))
+    return found
+#-------------------------------------------------------------------------------
+# Bulk read of a whitespace/comma separated numeric file
+def read(path, filename):
+    with open(os.path.join(path, filename), 'r') as f:
+        return np.array(f.read().replace(',', ' ').split(), dtype=float)
+#-------------------------------------------------------------------------------
+# Rate structure and baseline profile from the AMPL inputs
+def load_inputs(ampl_path):
+    with open(os.path.join(ampl_path, 'fixed_params.dat'), 'r') as f:
+        fixed = [[float(v) for v in line.split(',')] for line in f]
+    inputs = {
+        'N': int(fixed[2][0]),
+        'T': int(fixed[3][0]),
+        'Td_ct': np.array(fixed[4], dtype=int),
+        'delta': fixed[8][0],
+        'yrs': np.array(fixed[9]),
+        'k': np.array(fixed[10]),
+        'c_d': np.array(fixed[11]),
+        'qbar': np.array(fixed[13 + int(fixed[1][0])]),
+        'c_e': read(ampl_path, 'cost_elec.dat'),
+        'p': read(ampl_path, 'p.dat'),
+        # Demand period timesteps, concatenated in period order (0-based)
+        'Td': read(ampl_path, 'Td.dat').astype(int) - 1
+    }
+    # Month of each timestep (non-leap year)
+    minutes = (np.arange(inputs['T']) * inputs['delta'] * 60).astype(
+        'timedelta64[m]')
+    inputs['month'] = ((np.datetime64('2006-01-01T00:00') + minutes).astype(
+        'datetime64[M]').astype(int) % 12)
+    return inputs
+#-------------------------------------------------------------------------------
+def load_outputs(results_path):
+    outputs = {'P': read(results_path, 'P.out')}
+    for name in ['PX', 'LX', 'LYf', 'LYp']:
+        if os.path.isfile(os.path.join(results_path, name + '.out')):
+            outputs[name] = read(results_path, name + '.out').reshape(
+                len(outputs['P']), -1)
+    if os.path.isfile(os.path.join(results_path, 'Z.out')):
+        outputs['Z'] = np.loadtxt(os.path.join(results_path, 'Z.out'),
+            ndmin=2)
+    return outputs
+#-------------------------------------------------------------------------------
+# Demand charges: peak of each demand period by masked reduction
+def demand(inputs, profile):
+    ct = inputs['Td_ct']
+    peaks = np.zeros(len(ct))
+    has = ct > 0
+    offsets = np.concatenate([[0], np.cumsum(ct)[:-1]])[has].astype(int)
+    if has.any():
+        peaks[has] = np.maximum.reduceat(profile[inputs['Td']], offsets)
+    # Assign each period to the month of its first timestep
+    months = inputs['month'][inputs['Td'][offsets]]
+    monthly = np.bincount(months, weights=(inputs['c_d'] * peaks)[has],
+        minlength=12)
+    return peaks, monthly
+#-------------------------------------------------------------------------------
+def bills(inputs, outputs, res):
+    P = outputs['P']
+    p = inputs['p']
+    delta = inputs['delta']
+    # Charging and discharging timesteps from the optimal schedule
+    charge = np.zeros(len(P), bool)
+    discharge = np.zeros(len(P), bool)
+    if 'LX' in outputs:
+        charge = outputs['LX'].sum(axis=1) > 0
+    for name in ['LYf', 'LYp']:
+        if name in outputs:
+            discharge |= outputs[name].sum(axis=1) > 0
+    for case, profile in [('baseline', p), ('optimal', P)]:
+        peaks, monthly = demand(inputs, profile)
+        e_bill = float(np.dot(inputs['c_e'], profile) * delta)
+        d_bill = float(monthly.sum())
+        c = res['cost'][case]
+        c['energy_bill_$_kWh'] = round(e_bill, 2)
+        c['demand_bill_$_kW'] = round(d_bill, 2)
+        c['demand_bill_monthly_$_kW'] = [round(float(v), 2) for v in monthly]
+        c['total_bill'] = round(e_bill + d_bill, 2)
+        # Monthly peak demand
+        peak = np.zeros(12)
+        np.maximum.at(peak, inputs['month'], profile)
+        e = res['energy'][case]
+        e['peak_demand_kW'] = [round(float(v), 2) for v in peak]
+        e['total_electricity_kWh'] = round(float(profile.sum() * delta), 2)
+        e['total_elec_during_charge_kWh'] = round(float(
+            profile[charge].sum() * delta), 2)
+        e['total_elec_during_discharge_kWh'] = round(float(
+            profile[discharge].sum() * delta), 2)
+    # Annualized storage cost
+    storage = 0
+    if 'Z' in outputs:
+        storage = float(np.dot(common.unit_cost(inputs['k'], inputs['qbar'],
+            inputs['yrs']), outputs['Z'].sum(axis=0)))
+    res['cost']['optimal']['storage_bill'] = round(storage, 2)
+    res['cost']['optimal']['total_bill'] = round(
+        res['cost']['optimal']['total_bill'] + storage, 2)
+    return res
@@ -0,0 +1,141 @@
+# sensitivity.py
+# CTES Optimization Processor
+# Cost sensitivity studies on one persistent model instance
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Sensitivity files are JSON of the form:
+# {
+#   "label": "capex",
+#   "grid": {"k": [0.5, 1, 1.5], "yrs": [15, 20], "c_d": [1],
+#            "energy_multiplier": [1.31], "zbar": [null, 2]},
+#   "solve": {"relax": false, "no_full": true, "time_limit": 60,
+#             "mip_gap": null, "threads": null}
+# }
+# Grid settings (every combination is a point):
+#   k                 - multiplier on the storage costs of the AMPL files
+#                       (a number, or a list by CTES type)
+#   yrs               - storage lifetime [years] (a number, or a list by
+#                       type; null for the AMPL files' values)
+#   c_d               - multiplier on the demand charges
+#   energy_multiplier - multiplier on energy charges in the objective
+#   zbar              - upper bound on the units of each CTES type per plant
+#                       (null for the AMPL files' values)
+# The project's AMPL files are loaded and the model is built once. Each
+# point changes the objective coefficients and the Z bounds of the built
+# model in place and re-solves it, from the current basis for LPs ("relax")
+# and from the previous point's solution as the MIP start otherwise. One
+# row per point is written to 'sensitivity/<label>.csv' (the settings,
+# status, objective, bills, units installed by type, and solve time).
+
+import csv
+import itertools
+import json
+import os
+import time
+
+import highspy
+import numpy as np
+
+import common
+import model
+
+GRID_DEFAULTS = {
+    'k': [1],
+    'yrs': [None],
+    'c_d': [1],
+    'energy_multiplier': [model.ENERGY_MULTIPLIER],
+    'zbar': [None]
+}
+SOLVE_DEFAULTS = {
+    'relax': False,
+    'no_full': True,
+    'time_limit': None,
+    'mip_gap': None,
+    'threads': None
+}
+
+#-------------------------------------------------------------------------------
+def run(project, spec_file, log):
+    with open(spec_file, 'r') as f:
+        spec = json.load(f)
+    f.close()
+    label = spec.get('label', os.path.splitext(os.path.basename(
+        spec_file))[0])
+    settings = dict(SOLVE_DEFAULTS, **spec.get('solve', {}))
+    keys = sorted(GRID_DEFAULTS.keys())
+    grid = dict(GRID_DEFAULTS, **spec.get('grid', {}))
+    points = [dict(zip(keys, v)) for v in itertools.product(*[grid[k]
+        for k in keys])]
+    msg = "Sensitivity study '{}': {} points".format(label, len(points))
+    print(msg)
+    log.info(msg)
+    start = time.time()
+    params = model.load(os.path.join(project, 'ampl_files'))
+    m = model.build(params, relax=settings['relax'],
+        no_full=settings['no_full'])
+    highspy.Highs.resetGlobalScheduler(True)
+    m.to_highs(settings['threads'])
+    log.info(" Model built once in {:.2f} s: {}".format(time.time() - start,
+        m.stats()))
+    path = os.path.join(project, 'sensitivity')
+    os.makedirs(path, exist_ok=True)
+    out = os.path.join(path, label + '.csv')
+    fields = keys + ['status', 'objective', 'bound', 'gap', 'e_bill',
+        'd_bill', 'capex'] + ['Z_{}'.format(i + 1)
+        for i in range(params['I'])] + ['solve_time']
+    x = None
+    with open(out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for p in points:
+            row = solve(m, params, p, settings, x)
+            if row['x'] is not None:
+                x = row['x']
+            del row['x']
+            writer.writerow(row)
+            f.flush()
+            log.info(" {}: {} in {} s, objective {}".format(p, row['status'],
+                row['solve_time'], row['objective']))
+    f.close()
+    msg = "Sensitivity study complete in {:.1f} s: see '{}'".format(
+        time.time() - start, out)
+    print(msg)
+    log.info(msg)
+    return out
+#-------------------------------------------------------------------------------
+# Apply one point to the model and re-solve, from 'x' if given; returns the
+# results row with the solution
+def solve(m, params, p, settings, x=None):
+    k = params['k'] * np.asarray(p['k'], float)
+    yrs = params['yrs'] if p['yrs'] is None else np.broadcast_to(p['yrs'],
+        params['I'])
+    c_d = params['c_d'] * np.asarray(p['c_d'], float)
+    model.reprice(m, params, k=k, yrs=yrs, c_d=c_d,
+        energy_multiplier=p['energy_multiplier'])
+    zbar = params['zbar'] if p['zbar'] is None else np.minimum(
+        params['zbar'], p['zbar'])
+    for n in range(params['N']):
+        cols = m.var[('Z', n)]
+        m.set_bounds(cols, 0, zbar[:len(cols), n])
+    start = None
+    if x is not None and not settings['relax']:
+        start = (np.arange(m.ncol), np.minimum(x, m.ub))
+    r = m.solve(time_limit=settings['time_limit'],
+        mip_gap=settings['mip_gap'], start=start)
+    row = dict(p, status=r['status'], objective=r['objective'],
+        bound=r['bound'], gap=r['gap'], solve_time=round(r['solve_time'], 3),
+        x=r['x'])
+    if r['x'] is not None:
+        P = r['x'][m.var['P']]
+        Z = np.array([r['x'][m.var[('Z', n)]] for n in range(params['N'])])
+        row.update({
+            'e_bill': round(float(np.dot(params['c_e'], P) *
+                params['delta']), 2),
+            'd_bill': round(float(np.dot(c_d, r['x'][m.var['Pd']])), 2),
+            'capex': round(float(np.dot(common.unit_cost(k, params['qbar'],
+                yrs), Z.sum(axis=0))), 2)
+        })
+        for i in range(params['I']):
+            row['Z_{}'.format(i + 1)] = round(float(Z[:, i].sum()), 2)
+    return row
@@ -0,0 +1,276 @@
+# shards.py
+# CTES Optimization Processor
+# Sharded pre-processing through a file-based work queue
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## For portfolios too large for one machine. The coordinator ('ctes.py -p
+# <project> -m <shared>') writes one task per building of ctes_district.csv
+# to '<shared>/tasks'. Workers on any node that sees the shared directory and
+# the project at the same absolute path ('ctes.py -g <shared>') claim tasks
+# by renaming them into '<shared>/claimed' as '<task>.<claim id>', parse the
+# building and run its storage models, and write the result to
+# '<shared>/results'.
+#
+# A worker refreshes the time of its claimed task while working on it; a
+# claim that is not refreshed for 'lease' seconds (a crashed or lost worker)
+# is moved back to the queue by the coordinator. A worker that was only
+# stalled finds its claim gone and leaves the new owner's claim alone. The
+# coordinator merges the results in ctes_district.csv order (which assigns
+# the plant indices) and runs clustering, validation, aggregation, and
+# writing as the stage pipeline does.
+#
+# Storage is run on the workers unless clustering is set, more than one
+# weather file is present, or the project has district loops; those need all
+# buildings first, so the coordinator runs storage itself.
+# Use '-j <n>' with -m to start n local worker processes (eg. for testing).
+
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+import uuid
+
+import buildings
+import common
+import create_erate
+import stages
+import storage
+
+# Seconds without a refresh before a claimed task is re-queued
+LEASE = 60
+# Seconds between checks of the queue
+POLL = 0.5
+
+#-------------------------------------------------------------------------------
+def folders(shared):
+    paths = {k: os.path.join(shared, k) for k in ['tasks', 'claimed',
+        'results']}
+    for p in paths.values():
+        os.makedirs(p, exist_ok=True)
+    return paths
+#-------------------------------------------------------------------------------
+# Write a file by renaming, so that it is never seen partly written
+def put(path, obj):
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+#-------------------------------------------------------------------------------
+def get(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+#-------------------------------------------------------------------------------
+# Coordinator: queue the buildings, collect the parts, and finish the
+# pre-processing; returns the preprocess dict
+def coordinate(project, shared, log, workers=0, lease=LEASE):
+    paths = folders(shared)
+    pm = buildings.setup(project, log)['program_manager']
+    pm['project_name'] = project
+    rows = buildings.district(project)
+    parsed = [r for r in rows if r[2] != "SET BEFORE RUNNING!"]
+    wx = buildings.primary_weather(project, {'program_manager': pm}, log)
+    # Workers read the project at its absolute path
+    task_pm = stages.select(pm, ['timesteps', 'precision'] +
+        stages.STORAGE_SETTINGS)
+    task_pm['project_name'] = os.path.abspath(project)
+    remote_storage = (not pm.get('cluster') and
+        len(buildings.weather_files(project, pm)[0]) < 2 and
+        all([r[2] in ['rtu', 'chiller'] for r in parsed]))
+    # Task names start with a run id, so that late results from an earlier
+    # run are never taken for this one's
+    run_id = uuid.uuid4().hex[:12]
+    names = []
+    for i, (id, bldg, type) in enumerate(parsed):
+        names.append("{}_{:05d}".format(run_id, i))
+        put(os.path.join(paths['tasks'], names[-1]), {'pm': task_pm,
+            'bldg': bldg, 'type': type, 'lease': lease,
+            'weather': wx if remote_storage else None})
+    msg = "Queued {} building tasks in '{}' (run {})".format(len(names),
+        shared, run_id)
+    print(msg)
+    log.info(msg)
+    local = []
+    for i in range(workers):
+        local.append(multiprocessing.Process(target=local_worker,
+            args=(shared,), daemon=True))
+        local[-1].start()
+    if workers == 0:
+        print("Waiting for workers: run 'ctes.py -g {}' on each " \
+            "node".format(shared))
+    try:
+        parts = collect(paths, names, log, lease)
+    finally:
+        for p in local:
+            p.terminate()
+        # Withdraw tasks left after a failure, and late duplicate results
+        for n in names:
+            for k in ['tasks', 'results']:
+                if os.path.isfile(os.path.join(paths[k], n)):
+                    os.remove(os.path.join(paths[k], n))
+        for c in os.listdir(paths['claimed']):
+            if task_name(c) in names:
+                try:
+                    os.remove(os.path.join(paths['claimed'], c))
+                except OSError:
+                    pass
+    # Finish as the stage pipeline does
+    parse_pm = stages.select(pm, ['project_name', 'timesteps', 'precision'])
+    parts += [stages.district_stage(parse_pm, d) for d in stages.districts(
+        rows)]
+    prep = stages.merge_stage(project, parse_pm, rows, wx, *parts, log=log)
+    prep = stages.cluster_stage(stages.select(pm, ['cluster']), prep,
+        log=log)
+    erates = create_erate.run(pm['timesteps'], log)
+    wx_index = stages.weathers_stage(project, stages.select(pm,
+        stages.STORAGE_SETTINGS + ['weather', 'weather_workers']), prep,
+        erates, log=log)
+    if remote_storage:
+        prep['program_manager'].update(stages.select(pm,
+            stages.STORAGE_SETTINGS))
+    else:
+        prep = stages.storage_stage(project, stages.select(pm,
+            stages.STORAGE_SETTINGS), prep, log=log)
+    report = stages.validate_stage(project, prep, log=log)
+    prep = stages.aggregate_stage(prep, log=log)
+    return stages.write_stage(project, pm, prep, erates, wx_index, report,
+        log=log)
+#-------------------------------------------------------------------------------
+# Wait for every task's result, re-queuing claims whose lease has run out
+def collect(paths, names, log, lease):
+    parts = {}
+    start = time.time()
+    while len(parts) < len(names):
+        for n in names:
+            if n in parts:
+                continue
+            path = os.path.join(paths['results'], n)
+            if os.path.isfile(path + '.error'):
+                with open(path + '.error', 'r') as f:
+                    msg = f.read()
+                f.close()
+                log.error("Task {} failed: {}".format(n, msg))
+                raise common.CtesError("Task {} failed: {}".format(n, msg))
+            if os.path.isfile(path):
+                parts[n] = get(path)
+                os.remove(path)
+                log.info(" Task {} complete ({} of {})".format(n, len(parts),
+                    len(names)))
+        for c in os.listdir(paths['claimed']):
+            n = task_name(c)
+            if n not in names or n in parts:
+                continue
+            path = os.path.join(paths['claimed'], c)
+            try:
+                if time.time() - os.path.getmtime(path) > lease:
+                    os.rename(path, os.path.join(paths['tasks'], n))
+                    log.warning(" Lease of task {} expired; " \
+                        "re-queued".format(n))
+            except OSError:
+                # Finished or re-queued meanwhile
+                pass
+        if len(parts) < len(names):
+            time.sleep(POLL)
+    log.info("All {} building tasks complete in {:.2f} s".format(len(names),
+        time.time() - start))
+    return [parts[n] for n in names]
+#-------------------------------------------------------------------------------
+# Worker: claim and run tasks until interrupted, or until no task has been
+# available for 'idle' seconds
+def work(shared, log=logging, idle=None):
+    paths = folders(shared)
+    last = time.time()
+    try:
+        while True:
+            c = claim(paths)
+            if c is None:
+                if idle is not None and time.time() - last > idle:
+                    return
+                time.sleep(POLL)
+                continue
+            log.info("Claimed task {}".format(task_name(c)))
+            execute(paths, c, log)
+            last = time.time()
+    except KeyboardInterrupt:
+        # A task in progress is re-queued when its lease runs out
+        print("Stopped worker")
+#-------------------------------------------------------------------------------
+# Worker started by the coordinator; Ctrl-C stops the coordinator, which
+# stops its workers
+def local_worker(shared):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(shared)
+#-------------------------------------------------------------------------------
+# Claim the first queued task by renaming it under a claim id of its own;
+# returns the claim ('<task>.<claim id>'), or None if the queue is empty
+def claim(paths):
+    for n in sorted(os.listdir(paths['tasks'])):
+        if n.endswith('.tmp'):
+            continue
+        src = os.path.join(paths['tasks'], n)
+        c = "{}.{}".format(n, uuid.uuid4().hex[:12])
+        try:
+            # Start the lease before the task can be seen as claimed
+            os.utime(src)
+            os.rename(src, os.path.join(paths['claimed'], c))
+            return c
+        except OSError:
+            # Claimed by another worker
+            continue
+    return None
+#-------------------------------------------------------------------------------
+# Task name of a claim
+def task_name(c):
+    return c.split('.')[0]
+#-------------------------------------------------------------------------------
+def execute(paths, c, log):
+    n = task_name(c)
+    claimed = os.path.join(paths['claimed'], c)
+    done = threading.Event()
+    beat = None
+    try:
+        task = get(claimed)
+        # Refresh the claim well within the coordinator's lease
+        beat = threading.Thread(target=heartbeat, args=(claimed, done,
+            task['lease'] / 4), daemon=True)
+        beat.start()
+        part = building(task, log)
+        put(os.path.join(paths['results'], n), part)
+        print("Task {} ({}) complete".format(n, task['bldg']))
+    except Exception as e:
+        log.error("Task {} failed: {}".format(n, e))
+        with open(os.path.join(paths['results'], n + '.error'), 'w') as f:
+            f.write("{}: {}".format(type(e).__name__, e))
+        f.close()
+    finally:
+        done.set()
+        if beat is not None:
+            beat.join()
+    # Only this worker's claim: a claim re-queued when its lease ran out is
+    # gone, and the next owner claims the task under another id
+    try:
+        os.remove(claimed)
+    except OSError:
+        pass
+#-------------------------------------------------------------------------------
+def heartbeat(path, done, interval):
+    while not done.wait(interval):
+        try:
+            os.utime(path)
+        except OSError:
+            return
+#-------------------------------------------------------------------------------
+# Parse one building and, if the task has weather data, run its storage
+def building(task, log):
+    part = buildings.parse(task['pm'], task['bldg'], task['type'], log)
+    if task['weather'] is not None:
+        part['weather'] = task['weather']
+        part['community']['building_names'] = [task['bldg']]
+        part['community']['district_plant_names'] = []
+        part = storage.run(task['pm']['project_name'], part, log)
+        for k in ['building_names', 'district_plant_names']:
+            del part['community'][k]
+        del part['weather']
+    return part
@@ -0,0 +1,315 @@
+# stages.py
+# CTES Optimization Processor
+# Pre-processing stage scheduler with checkpoint and resume
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Each stage declares the stages it takes as inputs, the files and program
+# manager settings it reads, and whether it runs in the main process (with
+# the caller's logger) or in the worker pool (logging through the logging
+# module). A stage whose inputs, files, and settings are unchanged
+# since its last checkpoint in 'project_workspace/checkpoints' (or its last
+# in-memory result, see watch.py) is not rerun.
+# Independent stages (weather, tariff, and each building parse) run
+# concurrently.
+
+import concurrent.futures
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+import aggregator
+import buildings
+import cluster
+import common
+import create_erate
+import data_writer
+import storage
+import validate
+import weathers
+
+# Program manager settings read by the building parse stages
+PARSE_SETTINGS = ['project_name', 'timesteps', 'precision']
+# Program manager settings read by the storage stages
+STORAGE_SETTINGS = ['utss', 'ctes', 'segments', 'segment_tolerance']
+
+#-------------------------------------------------------------------------------
+class Stage:
+    def __init__(self, name, func, args=(), inputs=(), files=(),
+        local=False, checkpoint=True):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.inputs = list(inputs)
+        self.files = list(files)
+        self.local = local
+        self.checkpoint = checkpoint
+#-------------------------------------------------------------------------------
+def run(stages, project, log, workers=None, fresh=False, pool=None,
+    memo=None):
+    # Stages must be listed with inputs ahead of the stages using them.
+    # Returns the results of all stages needed to produce the last one. An
+    # existing process 'pool' is used if given. 'memo' holds the key and
+    # result of each stage from earlier runs in this process and is updated.
+    path = os.path.join(project, 'project_workspace', 'checkpoints')
+    os.makedirs(path, exist_ok=True)
+    stages = {s.name: s for s in stages}
+    order = list(stages.keys())
+    keys = {}
+    for n in order:
+        keys[n] = key(stages[n], [keys[i] for i in stages[n].inputs])
+    # Stages with a valid checkpoint are loaded only if a rerun stage (or
+    # the caller) needs their result
+    remembered = [n for n in order if memo and n in memo and
+        memo[n][0] == keys[n]]
+    todo = [n for n in order if n not in remembered and (fresh or
+        not stages[n].checkpoint or saved_key(path, n) != keys[n])]
+    needed = set([order[-1]] + [i for n in todo for i in stages[n].inputs])
+    results = {}
+    for n in order:
+        if n in remembered:
+            results[n] = memo[n][1]
+        elif n not in todo and n in needed:
+            results[n] = load(path, n)
+            log.info(" Stage '{}' resumed from checkpoint".format(n))
+            if memo is not None:
+                memo[n] = (keys[n], results[n])
+    log.info("Running {} of {} pre-processing stages: {}".format(len(todo),
+        len(order), todo))
+    start = time.time()
+    running = {}
+    own = pool is None
+    if own:
+        pool = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        while todo or running:
+            ready = [n for n in todo if all([i in results
+                for i in stages[n].inputs])]
+            # Pool stages first so that they overlap the local ones
+            for n in sorted(ready, key=lambda n: stages[n].local):
+                todo.remove(n)
+                args = stages[n].args + tuple([results[i]
+                    for i in stages[n].inputs])
+                if stages[n].local:
+                    # Local stages modify their inputs in place; keep the
+                    # remembered results intact
+                    if memo is not None:
+                        args = copy.deepcopy(args)
+                    finish(path, stages[n], keys[n], stages[n].func(*args,
+                        log=log), results, log, memo)
+                else:
+                    running[pool.submit(stages[n].func, *args)] = n
+            if not running:
+                if todo and not ready:
+                    raise RuntimeError("Stage inputs can not be met: " \
+                        "{}".format(todo))
+                continue
+            done, _ = concurrent.futures.wait(list(running.keys()),
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                try:
+                    r = fut.result()
+                except BaseException as e:
+                    log.error(" Stage '{}' failed: {}".format(n, e))
+                    for f in running.keys():
+                        f.cancel()
+                    raise
+                finish(path, stages[n], keys[n], r, results, log, memo)
+    finally:
+        if own:
+            pool.shutdown(cancel_futures=True)
+    log.info("Pre-processing stages complete in {:.2f} s".format(
+        time.time() - start))
+    return results
+#-------------------------------------------------------------------------------
+def finish(path, stage, k, result, results, log, memo):
+    results[stage.name] = result
+    if stage.checkpoint:
+        save(path, stage.name, k, result)
+    if memo is not None:
+        memo[stage.name] = (k, result)
+    log.info(" Stage '{}' complete".format(stage.name))
+#-------------------------------------------------------------------------------
+# Stage key from its arguments, input keys, and file modification times
+def key(stage, input_keys):
+    h = hashlib.sha1()
+    h.update(stage.name.encode())
+    h.update(json.dumps(stage.args, sort_keys=True, default=str).encode())
+    for k in input_keys:
+        h.update(k.encode())
+    for f in sorted(stage.files):
+        if os.path.isfile(f):
+            st = os.stat(f)
+            h.update("{}:{}:{}".format(f, st.st_mtime_ns, st.st_size).encode())
+        else:
+            h.update("{}:missing".format(f).encode())
+    return h.hexdigest()
+#-------------------------------------------------------------------------------
+def saved_key(path, name):
+    try:
+        with open(os.path.join(path, name + '.key'), 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+#-------------------------------------------------------------------------------
+def save(path, name, k, result):
+    # Result first, then its key, so that a partial write is never resumed
+    tmp = os.path.join(path, name + '.pkl.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(path, name + '.pkl'))
+    with open(os.path.join(path, name + '.key'), 'w') as f:
+        f.write(k)
+#-------------------------------------------------------------------------------
+def load(path, name):
+    with open(os.path.join(path, name + '.pkl'), 'rb') as f:
+        return pickle.load(f)
+#-------------------------------------------------------------------------------
+# Pre-processing pipeline ('ctes.py -r')
+def preprocess(project, log, workers=None, fresh=False, overrides=None,
+    tariff=None, pool=None, memo=None):
+    return run(build(project, log, overrides, tariff), project, log, workers,
+        fresh, pool, memo)['write']
+#-------------------------------------------------------------------------------
+# Pre-processing stages for the current project files and settings
+def build(project, log, overrides=None, tariff=None):
+    pm = buildings.setup(project, log, overrides)['program_manager']
+    # Stages locate project files through the program manager
+    pm['project_name'] = project
+    ts = pm['timesteps']
+    sims = os.path.join(project, 'building_simulations')
+    wx, primary = buildings.weather_files(project, pm)
+    rows = buildings.district(project)
+    # Settings read by the parse stages; later stages add their own so that
+    # a settings change only re-runs the stages that read it
+    parse_pm = select(pm, PARSE_SETTINGS)
+    parsed = [r for r in rows if r[2] != "SET BEFORE RUNNING!"]
+    dists = districts(rows)
+    plants = os.path.join(project, 'district_plant_simulations')
+    stages = [
+        Stage('weather', weather_stage, (project, dict(parse_pm,
+            weather=pm.get('weather'))),
+            files=[os.path.join(project, 'weather_files', w) for w in wx]),
+        Stage('tariff', tariff_stage, (ts, tariff))
+    ]
+    for id, bldg, type in parsed:
+        stages.append(Stage('building_' + bldg, building_stage,
+            (parse_pm, bldg, type), files=[os.path.join(sims,
+            bldg + '.eso')] + glob.glob(os.path.join(sims, bldg + '_*.dat'))))
+    # A district plant stage reruns when its simulation appears or changes;
+    # the building parses are kept
+    for d in dists:
+        stages.append(Stage('district_' + d, district_stage, (parse_pm, d),
+            files=[os.path.join(plants, d + '.eso')] + glob.glob(
+            os.path.join(plants, d + '_*.dat'))))
+    stages += [
+        Stage('buildings', merge_stage, (project, parse_pm, rows),
+            ['weather'] + ['building_' + r[1] for r in parsed] +
+            ['district_' + d for d in dists], local=True),
+        Stage('cluster', cluster_stage, (select(pm, ['cluster']),),
+            ['buildings'], local=True),
+        Stage('weathers', weathers_stage, (project, select(pm,
+            STORAGE_SETTINGS + ['weather', 'weather_workers'])),
+            ['cluster', 'tariff'],
+            files=[os.path.join(project, 'weather_files', w) for w in wx] +
+            [os.path.join(common.RESOURCES, 'data', 'ctes_types.json')],
+            local=True),
+        Stage('storage', storage_stage, (project, select(pm,
+            STORAGE_SETTINGS)), ['cluster'], files=[os.path.join(
+            common.RESOURCES, 'data', 'ctes_types.json')], local=True),
+        Stage('validate', validate_stage, (project,), ['storage'],
+            local=True),
+        Stage('aggregate', aggregate_stage, (), ['storage'], local=True),
+        Stage('write', write_stage, (project, pm), ['aggregate', 'tariff',
+            'weathers', 'validate'], local=True, checkpoint=False)
+    ]
+    return stages
+#-------------------------------------------------------------------------------
+def select(pm, keys):
+    return {k: pm.get(k) for k in keys}
+#-------------------------------------------------------------------------------
+# District loop names in ctes_district.csv order
+def districts(rows):
+    dists = []
+    for id, bldg, type in rows:
+        if type not in ['rtu', 'chiller', 'SET BEFORE RUNNING!'] and \
+            type not in dists:
+            dists.append(type)
+    return dists
+#-------------------------------------------------------------------------------
+# Stage functions
+def weather_stage(project, pm):
+    return buildings.primary_weather(project, {'program_manager': pm},
+        logging)
+#-------------------------------------------------------------------------------
+def tariff_stage(ts, tariff):
+    return create_erate.run(ts, logging, tariff)
+#-------------------------------------------------------------------------------
+def building_stage(pm, bldg, type):
+    return buildings.parse(pm, bldg, type, logging)
+#-------------------------------------------------------------------------------
+def district_stage(pm, dist):
+    return buildings.plant(pm, dist, logging)
+#-------------------------------------------------------------------------------
+def merge_stage(project, pm, rows, wx, *parts, log=logging):
+    prep = {'program_manager': pm, 'community': buildings.setup(project,
+        log)['community'], 'weather': wx}
+    # Building parts, then district plant parts
+    parts = list(parts)
+    for id, bldg, type in rows:
+        if type == "SET BEFORE RUNNING!":
+            prep['community']['building_names'].append(bldg)
+            print("Error! Must specify HVAC/CTES type before running.")
+        else:
+            buildings.merge(prep, parts.pop(0), bldg, type)
+    buildings.district_output(project, prep, log, parts)
+    return prep
+#-------------------------------------------------------------------------------
+def cluster_stage(settings, prep, log=logging):
+    prep['program_manager'].update(settings)
+    if prep['community'].get('district_plants_pending'):
+        return prep
+    return cluster.run(prep, log)
+#-------------------------------------------------------------------------------
+def weathers_stage(project, settings, prep, erates, log=logging):
+    prep['program_manager'].update(settings)
+    if prep['community'].get('district_plants_pending'):
+        return None
+    return weathers.run(project, prep, erates, log)
+#-------------------------------------------------------------------------------
+def storage_stage(project, settings, prep, log=logging):
+    prep['program_manager'].update(settings)
+    if prep['community'].get('district_plants_pending'):
+        return prep
+    log.info("Processing CTES models for chillers and RTUs")
+    return storage.run(project, prep, log)
+#-------------------------------------------------------------------------------
+# Raises common.ValidationError, before the writer runs, if a plant fails
+def validate_stage(project, prep, log=logging):
+    return validate.run(prep, log, project)
+#-------------------------------------------------------------------------------
+def aggregate_stage(prep, log=logging):
+    return aggregator.run(prep, log)
+#-------------------------------------------------------------------------------
+def write_stage(project, pm, prep, erates, wx_index, report,
+    log=logging):
+    prep['program_manager'] = pm
+    prep['utility_rate'] = erates
+    if prep['community'].get('district_plants_pending'):
+        # The community is not complete without the district plants
+        log.warning("No files written; waiting for district plant " \
+            "simulations")
+        return prep
+    print("Writing files")
+    data_writer.data_structure(prep, os.path.join(project,
+        'project_workspace', 'preprocessor_data_structure.txt'), log)
+    data_writer.write_json(prep, os.path.join(project, 'project_workspace'),
+        "preprocess.json", log)
+    data_writer.ampl(prep, log)
+    return prep
@@ -10,49 +10,51 @@ import numpy as np
 import os
 import sys
 
+import common
 import curves
 
 #-------------------------------------------------------------------------------
 def run(project, preprocess, log):
     # load ctes_types.json
-    with open(os.path.join('ctes_resources', 'data',
+    with open(os.path.join(common.RESOURCES, 'data',
         'ctes_types.json'), 'r') as f:
         ctes_types = json.load(f)
     f.close()
+    # Storage products evaluated; the first of each class is the primary one
+    pm = preprocess['program_manager']
+    utss_products = [(p, ctes_types[p]) for p in common.products(pm['utss'])]
+    ctes_products = [(p, ctes_types[p]) for p in common.products(pm['ctes'])]
     # iterate through buildings
     for bldg in preprocess['community']['building_names']:
         for k in preprocess[bldg].keys():
             if 'rtu' in k:
-                preprocess[bldg][k] = utss(
+                preprocess[bldg][k] = common.compact(utss(
                     preprocess[bldg][k],
                     preprocess['weather'],
-                    ctes_types[preprocess['program_manager']['utss']],
-                    preprocess['program_manager']['timesteps'],
-                    log)
+                    utss_products,
+                    pm['timesteps'],
+                    log), pm)
             elif 'chiller' in k:
-                preprocess[bldg][k] = central(
+                preprocess[bldg][k] = common.compact(central(
                     preprocess[bldg][k],
                     preprocess['weather'],
-                    ctes_types[preprocess['program_manager']['ctes']],
-                    preprocess['program_manager']['timesteps'],
-                    preprocess['program_manager']['segments'],
-                    log)
-    # Iterate through district plants
-    for dist in preprocess['community']['district_plant_names']:
-        if 'chiller' in k:
-            preprocess[dist][k] = central(
-                preprocess[dist][k],
-                preprocess['weather'],
-                ctes_types[preprocess['program_manager']['ctes']],
-                preprocess['program_manager']['timesteps'],
-                preprocess['program_manager']['segments'],
-                log)
-
+                    ctes_products,
+                    pm['timesteps'],
+                    pm['segments'],
+                    pm.get('segment_tolerance'),
+                    log), pm)
+    # District plants are listed with the buildings once their simulations
+    # are parsed (see buildings.district_output), so their chillers are
+    # processed above
     return preprocess
 #-------------------------------------------------------------------------------
 # Method to process central CTES model for a given chiller
-def central(chiller, wx, ctes, ts, segments, log):
+def central(chiller, wx, products, ts, segments, tolerance, log):
+    # 'products' lists (key, ctes_types entry) pairs. The first one sets the
+    # charging performance of the chiller; each one gets its own discharge
+    # rate limit and install limit.
     log.info("Processing CTES for Chiller {}".format(chiller["name"]))
+    ctes = products[0][1]
     # Set cost, capacity, and lifespan
     chiller['ctes']['cost_per_kWt'] = ctes['cost_per_kWt']
     chiller['ctes']['lifespan_yrs'] = ctes['lifespan_yrs']
@@ -61,6 +63,10 @@ def central(chiller, wx, ctes, ts, segments, log):
     capacity = max(chiller['rate_cooling_Wt'])
     max_index = chiller['rate_cooling_Wt'].index(capacity)
     plr_at_index = chiller['plr'][max_index]
+    if not plr_at_index > 0:
+        raise common.InputError("Chiller '{}' has a part load ratio of {} " \
+            "at its peak cooling load; can not find its capacity".format(
+            chiller['name'], plr_at_index))
     capacity = capacity / plr_at_index
     # Set useful short-name variables for constants
     c_cT = chiller["curves"]["coeffs_cap_ft"]
@@ -76,6 +82,8 @@ def central(chiller, wx, ctes, ts, segments, log):
     chiller['fluid'] = 'GlycolEth40'
     cp_chg = 3582   # kJ/kg-K
     cp_loop = 3612  # kJ/kg-K
+    # Count of partial storage segments avoided by adaptive linearization
+    segs_saved = 0
     ## Iterate through all timesteps
     for t in range(len(chiller["rate_cooling_Wt"])):
         # Create short-name variables for use in this program:
@@ -103,15 +111,17 @@ def central(chiller, wx, ctes, ts, segments, log):
         Te_o = np.linspace(Tl_s, Te_i, 100)
         slopes, ranges = chiller_electric_eir(capacity, cop_ref, plr_min,
             c_cT, c_eT, c_eP, m_dot, power, load, cp_loop, Pc_fan, Ta,  Tl_s,
-            Te_i, Te_o, segments, t)
+            Te_i, Te_o, segments, tolerance, t)
         chiller['discharging_performance']['slopes'].append(slopes)
         chiller['discharging_performance']['ranges'].append(ranges)
+        chiller['discharging_performance']['segments'].append(len(slopes))
         # Populate discharge timestep arrays
         if load > 0:
             chiller['discharging_performance']['timesteps'].append(t+1)
             if sum(ranges) > 0:
                 chiller['discharging_performance'][
                     'timesteps_partial_storage'].append(t+1)
+                segs_saved += segments - len(slopes)
             else:
                 chiller['discharging_performance'][
                     'timesteps_full_storage'].append(t+1)
@@ -130,79 +140,111 @@ def central(chiller, wx, ctes, ts, segments, log):
         # Set minimum charging capacity to > 1000 W_th
         if charge_capacity > 1000:
             chiller["charging_performance"]["timesteps"].append(t+1)
-        # Check for negative charge power coefficients
-        neg_count = 0
-        for v in chiller["charging_performance"]["slope"]:
-            if v < 0:
-                neg_count += 1
-        if neg_count > 0:
-            log.warning("Negative chiller power coefficients for ice " \
-                "charging occured {} times; verify curves".format(
-                neg_count))
-            log.info("This issue is often resolved by using shorter " \
-                "optimization timesteps (eg. use '-t 4') which avoids " \
-                "the impact of part-load factors from simulation.")
+    # Negative charge power coefficients are reported by validate.py
+    if tolerance:
+        log.info(" Adaptive linearization removed {} of {} partial storage " \
+            "segments".format(segs_saved, segments * len(chiller[
+                'discharging_performance']['timesteps_partial_storage'])))
     # Determine the maximum number of UTSS that can be installed
     # Get max cooling load and add 20% buffer
     mx = max(chiller['rate_cooling_Wt']) * 1.2
     chiller['ctes']['install_limit'] = int(mx //
         max(chiller["discharging_performance"]["rate_discharge_max_Wt"]))
+    # Discharge and install limits of every product (the first one's rates
+    # are those in 'discharging_performance')
+    chiller['ctes']['products'] = []
+    for i, (name, p) in enumerate(products):
+        rate = p["capacity_nominal_Wt"] / 4
+        chiller['ctes']['products'].append(product(name, p, int(mx // rate)))
+        if i > 0:
+            chiller['ctes']['products'][-1]['rate_discharge_max_Wt'] = [
+                rate] * len(chiller['rate_cooling_Wt'])
     return chiller
 
 #-------------------------------------------------------------------------------
 # Method to process UTSS model for a given RTU
-def utss(rtu, wx, utss, ts, log):
+def utss(rtu, wx, products, ts, log):
+    # 'products' lists (key, ctes_types entry) pairs. All products are
+    # evaluated together as (product x timestep) arrays; the first one fills
+    # the RTU's charging and discharging arrays and the others keep their
+    # discharge rates in 'products'.
     log.info("Processing UTSS for RTU '{}'".format(rtu["name"]))
+    utss = products[0][1]
     # Set cost and lifespan
     rtu['utss']['cost_per_kWt'] = utss['cost_per_kWt']
     rtu['utss']['lifespan_yrs'] = utss['lifespan_yrs']
     rtu['utss']['capacity_nominal_Wt'] = utss['capacity_nominal_Wt']
-    # Set useful variables
-    q = utss['capacity_nominal_Wt']
-    q_c = utss['rate_charge_nominal_Wt']
-    q_d = utss['rate_discharge_nominal_Wt']
-    cop = utss['cop_charge']
-    E = utss['coeffs_eir_ft']
-    C = utss['coeffs_cap_ft']
-    D = utss['coeffs_cap_discharge']
-    soc = utss['median_soc']
-    loss = utss['rate_thermal_loss_W_K']
+    # Set useful variables; product values are columns for broadcasting
+    column = lambda k: np.array([p[k] for n, p in products], float)[:, None]
+    q = column('capacity_nominal_Wt')
+    q_c = column('rate_charge_nominal_Wt')
+    q_d = column('rate_discharge_nominal_Wt')
+    cop = column('cop_charge')
+    soc = column('median_soc')
+    loss = column('rate_thermal_loss_W_K')
+    E = np.array([p['coeffs_eir_ft'] for n, p in products], float).T[:, :,
+        None]
+    C = np.array([p['coeffs_cap_ft'] for n, p in products], float).T[:, :,
+        None]
+    D = np.array([p['coeffs_cap_discharge'] for n, p in products], float).T[
+        :, :, None]
+    db = np.array(wx['dry_bulb_C'], float)[None, :]
+    wb = np.array(rtu['temp_wb_evaporator_C'], float)[None, :]
     # Set constants
     rtu['utss']['type'] = utss['full_name']
-    # Calculate timeseries values for drybulb dependent variables
-    for db in wx['dry_bulb_C']:
-        # Calculate EIR and cap multipliers for charging
-        eir = (E[0] + (E[1] * soc) + (E[2] * soc**2) + (E[3] * db) +
-            (E[4] * db**2) + (E[5] * soc * db))
-        cap = (C[0] + (C[1] * soc) + (C[2] * soc**2) + (C[3] * db) +
-            (C[4] * db**2) + (C[5] * soc * db))
-        # Populate dictionary
-        rtu['utss']['cop_charge'].append(cop / eir)
-        rtu['utss']['rate_charge_max_Wt'].append(q_c * cap)
-        rtu['utss']['thermal_loss_efficiency'].append(
-            1 - ((loss * db) / (q * ts)))
-    # Calculate timeseries values for wetbulb dependent variables
-    for wb in rtu['temp_wb_evaporator_C']:
-        # Calculate cap multiplier for discharging
-        dcap = D[0] + (D[1] * wb) + (D[2] * wb**2)
-        dcap = max(dcap, 0)
-        rtu['utss']['rate_discharge_max_Wt'].append(q_d * dcap)
+    # Calculate EIR and cap multipliers for charging from the drybulb
+    eir = (E[0] + (E[1] * soc) + (E[2] * soc**2) + (E[3] * db) +
+        (E[4] * db**2) + (E[5] * soc * db))
+    cap = (C[0] + (C[1] * soc) + (C[2] * soc**2) + (C[3] * db) +
+        (C[4] * db**2) + (C[5] * soc * db))
+    # Calculate cap multiplier for discharging from the wetbulb
+    dcap = np.maximum(D[0] + (D[1] * wb) + (D[2] * wb**2), 0)
+    rate_discharge = q_d * dcap
+    # Populate dictionary
+    rtu['utss']['cop_charge'] += (cop / eir)[0].tolist()
+    rtu['utss']['rate_charge_max_Wt'] += (q_c * cap)[0].tolist()
+    rtu['utss']['thermal_loss_efficiency'] += (1 - ((loss * db) /
+        (q * ts)))[0].tolist()
+    rtu['utss']['rate_discharge_max_Wt'] += rate_discharge[0].tolist()
     # Determine the maximum number of UTSS that can be installed
     # Get max cooling load and add 20% buffer to help cover duration
     mx = max(rtu['rate_cooling_Wt']) * 1.2
-    rtu['utss']['install_limit'] = int((mx // q_d) + 1)
+    limits = [int((mx // v) + 1) for v in q_d[:, 0]]
+    rtu['utss']['install_limit'] = limits[0]
     # Calculate discharge effectiveness by timestep
     for v in rtu['cop']:
         rtu['utss']['discharge_effectiveness'].append(1 -
             (v / utss['cop_discharge']))
+    # Discharge and install limits of every product (the first one's rates
+    # are in 'rate_discharge_max_Wt' above)
+    rtu['utss']['products'] = []
+    for i, (name, p) in enumerate(products):
+        rtu['utss']['products'].append(product(name, p, limits[i]))
+        if i > 0:
+            rtu['utss']['products'][-1]['rate_discharge_max_Wt'] = \
+                rate_discharge[i].tolist()
     return rtu
 #-------------------------------------------------------------------------------
+# Costs and limits of one storage product at a plant
+def product(name, p, install_limit):
+    return {
+        'name': name,
+        'type': p['full_name'],
+        'cost_per_kWt': p['cost_per_kWt'],
+        'lifespan_yrs': p['lifespan_yrs'],
+        'capacity_nominal_Wt': p['capacity_nominal_Wt'],
+        'rate_charge_limit_kWt': p.get('rate_charge_limit_kWt'),
+        'install_limit': install_limit
+    }
+#-------------------------------------------------------------------------------
 ## Generate discharge curves using the chiller_electric_eir model
 def chiller_electric_eir(Q_ref, cop_ref, plr_min, c_cT, c_eT, c_eP, m_dot,
-    P_current, Q_current, cp, Pc_fan, Tdb,  Tl_s, Te_i, Te_o, segs, t):
+    P_current, Q_current, cp, Pc_fan, Tdb,  Tl_s, Te_i, Te_o, segs, tol, t):
     # This method takes chiller data from the current timestep, generates
     # the power change as a function of load reduction curve, and then approx-
-    # imates the curve using a specified number of piecewise linear segments
+    # imates the curve using a specified number of piecewise linear segments.
+    # If a tolerance is given, the fewest segments (up to 'segs') whose fit
+    # error is within that fraction of the total power change are used instead
 
     # Set up arrays
     cap_fT = []
@@ -236,8 +278,8 @@ def chiller_electric_eir(Q_ref, cop_ref, plr_min, c_cT, c_eT, c_eP, m_dot,
     ## Return early if calculated PLR is below minimum or too close for calcs
     # buffer = 5 / 100 data points = 5%
     if plr_min_idx < 5:
-        slopes = [0 for s in range(segs)]
-        ranges = [0 for s in range(segs)]
+        slopes = [0 for s in range(1 if tol else segs)]
+        ranges = [0 for s in range(1 if tol else segs)]
         return slopes, ranges
     ## Redefine the Te_o range to only encompass Te_o_max
     Te_o = np.linspace(Tl_s, Te_o_max, 60)
@@ -255,8 +297,8 @@ def chiller_electric_eir(Q_ref, cop_ref, plr_min, c_cT, c_eT, c_eP, m_dot,
         plr.append(load[i] / Q_av[i])
         # Return early if calculated load exceeds current load
         if load[-1] > Q_current:
-            slopes = [0 for s in range(segs)]
-            ranges = [0 for s in range(segs)]
+            slopes = [0 for s in range(1 if tol else segs)]
+            ranges = [0 for s in range(1 if tol else segs)]
             return slopes, ranges
     for v in plr:
         val = curves.Quad(c_eP, v)
@@ -278,13 +320,15 @@ def chiller_electric_eir(Q_ref, cop_ref, plr_min, c_cT, c_eT, c_eP, m_dot,
     Y = Y[::-1]
     Y = Y - Y[0]
     # Get linear regression over region above min plr
-    seg_sz = len(Te_o)//segs
-    slopes = []
-    ranges = []
-    for i in range(segs):
-        # ranges.append(Y[(i+1)*seg_sz-1] - Y[i*seg_sz])
-        ranges.append((Y[-1] - Y[0]) / segs)
-        slopes.append(np.polyfit(Y[i*seg_sz:(i+1)*seg_sz+1], P[i*seg_sz:(i+1)*seg_sz+1], 1)[0])
+    if tol:
+        # Adaptive: add segments until the fit meets the tolerance
+        for s in range(1, segs + 1):
+            slopes, ranges = fit_segments(Y, P, s)
+            if segment_error(Y, P, slopes, ranges) <= tol * max(abs(P).max(),
+                1e-6):
+                break
+    else:
+        slopes, ranges = fit_segments(Y, P, segs)
 
     # check = True
     # if check and P_current > 150000:
@@ -299,6 +343,26 @@ def chiller_electric_eir(Q_ref, cop_ref, plr_min, c_cT, c_eT, c_eP, m_dot,
 
     return slopes, ranges
 #-------------------------------------------------------------------------------
+## Fit equal-width piecewise linear segments to the power change curve
+def fit_segments(Y, P, segs):
+    seg_sz = len(Y)//segs
+    slopes = []
+    ranges = []
+    for i in range(segs):
+        # ranges.append(Y[(i+1)*seg_sz-1] - Y[i*seg_sz])
+        ranges.append((Y[-1] - Y[0]) / segs)
+        slopes.append(np.polyfit(Y[i*seg_sz:(i+1)*seg_sz+1], P[i*seg_sz:(i+1)*seg_sz+1], 1)[0])
+    return slopes, ranges
+#-------------------------------------------------------------------------------
+## Maximum deviation of the piecewise linear fit from the power change curve
+def segment_error(Y, P, slopes, ranges):
+    # Segments fill in order, as they do in the optimization model
+    starts = np.cumsum([0] + ranges[:-1])
+    fit = np.zeros(len(Y))
+    for m, start, r in zip(slopes, starts, ranges):
+        fit += m * np.clip(Y - start, 0, r)
+    return np.max(np.abs(fit - P))
+#-------------------------------------------------------------------------------
 def chiller_electric_eir_charging(Q_ref, cop_ref, c_cT, c_eT, c_eP, m_dot,
     P_current, Q_current, Pc_fan, Tdb, Te_i, Te_chg, cp_loop, cp_chg):
     # This method calculates the available chiller capacity for ice charging
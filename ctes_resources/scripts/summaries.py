@@ -0,0 +1,226 @@
+# summaries.py
+# CTES Optimization Processor
+# Multi-resolution summaries of the solver output series
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Solver outputs are summarized once, when they are written (solver jobs,
+# -q, -d) or first read (-b), into '<results>/summary/':
+#   index.json       - series, columns (plant names from plants.json), T,
+#                      timestep length, and the size and time of each source
+#                      .out file
+#   <res>/<name>.npy - (3, periods, columns) min, mean, and max of each
+#                      hour, day, or month ('hourly', 'daily', 'monthly')
+#   shape/<name>.npy - (2, 2 x BUCKETS, columns) timestep and value of the
+#                      minimum and maximum of each of BUCKETS equal buckets,
+#                      in time order, which keeps the peaks and the shape of
+#                      a full-year series in a few thousand points
+# Series are the community profile (P, with the baseline p of the AMPL
+# files) and every plant series of ctes.run; plant series are also summed
+# over the community ('<name>_total'). Reports and plots read the one
+# resolution they need, memory-mapped, rather than the full .out tables.
+# Summaries whose .out files have changed are written again.
+
+import csv
+import json
+import os
+import shutil
+
+import numpy as np
+
+import results
+import warm
+
+# Community series (T) and plant series (T x N) of ctes.run
+COMMUNITY = ['P']
+PLANT = ['PX', 'PYf', 'PYp', 'alpha', 'Q', 'LX', 'LYf', 'LYp', 'load']
+RESOLUTIONS = ['hourly', 'daily', 'monthly', 'shape']
+STATS = ['min', 'mean', 'max']
+LABELS = {'hourly': 'hour', 'daily': 'day', 'monthly': 'month'}
+# Series plotted by report (kW)
+PLOT = ['p', 'P']
+# Buckets of the shape-preserving series
+BUCKETS = 2000
+
+#-------------------------------------------------------------------------------
+def stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+#-------------------------------------------------------------------------------
+def sources(results_path):
+    return {name: stamp(os.path.join(results_path, name + '.out'))
+        for name in COMMUNITY + PLANT
+        if os.path.isfile(os.path.join(results_path, name + '.out'))}
+#-------------------------------------------------------------------------------
+def index(results_path):
+    try:
+        with open(os.path.join(results_path, 'summary', 'index.json'),
+            'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+#-------------------------------------------------------------------------------
+# Write the summaries of a results folder unless they are current; returns
+# the index, or None if there are no outputs
+def update(ampl_path, results_path, log):
+    if not os.path.isfile(os.path.join(results_path, 'P.out')):
+        return None
+    current = index(results_path)
+    if current is not None and current['sources'] == sources(results_path):
+        return current
+    return write(ampl_path, results_path, log)
+#-------------------------------------------------------------------------------
+def write(ampl_path, results_path, log):
+    src = sources(results_path)
+    inputs = results.load_inputs(ampl_path)
+    P = results.read(results_path, 'P.out')
+    T = len(P)
+    series = {'P': P[:, None], 'p': inputs['p'][:T, None]}
+    for name in PLANT:
+        if name in src:
+            series[name] = results.read(results_path, name + '.out').reshape(
+                T, -1)
+            series[name + '_total'] = series[name].sum(axis=1)[:, None]
+    plants = warm.names(ampl_path)
+    N = series['PX'].shape[1] if 'PX' in series else 0
+    columns = list(plants['plants']) if plants is not None and len(
+        plants['plants']) == N else [str(n + 1) for n in range(N)]
+    # Start empty and write the index last, so that a partly written store
+    # is never read
+    path = os.path.join(results_path, 'summary')
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    bounds = periods(T, inputs['delta'], inputs['month'][:T])
+    for res in RESOLUTIONS:
+        os.makedirs(os.path.join(path, res))
+    for name, A in series.items():
+        for res, starts in bounds.items():
+            np.save(os.path.join(path, res, name + '.npy'), stats(A, starts))
+        np.save(os.path.join(path, 'shape', name + '.npy'), shape(A))
+    summary = {
+        'T': T,
+        'delta': inputs['delta'],
+        'columns': columns,
+        'series': {name: 'plant' if name in PLANT else 'community'
+            for name in series.keys()},
+        'periods': {res: len(starts) for res, starts in bounds.items()},
+        'sources': src
+    }
+    with open(os.path.join(path, 'index.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    f.close()
+    log.info(" Summaries of {} series written to '{}'".format(len(series),
+        path))
+    return summary
+#-------------------------------------------------------------------------------
+# First timestep of each hour, day, and month
+def periods(T, delta, month):
+    steps = max(int(round(1 / delta)), 1)
+    return {
+        'hourly': np.arange(0, T, steps),
+        'daily': np.arange(0, T, 24 * steps),
+        'monthly': np.concatenate([[0], np.nonzero(np.diff(month))[0] + 1])
+    }
+#-------------------------------------------------------------------------------
+# Min, mean, and max over the periods starting at 'starts'
+def stats(A, starts):
+    counts = np.diff(np.append(starts, len(A)))[:, None]
+    return np.stack([np.minimum.reduceat(A, starts),
+        np.add.reduceat(A, starts) / counts, np.maximum.reduceat(A, starts)])
+#-------------------------------------------------------------------------------
+# Minimum and maximum of each bucket in time order
+def shape(A, buckets=BUCKETS):
+    T, N = A.shape
+    size = -(-T // min(buckets, T))
+    if size == 1:
+        # Short series are kept whole
+        return np.stack([np.tile(np.arange(T)[:, None], (1, N)), A]).astype(
+            float)
+    K = -(-T // size)
+    padded = np.full((K * size, N), np.nan)
+    padded[:T] = A
+    padded = padded.reshape(K, size, N)
+    lo = np.nanargmin(padded, axis=1)
+    hi = np.nanargmax(padded, axis=1)
+    base = (np.arange(K) * size)[:, None, None]
+    t = (np.stack([np.minimum(lo, hi), np.maximum(lo, hi)], axis=1) +
+        base).reshape(2 * K, N)
+    return np.stack([t, np.take_along_axis(A, t, axis=0)]).astype(float)
+#-------------------------------------------------------------------------------
+# Summaries of the project and every scenario with solver outputs
+def run(project, log):
+    done = {}
+    for ampl_path, results_path in results.pairs(project):
+        summary = update(ampl_path, results_path, log)
+        if summary is not None:
+            done[results_path] = summary
+    log.info("Summaries current for {} result set(s)".format(len(done)))
+    return done
+#-------------------------------------------------------------------------------
+# One series at one resolution, memory-mapped: {'min', 'mean', 'max'} of
+# (periods x columns), or {'t', 'value'} of (points x columns) for 'shape'
+def read(results_path, name, resolution):
+    A = np.load(os.path.join(results_path, 'summary', resolution,
+        name + '.npy'), mmap_mode='r')
+    if resolution == 'shape':
+        return {'t': A[0].astype(int), 'value': A[1]}
+    return dict(zip(STATS, A))
+#-------------------------------------------------------------------------------
+# Community series of every result set at one resolution, as
+# '<results>/summary/<resolution>.csv' and, with matplotlib, a .png
+def report(project, resolution, log):
+    written = []
+    for results_path, summary in run(project, log).items():
+        names = [n for n, kind in summary['series'].items()
+            if kind == 'community']
+        out = os.path.join(results_path, 'summary', resolution)
+        with open(out + '.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            if resolution == 'shape':
+                # Each series has its own timesteps
+                writer.writerow(['series', 'timestep', 'value'])
+                for n in names:
+                    s = read(results_path, n, resolution)
+                    for t, v in zip(s['t'][:, 0], s['value'][:, 0]):
+                        writer.writerow([n, t + 1, round(float(v), 2)])
+            else:
+                writer.writerow([LABELS[resolution]] + ["{}_{}".format(n,
+                    s) for n in names for s in STATS])
+                data = [read(results_path, n, resolution) for n in names]
+                for k in range(summary['periods'][resolution]):
+                    writer.writerow([k + 1] + [round(float(d[s][k, 0]), 2)
+                        for d in data for s in STATS])
+        f.close()
+        plot(results_path, PLOT, resolution, out + '.png', log)
+        written.append(out + '.csv')
+        log.info(" {} summary written to '{}.csv'".format(resolution, out))
+    msg = "Wrote {} summaries for {} result set(s)".format(resolution,
+        len(written))
+    print(msg)
+    log.info(msg)
+    return written
+#-------------------------------------------------------------------------------
+def plot(results_path, names, resolution, out, log):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        log.info(" matplotlib is not installed; no plot written")
+        return None
+    fig, ax = plt.subplots(figsize=(12, 4))
+    for n in names:
+        s = read(results_path, n, resolution)
+        if resolution == 'shape':
+            ax.plot(s['t'][:, 0] + 1, s['value'][:, 0], lw=0.6, label=n)
+            continue
+        x = np.arange(1, len(s['mean']) + 1)
+        ax.fill_between(x, s['min'][:, 0], s['max'][:, 0], alpha=0.25)
+        ax.plot(x, s['mean'][:, 0], lw=0.8, label=n)
+    ax.set_xlabel('timestep' if resolution == 'shape' else resolution)
+    ax.set_ylabel('kW')
+    ax.legend(loc='upper right', fontsize='small')
+    fig.tight_layout()
+    fig.savefig(out, dpi=150)
+    plt.close(fig)
+    return out
@@ -0,0 +1,173 @@
+# sweep.py
+# CTES Optimization Processor
+# Scenario sweeps over program manager settings and tariffs
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Sweep files are JSON of the form:
+# {
+#   "grid": {"segments": [2, 3, 4], "utss": ["ib40"], "timesteps": [1, 4]},
+#   "tariffs": {"base": null, "high_dr": {"dr_rate": 0.5}},
+#   "workers": 4
+# }
+# Every combination of grid values and tariffs is a scenario. Buildings are
+# parsed once for each combination of the settings read while parsing
+# (timesteps, precision, and weather; the .eso parse itself is reused) and
+# the storage, aggregation, tariff, and writer stages are run for each
+# scenario in parallel.
+
+import concurrent.futures
+import itertools
+import json
+import logging
+import os
+
+import aggregator
+import buildings
+import cluster
+import common
+import create_erate
+import data_writer
+import stages
+import storage
+import validate
+
+# Program manager settings applied when the buildings are parsed
+PARSE_SETTINGS = stages.PARSE_SETTINGS + ['weather']
+
+#-------------------------------------------------------------------------------
+def run(project, sweep_file, log):
+    with open(sweep_file, 'r') as f:
+        spec = json.load(f)
+    f.close()
+    scenarios = expand(spec)
+    log.info("Executing scenario sweep '{}' with {} scenarios".format(
+        sweep_file, len(scenarios)))
+    print("Sweep contains {} scenarios".format(len(scenarios)))
+    sweep_path = os.path.join(project, 'sweep')
+    os.makedirs(sweep_path, exist_ok=True)
+    index = generate(project, scenarios, sweep_path, spec.get('workers'), log)
+    if index is None:
+        return None
+    # Summary index
+    with open(os.path.join(sweep_path, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    f.close()
+    print("Sweep complete ({} of {} scenarios failed): see '{}'".format(
+        len([s for s in index if s['status'] == 'failed']), len(index),
+        os.path.join(sweep_path, 'index.json')))
+    return index
+#-------------------------------------------------------------------------------
+# Parse the buildings for the scenarios and run the remaining stages of each
+# in parallel, into '<path>/<scenario name>' and logging to 'log'. Returns
+# the index entry of each scenario (a failed scenario is recorded and the
+# others carry on), or None if the district plants have not been simulated.
+def generate(project, scenarios, path, workers, log):
+    parsed = parse(project, scenarios, log)
+    if parsed is None:
+        return None
+    index = []
+    queue, listener = common.log_listener(log)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers,
+            initializer=common.log_worker, initargs=(queue,)) as pool:
+            futures = []
+            for s in scenarios:
+                s['path'] = os.path.join(path, s['name'])
+                futures.append(pool.submit(scenario, parsed[parse_key(s)],
+                    s))
+            for s, fut in zip(scenarios, futures):
+                try:
+                    index.append(fut.result())
+                except Exception as e:
+                    index.append(failed(s, e))
+                    log.error(" Scenario '{}' failed: {}".format(s['name'],
+                        index[-1]['error']))
+                    continue
+                log.info(" Scenario '{}' written to '{}'".format(
+                    index[-1]['name'], index[-1]['path']))
+    finally:
+        listener.stop()
+    return index
+#-------------------------------------------------------------------------------
+# Parse buildings once for each combination of the parse settings of the
+# scenarios; returns the parsed buildings by parse_key, or None if the
+# district plants have not been simulated
+def parse(project, scenarios, log):
+    parsed = {}
+    for s in scenarios:
+        key = parse_key(s)
+        if key not in parsed:
+            overrides = dict(json.loads(key))
+            parsed[key] = buildings.run(project, log, overrides or None)
+            if parsed[key]['community']['district_plants_pending']:
+                msg = "Scenario sweeps need the district plant simulations"
+                log.error(msg)
+                return None
+    return parsed
+#-------------------------------------------------------------------------------
+def parse_key(s):
+    return json.dumps(sorted([(k, v) for k, v in s['program_manager'].items()
+        if k in PARSE_SETTINGS]))
+#-------------------------------------------------------------------------------
+# Expand the grid and tariff specifications into named scenarios (with
+# tariffs=False, every scenario uses the default tariff and its name has no
+# tariff part)
+def expand(spec, tariffs=True):
+    grid = spec.get('grid', {})
+    named = spec.get('tariffs') or {'base': None}
+    if not tariffs:
+        named = {None: None}
+    keys = sorted(grid.keys())
+    scenarios = []
+    for values in itertools.product(*[grid[k] for k in keys]):
+        for t in sorted(named.keys()):
+            name = "_".join(["{}-{}".format(k, v) for k, v in zip(keys,
+                values)] + ([t] if t is not None else []))
+            scenarios.append({
+                'name': name,
+                'program_manager': dict(zip(keys, values)),
+                'tariff_name': t,
+                'tariff': named[t]
+            })
+    return scenarios
+#-------------------------------------------------------------------------------
+# Storage, aggregation, tariff, and writer stages for one scenario
+def scenario(prep, s):
+    log = logging
+    prep['program_manager'].update(s['program_manager'])
+    prep = cluster.run(prep, log)
+    prep = storage.run(prep['program_manager']['project_name'], prep, log)
+    validate.run(prep, log)
+    prep = aggregator.run(prep, log)
+    prep['utility_rate'] = create_erate.run(
+        prep['program_manager']['timesteps'], log, s['tariff'])
+    ampl_path = os.path.join(s['path'], 'ampl_files')
+    os.makedirs(ampl_path, exist_ok=True)
+    data_writer.ampl(prep, log, ampl_path)
+    with open(os.path.join(s['path'], 'program_manager.json'), 'w') as f:
+        json.dump(prep['program_manager'], f, indent=2)
+    f.close()
+    return {
+        'name': s['name'],
+        'path': ampl_path,
+        'status': 'written',
+        'program_manager': s['program_manager'],
+        'tariff': s['tariff_name'],
+        'plant_count': prep['community']['plant_count'],
+        'timesteps': len(prep['community']['rate_electricity_W']),
+        'peak_demand_kW': round(max(
+            prep['community']['rate_electricity_W']) / 1000, 2),
+        'DR_timesteps': len(set(prep['utility_rate']['DR_timesteps']))
+    }
+#-------------------------------------------------------------------------------
+# Index entry of a scenario that raised an error
+def failed(s, e):
+    return {
+        'name': s['name'],
+        'path': os.path.join(s['path'], 'ampl_files'),
+        'status': 'failed',
+        'error': "{}: {}".format(type(e).__name__, e),
+        'program_manager': s['program_manager'],
+        'tariff': s['tariff_name']
+    }
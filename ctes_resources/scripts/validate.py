@@ -0,0 +1,182 @@
+# validate.py
+# CTES Optimization Processor
+# Check the processed plant models before any files are written
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Runs after the storage models. The series of all plants of a type are
+# stacked into one (plants x timesteps) array per key, so every check is a
+# single array operation over the community:
+#   errors   - series of the wrong length, NaN or infinite values, zero or
+#              negative storage capacities, and timestep set members outside
+#              1..T; the AMPL files would be wrong, so nothing is written
+#   warnings - negative ice charging power slopes, sentinel COPs (99, from
+#              timesteps with no power) where there is cooling load, no
+#              cooling load, empty timestep sets, and install limits of zero
+# The per-plant report is logged and saved to
+# 'project_workspace/validation.json'.
+
+import itertools
+import json
+import os
+
+import numpy as np
+
+import common
+
+# Time series by plant type ('/' separates nested keys)
+SERIES = {
+    'rtu': ['rate_cooling_Wt', 'rate_electricity_W', 'cop',
+        'temp_wb_evaporator_C', 'utss/cop_charge', 'utss/rate_charge_max_Wt',
+        'utss/rate_discharge_max_Wt', 'utss/thermal_loss_efficiency',
+        'utss/discharge_effectiveness'],
+    'chiller': ['rate_cooling_Wt', 'rate_electricity_W', 'cop', 'plr',
+        'mass_flow_evap_kg_s', 'temp_evap_inlet_C', 'temp_evap_outlet_C',
+        'charging_performance/rate_cooling_max_Wt',
+        'charging_performance/slope',
+        'discharging_performance/rate_discharge_max_Wt',
+        'discharging_performance/segments']
+}
+# Timestep sets written to Tsets<n>.dat by plant type
+SETS = {
+    'rtu': ['timesteps_load'],
+    'chiller': ['timesteps_load',
+        'discharging_performance/timesteps_full_storage',
+        'charging_performance/timesteps']
+}
+# Storage settings by plant type
+STORAGE = {'rtu': 'utss', 'chiller': 'ctes'}
+# COP set where a plant draws no power (see buildings.py)
+COP_SENTINEL = 99
+
+#-------------------------------------------------------------------------------
+def run(prep, log, project=None):
+    report = {'status': 'pass', 'plants': {}}
+    if prep['community'].get('district_plants_pending'):
+        # Storage is not processed until the district plants are simulated
+        report['status'] = 'skipped'
+        return report
+    T = prep['program_manager']['timesteps'] * 8760
+    groups = {'rtu': [], 'chiller': []}
+    for b in prep['community']['building_names']:
+        for k in prep[b].keys():
+            for kind in groups.keys():
+                if kind in k:
+                    groups[kind].append(("{}/{}".format(b, k), prep[b][k]))
+                    report['plants'][groups[kind][-1][0]] = {
+                        'index': prep[b][k].get('index'),
+                        'errors': [],
+                        'warnings': []
+                    }
+    for kind, plants in groups.items():
+        if plants:
+            check(kind, plants, T, report['plants'])
+    # Report
+    failed = [n for n, r in report['plants'].items() if r['errors']]
+    warned = [n for n, r in report['plants'].items() if r['warnings']]
+    if failed:
+        report['status'] = 'fail'
+    for n, r in report['plants'].items():
+        if r['errors'] or r['warnings']:
+            log.warning(" {} (plant {}): {}".format(n, r['index'], "; ".join(
+                ["ERROR " + e for e in r['errors']] + r['warnings'])))
+    msg = "Validation {}: {} plants, {} with errors, {} with " \
+        "warnings".format(report['status'], len(report['plants']),
+        len(failed), len(warned))
+    print(msg)
+    log.info(msg)
+    if project is not None:
+        with open(os.path.join(project, 'project_workspace',
+            'validation.json'), 'w') as f:
+            json.dump(report, f, indent=2)
+        f.close()
+    if failed:
+        for n in failed:
+            print(" {}: {}".format(n, "; ".join(report['plants'][n][
+                'errors'])))
+        log.error(msg)
+        raise common.ValidationError("Validation failed for {} plants; " \
+            "no files written (see log file)".format(len(failed)))
+    if any(['negative ice charging' in w for n in warned for w in
+        report['plants'][n]['warnings']]):
+        log.info("Negative charging slopes are often resolved by using " \
+            "shorter optimization timesteps (eg. use '-t 4') which avoids " \
+            "the impact of part-load factors from simulation.")
+    return report
+#-------------------------------------------------------------------------------
+# Checks of one plant type; issues are added to 'plants' by plant label
+def check(kind, plants, T, report):
+    names = [n for n, p in plants]
+    error = lambda i, msg: report[names[i]]['errors'].append(msg)
+    warn = lambda i, msg: report[names[i]]['warnings'].append(msg)
+    # Lengths, then finite values of the full-length series
+    M = {}
+    for key in SERIES[kind]:
+        values = [get(p, key) for n, p in plants]
+        ok = np.array([len(v) == T for v in values])
+        for i in np.nonzero(~ok)[0]:
+            error(i, "{} has {} values, not {}".format(key, len(values[i]),
+                T))
+        A = np.full((len(plants), T), np.nan)
+        if ok.any():
+            A[ok] = np.array([values[i] for i in np.nonzero(ok)[0]], float)
+        for i in np.nonzero(ok & ~np.isfinite(A).all(axis=1))[0]:
+            error(i, "{} has {} NaN or infinite values".format(key,
+                int((~np.isfinite(A[i])).sum())))
+        M[key] = A
+    # Sentinel COPs and plants without cooling
+    cooling = M['rate_cooling_Wt'] > 0
+    for i, ct in enumerate((cooling & (M['cop'] == COP_SENTINEL)).sum(
+        axis=1)):
+        if ct > 0:
+            warn(i, "COP of {} (no power) at {} timesteps with cooling " \
+                "load".format(COP_SENTINEL, ct))
+    for i in np.nonzero(~cooling.any(axis=1))[0]:
+        warn(i, "no cooling load")
+    if kind == 'chiller':
+        for i, ct in enumerate((M['charging_performance/slope'] < 0).sum(
+            axis=1)):
+            if ct > 0:
+                warn(i, "negative ice charging power slope at {} " \
+                    "timesteps; verify curves".format(ct))
+        # Discharge curve segments (one list per timestep)
+        for i, (n, p) in enumerate(plants):
+            curve = p['discharging_performance']
+            if len(curve['slopes']) != T or len(curve['ranges']) != T:
+                error(i, "discharge curves cover {} timesteps, not {}".format(
+                    len(curve['slopes']), T))
+                continue
+            lengths = np.fromiter(map(len, curve['slopes']), int, T)
+            if (lengths != M['discharging_performance/segments'][i]).any():
+                error(i, "discharge curve segment counts do not match " \
+                    "'segments'")
+            for key in ['slopes', 'ranges']:
+                v = np.fromiter(itertools.chain.from_iterable(curve[key]),
+                    float)
+                if not np.isfinite(v).all():
+                    error(i, "discharging_performance/{} has {} NaN or " \
+                        "infinite values".format(key,
+                        int((~np.isfinite(v)).sum())))
+    # Storage capacities and install limits
+    for i, (n, p) in enumerate(plants):
+        for s in p[STORAGE[kind]]['products'] or [p[STORAGE[kind]]]:
+            if not s['capacity_nominal_Wt'] > 0:
+                error(i, "{} capacity is {}".format(s.get('name',
+                    s['type']), s['capacity_nominal_Wt']))
+            if not s['install_limit'] > 0:
+                warn(i, "{} install limit is {}".format(s.get('name',
+                    s['type']), s['install_limit']))
+    # Timestep sets
+    for key in SETS[kind]:
+        for i, (n, p) in enumerate(plants):
+            v = np.asarray(get(p, key), float)
+            if len(v) == 0:
+                warn(i, "{} is empty".format(key))
+            elif ((v < 1) | (v > T)).any():
+                error(i, "{} has {} members outside 1..{}".format(key,
+                    int(((v < 1) | (v > T)).sum()), T))
+#-------------------------------------------------------------------------------
+def get(plant, key):
+    for k in key.split('/'):
+        plant = plant[k]
+    return plant
@@ -0,0 +1,140 @@
+# warm.py
+# CTES Optimization Processor
+# Warm start solver jobs from the previous solution of the same scenario
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## After a solver job finishes, its solution (units Z, full storage schedule
+# alpha, inventory Q, and charging LX) is saved to 'warm_start.npz' in the
+# job's results folder, with the plant and storage type names of its AMPL
+# files (plants.json). The next job solving into that folder (eg. after a
+# tariff change with -u, a cost change, or an added building) maps it onto
+# the new AMPL files by plant name, storage type, and hour of the year, and
+# passes it to the solver as a MIP start: as 'let' statements in
+# 'warm_start.run' (included by ctes.run) for AMPL, or through
+# Highs.setSolution for the in-process solve. New plants and types get no
+# start values, and the solver completes or repairs the start.
+#
+# The time of the last cold solve of the scenario is kept with the solution,
+# so that each warm solve is reported against it.
+
+import json
+import os
+
+import numpy as np
+
+FILE = 'warm_start.npz'
+# Solution files saved (T x N), besides Z.out (N x I)
+SERIES = ['alpha', 'Q', 'LX']
+
+#-------------------------------------------------------------------------------
+def names(ampl_path):
+    try:
+        with open(os.path.join(ampl_path, 'plants.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+#-------------------------------------------------------------------------------
+def read(results_path):
+    try:
+        with np.load(os.path.join(results_path, FILE)) as f:
+            return {k: f[k] for k in f.files}
+    except (OSError, ValueError):
+        return None
+#-------------------------------------------------------------------------------
+# Save the solution of a finished job with its solve time and that of the
+# last cold solve of the scenario [s]
+def save(ampl_path, results_path, elapsed, cold, log):
+    instance = names(ampl_path)
+    if instance is None:
+        log.info(" No plants.json in '{}'; solution not saved for warm " \
+            "starts".format(ampl_path))
+        return None
+    solution = {
+        'plants': np.array(instance['plants']),
+        'types': np.array(instance['types']),
+        'Z': np.loadtxt(os.path.join(results_path, 'Z.out'), ndmin=2),
+        'solve_time': elapsed,
+        'cold_time': cold
+    }
+    for v in SERIES:
+        solution[v] = np.loadtxt(os.path.join(results_path, v + '.out'),
+            ndmin=2)
+    tmp = os.path.join(results_path, FILE + '.tmp.npz')
+    np.savez_compressed(tmp, **solution)
+    os.replace(tmp, os.path.join(results_path, FILE))
+    return solution
+#-------------------------------------------------------------------------------
+# Previous solution mapped onto the AMPL files in 'ampl_path': Z (I x N) and
+# the series (T x N), NaN where there is no value. None if there is no saved
+# solution or the AMPL files have no plants.json.
+def start(ampl_path, results_path, log):
+    old = read(results_path)
+    new = names(ampl_path)
+    if old is None or new is None:
+        return None
+    old_plants = list(old['plants'])
+    old_types = list(old['types'])
+    cols = np.array([old_plants.index(p) if p in old_plants else -1
+        for p in new['plants']], int)
+    types = np.array([old_types.index(t) if t in old_types else -1
+        for t in new['types']], int)
+    T = new['T']
+    N = len(new['plants'])
+    # Timestep of the previous solution in the same hour
+    hours = (np.arange(T) * old['alpha'].shape[0]) // T
+    found = np.nonzero(cols >= 0)[0]
+    s = {'Z': np.full((len(types), N), np.nan),
+        'cold_time': float(old['cold_time'])}
+    for i in np.nonzero(types >= 0)[0]:
+        s['Z'][i, found] = old['Z'][cols[found], types[i]]
+    for v in SERIES:
+        s[v] = np.full((T, N), np.nan)
+        s[v][:, found] = old[v][hours][:, cols[found]]
+    log.info(" Warm start from the previous solution: {} of {} plants and " \
+        "{} of {} storage types matched".format(len(found), N,
+        int((types >= 0).sum()), len(types)))
+    return s
+#-------------------------------------------------------------------------------
+# AMPL statements setting the start values (Z capped at the new zbar; alpha
+# only where full storage is possible)
+def ampl_run(s, path):
+    lines = ["# Warm start from the previous solution (see warm.py)"]
+    I, N = s['Z'].shape
+    for i in range(I):
+        for n in range(N):
+            if np.isfinite(s['Z'][i, n]):
+                lines.append("let Z[{0},{1}] := min({2}, zbar[{0},{1}]);" \
+                    "".format(i + 1, n + 1, int(round(s['Z'][i, n]))))
+    for n in range(N):
+        on = np.nonzero(s['alpha'][:, n] > 0.5)[0] + 1
+        if len(on) > 0:
+            lines.append("let {{t in TYf[{0}] inter {{{1}}}}} alpha[{0},t] " \
+                ":= 1;".format(n + 1, ",".join([str(t) for t in on])))
+        for v in ['Q', 'LX']:
+            for t in np.nonzero(s[v][:, n] > 0)[0]:
+                lines.append("let {}[{},{}] := {};".format(v, n + 1, t + 1,
+                    round(float(s[v][t, n]), 2)))
+    with open(os.path.join(path, 'warm_start.run'), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    f.close()
+#-------------------------------------------------------------------------------
+# Column indices and values of the start in a model.build model
+def columns(m, params, s):
+    idx = []
+    vals = []
+    for n in range(params['N']):
+        cols = m.var[('Z', n)]
+        z = s['Z'][:len(cols), n]
+        ok = np.isfinite(z)
+        idx.append(cols[ok])
+        vals.append(np.minimum(np.round(z[ok]), m.ub[cols[ok]]))
+        f = params['plants'][n]['TYf']
+        for name, v in [('alpha', s['alpha'][f, n]), ('Q', s['Q'][:, n]),
+            ('LX', s['LX'][:, n])]:
+            cols = m.var[(name, n)]
+            ok = np.isfinite(v)
+            idx.append(cols[ok])
+            vals.append(np.clip(np.round(v[ok]) if name == 'alpha' else
+                v[ok], m.lb[cols[ok]], m.ub[cols[ok]]))
+    return np.concatenate(idx), np.concatenate(vals)
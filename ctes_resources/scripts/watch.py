@@ -0,0 +1,83 @@
+# watch.py
+# CTES Optimization Processor
+# Watch a project and re-run the pre-processing stages affected by edits
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## Keeps every stage result in memory and polls the project inputs
+# (program_manager.json, ctes_district.csv, building and district plant
+# simulation and chiller .dat files, weather files). After a change, only the
+# stages whose inputs, files, or settings changed are run again; an edited
+# chiller .dat file, for example, re-parses that building alone, and a
+# finished district plant simulation is picked up without re-parsing the
+# buildings. Stop with Ctrl-C.
+
+import concurrent.futures
+import os
+import signal
+import time
+
+import common
+import stages
+
+# Project inputs that are polled for changes
+WATCHED = ['program_manager.json', 'ctes_district.csv',
+    'building_simulations', 'district_plant_simulations', 'weather_files']
+
+#-------------------------------------------------------------------------------
+def run(project, log, interval=1.0, workers=None):
+    memo = {}
+    snapshot = None
+    print("Watching '{}' for changes (Ctrl-C to stop)".format(project))
+    log.info("Watching project inputs every {} s".format(interval))
+    with concurrent.futures.ProcessPoolExecutor(workers,
+        initializer=ignore_interrupt) as pool:
+        try:
+            while True:
+                current = scan(project)
+                if current != snapshot:
+                    # Let editors and copies finish writing first
+                    time.sleep(interval)
+                    if scan(project) != current:
+                        continue
+                    update(project, log, pool, memo)
+                    snapshot = current
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopped watching '{}'".format(project))
+            log.info("Watch mode stopped at {}".format(time.ctime()))
+    return memo
+#-------------------------------------------------------------------------------
+def update(project, log, pool, memo):
+    start = time.time()
+    try:
+        stages.preprocess(project, log, pool=pool, memo=memo)
+    except common.CtesError as e:
+        # Report and keep watching for a corrected input
+        print("Pre-processing failed: {}".format(e))
+        log.error("Pre-processing failed: {}".format(e))
+        return False
+    msg = "Pre-processing updated in {:.2f} s at {}".format(
+        time.time() - start, time.ctime())
+    print(msg)
+    log.info(msg)
+    return True
+#-------------------------------------------------------------------------------
+# Ctrl-C stops the watcher; pool workers are shut down by it
+def ignore_interrupt():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+#-------------------------------------------------------------------------------
+# Modification time and size of every watched file
+def scan(project):
+    snapshot = {}
+    for w in WATCHED:
+        path = os.path.join(project, w)
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in os.listdir(path)]
+        else:
+            files = [path]
+        for f in files:
+            if os.path.isfile(f):
+                st = os.stat(f)
+                snapshot[f] = (st.st_mtime_ns, st.st_size)
+    return snapshot
@@ -0,0 +1,84 @@
+# weathers.py
+# CTES Optimization Processor
+# Storage processing for each of several weather files
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## When 'weather_files' holds more than one .epw (eg. TMY plus extreme years)
+# the buildings are parsed once and each weather file is parsed, resampled,
+# and run through the weather-dependent storage stage in its own process.
+# Each weather gets its own AMPL files in 'weather/<file name>/ampl_files',
+# except the primary weather, whose AMPL files are the project's own (written
+# by the pre-processing run that calls this) and are not processed again.
+
+import concurrent.futures
+import json
+import logging
+import os
+
+import aggregator
+import buildings
+import common
+import data_writer
+import storage
+
+#-------------------------------------------------------------------------------
+def run(project, prep, erates, log):
+    # 'prep' must hold the parsed buildings and primary weather ahead of the
+    # storage stage; 'erates' is the rate structure of create_erate.run
+    wx, primary = buildings.weather_files(project, prep['program_manager'])
+    if len(wx) < 2:
+        return None
+    others = [w for w in wx if w != primary]
+    log.info("Processing storage for {} more weather files".format(
+        len(others)))
+    print("Processing storage for {} more weather files".format(len(others)))
+    weather_path = os.path.join(project, 'weather')
+    index = []
+    queue, listener = common.log_listener(log)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            prep['program_manager'].get('weather_workers'),
+            initializer=common.log_worker, initargs=(queue,)) as pool:
+            futures = {w: pool.submit(stage, prep, os.path.join(project,
+                'weather_files', w), os.path.join(weather_path,
+                os.path.splitext(w)[0]), erates) for w in others}
+            for w in wx:
+                if w == primary:
+                    index.append(entry(os.path.join(project,
+                        'weather_files', w), os.path.join(project,
+                        'ampl_files'), prep))
+                    continue
+                index.append(futures[w].result())
+                log.info(" Weather '{}' written to '{}'".format(
+                    index[-1]['name'], index[-1]['path']))
+    finally:
+        listener.stop()
+    with open(os.path.join(weather_path, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    f.close()
+    return index
+#-------------------------------------------------------------------------------
+# Weather parse, storage, aggregation, and writer stages for one file
+def stage(prep, epw, path, erates):
+    log = logging
+    ts = prep['program_manager']['timesteps']
+    prep['weather'] = buildings.weather(epw, ts, log)
+    prep = storage.run(prep['program_manager']['project_name'], prep, log)
+    prep = aggregator.run(prep, log)
+    prep['utility_rate'] = erates
+    ampl_path = os.path.join(path, 'ampl_files')
+    os.makedirs(ampl_path, exist_ok=True)
+    data_writer.ampl(prep, log, ampl_path)
+    return entry(epw, ampl_path, prep)
+#-------------------------------------------------------------------------------
+# Index entry of a weather file processed into 'ampl_path'
+def entry(epw, ampl_path, prep):
+    return {
+        'name': os.path.splitext(os.path.basename(epw))[0],
+        'weather_file': epw,
+        'path': ampl_path,
+        'max_dry_bulb_C': round(max(prep['weather']['dry_bulb_C']), 2),
+        'max_wet_bulb_C': round(max(prep['weather']['wet_bulb_C']), 2),
+        'plant_count': prep['community']['plant_count']
+    }
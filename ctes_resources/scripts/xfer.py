@@ -4,7 +4,8 @@
 # Revised:
 
 ## The purpose of this program is to handle file transfer to the remote server
-# at Colorado School of Mines to use the optimization solvers there
+# at Colorado School of Mines to use the optimization solvers there. For
+# solves on the local machine use jobs.py (ctes.py -x) instead.
 
 import os
 
@@ -12,10 +12,11 @@
 ## Parameters--------------------
 # Set defining values
 param D >= 0;  # number of demand periods
-param I >= 1;  # number of CTES types (1=UTSS, 2=Central)
+param I >= 1;  # number of CTES types (UTSS products, then Central products)
 param N >= 1;  # number of RTUs or plant loops
 param S{1..N} >= 1;  # number of segments in chiller curve linearization
 param T >= 1;  # number of timesteps
+param St{n in 1..N, 1..T} integer, >= 1, <= S[n], default S[n];  # segments used at each timestep (adaptive linearization)
 param Td_ct{1..D} >= 0;  # number of ts in each demand period
 param Td_v{d in 1..D, 1..Td_ct[d]} >= 0;  # values which populate indexed set Td
 param TYf_ct{1..N} >= 0;  # number of ts when full storage is possible
@@ -44,7 +45,7 @@ param lambdaY{n in 1..N, 1..S[n], 1..T};  # partial storage discharge curve slop
 param lbar{n in 1..N, 1..S[n], 1..T} >= 0;  # limits for each partial storge curve segment [kWth]
 param qNX{1..N, 1..T} >= 0;  # max rate of charge by chiller [kWth]
 param qIX{1..I} >= 0;  # max rate of charging for CTES [kWth]
-param qIY{1..N, 1..T} >= 0;  # max rate of discharging for CTES [kWth]
+param qIY{1..I, 1..N, 1..T} >= 0;  # max rate of discharging for CTES [kWth]
 param qbar{1..I} >= 0;  # nominal (usable) capacity of the CTES [kWth]
 
 # Cost parameters
@@ -66,7 +67,7 @@ var Z{i in 1..I, n in 1..N} >= 0, <= zbar[i,n], integer;	# Number of CTES
 # Continuous variables
 var LX{1..N, 1..T} >= 0;  # charging load added [kW_th]
 var LYf{n in 1..N, TYf[n]} >= 0;	# discharging load reduced via full storage [kW_th]
-var LYp{n in 1..N, 1..S[n], TYp[n]} >= 0;	# discharging load reduced via partial storage [kW_th]
+var LYp{n in 1..N, s in 1..S[n], t in TYp[n]: s <= St[n,t]} >= 0;	# discharging load reduced via partial storage [kW_th]
 var Pd{1..D} >= 0;	# max power demand [kW_e (max)]
 var P{1..T} >= 0;  # power demand (all buildings) [kW_e]
 var PX{1..N, 1..T} >= 0;  # power increase from charging [kW_e]
@@ -84,21 +85,21 @@ s.t. charge_limit_plant {n in 1..N, t in 1..T}: LX[n,t] <= qNX[n,t];
 
 # discharging - full storage
 s.t. discharge_full_load {n in 1..N, t in TYf[n]}: LYf[n,t] = l[n,t] * alpha[n,t];
-s.t. discharge_full_rate {n in 1..N, t in TYf[n]}: LYf[n,t] <= sum{i in 1..I} qIY[n,t] * Z[i,n];
+s.t. discharge_full_rate {n in 1..N, t in TYf[n]}: LYf[n,t] <= sum{i in 1..I} qIY[i,n,t] * Z[i,n];
 
 # discharging - partial storage
-s.t. discharge_part_load {n in 1..N, s in 1..S[n], t in TYp[n]}: LYp[n,s,t] <= (if t in TYf[n] then ((1-alpha[n,t]) * lbar[n,s,t]) else lbar[n,s,t]);
-s.t. discharge_part_rate {n in 1..N, t in TYp[n]}: sum{s in 1..S[n]} LYp[n,s,t] <= sum{i in 1..I} qIY[n,t] * Z[i,n];
+s.t. discharge_part_load {n in 1..N, s in 1..S[n], t in TYp[n]: s <= St[n,t]}: LYp[n,s,t] <= (if t in TYf[n] then ((1-alpha[n,t]) * lbar[n,s,t]) else lbar[n,s,t]);
+s.t. discharge_part_rate {n in 1..N, t in TYp[n]}: sum{s in 1..St[n,t]} LYp[n,s,t] <= sum{i in 1..I} qIY[i,n,t] * Z[i,n];
 
 # inventory (kWth avail at end of timestep)
-s.t. tank_inventory{n in 1..N, t in 1..T: t>1}: Q[n,t] = etaI[n,t] * Q[n,t-1] + delta * (LX[n,t] - (if t in TYp[n] then (sum{s in 1..S[n]} LYp[n,s,t] - (if t in TYf[n] then LYf[n,t] else 0)) else 0));
+s.t. tank_inventory{n in 1..N, t in 1..T: t>1}: Q[n,t] = etaI[n,t] * Q[n,t-1] + delta * (LX[n,t] - (if t in TYp[n] then (sum{s in 1..St[n,t]} LYp[n,s,t] - (if t in TYf[n] then LYf[n,t] else 0)) else 0));
 s.t. max_soc {n in 1..N, t in 1..T}: Q[n,t] <= sum{i in 1..I} qbar[i] * Z[i,n];
 s.t. soc_full {n in 1..N, t in TYf[n]: t>1}: delta * LYf[n,t] <= etaI[n,t] * Q[n,t-1];
-s.t. soc_part {n in 1..N, t in TYp[n]: t>1}: delta * sum{s in 1..S[n]} LYp[n,s,t] <= etaI[n,t] * Q[n,t-1];
+s.t. soc_part {n in 1..N, t in TYp[n]: t>1}: delta * sum{s in 1..St[n,t]} LYp[n,s,t] <= etaI[n,t] * Q[n,t-1];
 s.t. init_soc {n in 1..N}: Q[n,1] = 0;
 
 # energy conversion
-s.t. pwr_part {n in 1..N, t in TYp[n]}: PYp[n,t] <= epsilon[n] * (sum{s in 1..S[n]} lambdaY[n,s,t] * LYp[n,s,t]);
+s.t. pwr_part {n in 1..N, t in TYp[n]}: PYp[n,t] <= epsilon[n] * (sum{s in 1..St[n,t]} lambdaY[n,s,t] * LYp[n,s,t]);
 s.t. pwr_full {n in 1..N, t in TYf[n]}: PYf[n,t] <= epsilon[n] * pN[n,t] * alpha[n,t];
 s.t. pwr_charge {n in 1..N, t in 1..T}: PX[n,t] >= lambdaX[n,t] * LX[n,t];
 s.t. profile {t in 1..T}: P[t] >= p[t] + sum{n in 1..N} (PX[n,t] - (if t in TYp[n] then (PYp[n,t] - (if t in TYf[n] then PYf[n,t] else 0)) else 0));
@@ -0,0 +1,29 @@
+# conftest.py
+# CTES Optimization Processor
+# Test setup: the scripts are imported as ctes.py imports them
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'ctes_resources', 'scripts'))
+
+import instance
+
+#-------------------------------------------------------------------------------
+@pytest.fixture
+def log():
+    return logging.getLogger('ctes.test')
+#-------------------------------------------------------------------------------
+# Project folder with the AMPL files of a one-plant, RTU-only community
+@pytest.fixture
+def rtu_project(tmp_path):
+    for d in ['ampl_files', 'optimization_results', 'project_workspace']:
+        os.makedirs(os.path.join(tmp_path, d))
+    instance.write(os.path.join(tmp_path, 'ampl_files'))
+    return str(tmp_path)
@@ -0,0 +1,124 @@
+# instance.py
+# CTES Optimization Processor
+# Small AMPL instances for the tests, in the form data_writer.ampl writes
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+## A two-day, hourly community of RTU plants with one demand period per day
+# (hours 13-18). The chiller CTES type has no plant, so data_writer leaves
+# its cost, lifetime, and capacity at zero, as for any single technology
+# community.
+
+import os
+
+import numpy as np
+
+T = 48
+
+#-------------------------------------------------------------------------------
+def lines(path, name, rows):
+    with open(os.path.join(path, name), 'w') as f:
+        for r in rows:
+            f.write(",".join([str(v) for v in np.atleast_1d(r)]) + "\n")
+    f.close()
+#-------------------------------------------------------------------------------
+def write(path, N=1):
+    hours = np.arange(T) % 24
+    peak = (hours >= 12) & (hours < 18)
+    day = (hours >= 9) & (hours < 20)
+    Td = [np.nonzero(peak & (np.arange(T) // 24 == d))[0] + 1
+        for d in range(2)]
+    Tsets = np.nonzero(day)[0] + 1
+    lines(path, 'fixed_params.dat', [2, 2, N, T, [len(t) for t in Td],
+        [len(Tsets)] * N, [len(Tsets)] * N, 0, 1.0, [20, 0], [100, 0],
+        [12.0, 12.0], [3] * N, [0] * N, [1] * N, [140.67, 0], [20, 0]])
+    lines(path, 'Td.dat', [np.concatenate(Td)])
+    lines(path, 'Tr.dat', [[]])
+    lines(path, 'cost_elec.dat', np.where(peak, 0.2, 0.05))
+    lines(path, 'p.dat', 100 + 60 * peak + N * 30 * day)
+    for n in range(1, N + 1):
+        lines(path, 'l{}.dat'.format(n), 30.0 * day)
+        lines(path, 'pN{}.dat'.format(n), 10.0 * day)
+        lines(path, 'lambdaX{}.dat'.format(n), np.full(T, 0.3))
+        lines(path, 'qNX{}.dat'.format(n), np.full(T, 20.0))
+        lines(path, 'qIY{}.dat'.format(n), [[30.0, 0]] * T)
+        lines(path, 'lambdaY{}.dat'.format(n), np.full(T, 0.33))
+        lines(path, 'lbar{}.dat'.format(n), 30.0 * day)
+        lines(path, 'St{}.dat'.format(n), np.ones(T, int))
+        lines(path, 'Tsets{}.dat'.format(n), [np.concatenate([Tsets,
+            Tsets])])
+    return path
+#-------------------------------------------------------------------------------
+# Hourly EnergyPlus output of a building with 'units' RTUs for a year in which
+# the dry bulb follows a daily and a seasonal cycle
+def eso(path, units, scale=1.0):
+    names = ['Electricity:Facility [J]']
+    for j in range(units):
+        names += ['RTU {} COIL,Cooling Coil Total Cooling Rate [W]'.format(j),
+            'RTU {} COIL,Cooling Coil Electricity Rate [W]'.format(j),
+            'RTU {} NODE,System Node Wetbulb Temperature [C]'.format(j)]
+    t = np.arange(8760)
+    db = dry_bulb(t)
+    with open(path, 'w') as f:
+        f.write("Program Version,EnergyPlus, Version 9.5.0\n")
+        f.write("1,5,Environment Title[],Latitude[deg],Longitude[deg]," \
+            "Time Zone[],Elevation[m]\n")
+        f.write("2,8,Day of Simulation[],Month[],Day of Month[],DST " \
+            "Indicator[1=yes 0=no],Hour[],StartMinute[],EndMinute[]," \
+            "DayType\n")
+        for i, name in enumerate(names):
+            f.write("{},1,{} !TimeStep\n".format(i + 7, name))
+        f.write("End of Data Dictionary\n")
+        for h in t:
+            rows = []
+            cooling = 0
+            for j in range(units):
+                load = max(0, (db[h] - 18) * 3000 * scale * (1 + 0.05 * j))
+                cooling += load / 3.2
+                rows += [load, load / 3.2, 17 + 0.1 * j]
+            f.write("2,1,1,1,0,1,0.00,60.00,Monday\n")
+            f.write("7,{:.2f}\n".format((50000 * scale + cooling) * 3600))
+            for i, v in enumerate(rows):
+                f.write("{},{:.4f}\n".format(i + 8, v))
+        f.write("End of Data\n")
+    f.close()
+#-------------------------------------------------------------------------------
+def epw(path, warmer=0):
+    db = dry_bulb(np.arange(8760)) + warmer
+    with open(path, 'w') as f:
+        for i in range(8):
+            f.write("HEADER,{}\n".format(i))
+        for h in range(8760):
+            f.write("2006,1,1,{},60,x,{:.1f},{:.1f},50\n".format(h % 24 + 1,
+                db[h] - 5, db[h]))
+    f.close()
+#-------------------------------------------------------------------------------
+def dry_bulb(t):
+    return (20 + 10 * np.sin(2 * np.pi * (t - 9) / 24) + 8 * np.sin(
+        2 * np.pi * t / 8760 - 1.5))
+#-------------------------------------------------------------------------------
+# Set up a project of RTU buildings ({name: units}) with hourly timesteps
+def project(root, rtus):
+    import json
+    import project_setup
+    inputs = os.path.join(root, 'inputs')
+    os.makedirs(inputs)
+    for i, (name, units) in enumerate(rtus.items()):
+        eso(os.path.join(inputs, name + '.eso'), units, 1 + 0.5 * i)
+    epw(os.path.join(inputs, 'weather.epw'))
+    path = os.path.join(root, 'project')
+    project_setup.run({'project_name': path, 'input_path': [inputs],
+        'overwrite': False, 'link': None})
+    with open(os.path.join(path, 'ctes_district.csv'), 'w') as f:
+        f.write("id,building,ctes_type (rtu, chiller, district)\n")
+        for i, name in enumerate(rtus):
+            f.write("{},{},rtu\n".format(i, name))
+    f.close()
+    with open(os.path.join(path, 'program_manager.json'), 'r') as f:
+        pm = json.load(f)
+    f.close()
+    pm['timesteps'] = 1
+    with open(os.path.join(path, 'program_manager.json'), 'w') as f:
+        json.dump(pm, f, indent=2)
+    f.close()
+    return path
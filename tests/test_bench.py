@@ -0,0 +1,27 @@
+# test_bench.py
+# CTES Optimization Processor
+# Benchmark instances generated as sweep scenarios
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import os
+
+import bench
+import instance
+
+#-------------------------------------------------------------------------------
+def test_instances_per_setting(tmp_path, log):
+    project = instance.project(str(tmp_path), {'retail': 1})
+    instance.epw(os.path.join(project, 'weather_files', 'xhot.epw'), 3)
+    path = os.path.join(project, 'benchmark')
+    instances = bench.generate(project, {'instances': {'segments': [2],
+        'weather': ['weather.epw', 'xhot.epw']}}, path, log)
+    assert [name for name, p in instances] == [
+        'segments-2_weather-weather.epw', 'segments-2_weather-xhot.epw']
+    qNX = []
+    for name, p in instances:
+        assert p == os.path.join(path, 'instances', name, 'ampl_files')
+        with open(os.path.join(p, 'qNX1.dat'), 'r') as f:
+            qNX.append(f.read())
+        f.close()
+    assert qNX[0] != qNX[1]
@@ -0,0 +1,76 @@
+# test_cluster.py
+# CTES Optimization Processor
+# Accuracy reported for aggregate plants
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import copy
+import os
+
+import numpy as np
+
+import aggregator
+import buildings
+import cluster
+import create_erate
+import data_writer
+import instance
+import storage
+
+#-------------------------------------------------------------------------------
+def rtu(name, load, elec):
+    return {'name': name, 'index': 0, 'rate_cooling_Wt': load,
+        'rate_electricity_W': elec, 'temp_wb_evaporator_C': [18.0] * 4,
+        'cop': [q / e if e > 0 and q > 0 else 99 for q, e in zip(load, elec)]}
+#-------------------------------------------------------------------------------
+def prep(a, b):
+    return {'program_manager': {'timesteps': 1,
+        'cluster': {'scope': 'building', 'tolerance': 0.5}},
+        'community': {'building_names': ['b']},
+        'b': {'rtu1': a, 'rtu2': b}}
+#-------------------------------------------------------------------------------
+def test_deviation_of_members_from_leader(log):
+    # The larger plant leads; the other's COP is 20% higher
+    a = rtu('a', [0, 30.0, 60.0, 60.0], [0, 10.0, 20.0, 20.0])
+    b = rtu('b', [0, 30.0, 60.0, 60.0], [0, 12.0, 24.0, 24.0])
+    a['rate_cooling_Wt'][1] = 31.0
+    a['cop'][1] = 3.1
+    expected = max(cluster.distance(a, a), cluster.distance(b, a))
+    p = cluster.run(prep(a, b), log)
+    c = p['community']['plant_clusters'][0]
+    assert c['multiplicity'] == 2
+    assert expected > 0.1
+    assert np.isclose(c['max_deviation'], expected)
+    assert c['max_deviation'] <= 0.5
+    # The aggregate models the members' summed electricity
+    agg = p['b'][c['plant']]
+    assert np.allclose(np.array(agg['rate_cooling_Wt']) /
+        np.array(agg['cop']), [0, 22, 44, 44])
+#-------------------------------------------------------------------------------
+def ampl(prep, path, log):
+    prep = cluster.run(prep, log)
+    prep = storage.run(prep['program_manager']['project_name'], prep, log)
+    prep = aggregator.run(prep, log)
+    prep['utility_rate'] = create_erate.run(1, log)
+    os.makedirs(path)
+    data_writer.ampl(prep, log, path)
+    return prep
+#-------------------------------------------------------------------------------
+def read(path, filename):
+    with open(os.path.join(path, filename), 'r') as f:
+        return np.array(f.read().split(), dtype=float)
+#-------------------------------------------------------------------------------
+def test_aggregate_charges_at_members_rate(tmp_path, log):
+    project = instance.project(str(tmp_path), {'retail': 2})
+    parsed = buildings.run(project, log)
+    single = os.path.join(str(tmp_path), 'single')
+    ampl(copy.deepcopy(parsed), single, log)
+    parsed['program_manager']['cluster'] = {'scope': 'building',
+        'tolerance': 0.2}
+    clustered = os.path.join(str(tmp_path), 'clustered')
+    prep = ampl(parsed, clustered, log)
+    assert prep['community']['plant_count'] == 1
+    rtus = [k for k in prep['retail'].keys() if 'rtu' in k]
+    assert [prep['retail'][k]['multiplicity'] for k in rtus] == [2]
+    assert np.allclose(read(clustered, 'qNX1.dat'), read(single, 'qNX1.dat') +
+        read(single, 'qNX2.dat'), atol=0.011)
@@ -0,0 +1,44 @@
+# test_costs.py
+# CTES Optimization Processor
+# Storage costs of communities with only one CTES technology
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import os
+
+import numpy as np
+
+import common
+import model
+import results
+import sensitivity
+
+#-------------------------------------------------------------------------------
+def test_unit_cost_of_types_without_plants():
+    cost = common.unit_cost([100, 0], [140.67, 0], [20, 0])
+    assert np.allclose(cost, [703.35, 0])
+#-------------------------------------------------------------------------------
+def test_single_technology_costs_are_finite(rtu_project, log):
+    params = model.load(os.path.join(rtu_project, 'ampl_files'))
+    m = model.build(params)
+    assert np.isfinite(m.c).all()
+    r = m.solve()
+    assert r['x'] is not None
+    assert np.isfinite(r['objective'])
+    series = [model.plant_series(m, r['x'], params, n)
+        for n in range(params['N'])]
+    out = os.path.join(rtu_project, 'optimization_results')
+    c = model.write_outputs(params, series, out, log)
+    assert np.isfinite([c['capex'], c['annual_cost']]).all()
+    bill = results.run(rtu_project, log)[0]['cost']['optimal']
+    assert np.isfinite([bill['storage_bill'], bill['total_bill']]).all()
+#-------------------------------------------------------------------------------
+def test_single_technology_sensitivity_is_finite(rtu_project):
+    params = model.load(os.path.join(rtu_project, 'ampl_files'))
+    m = model.build(params)
+    m.to_highs()
+    settings = dict(sensitivity.SOLVE_DEFAULTS)
+    point = {'k': 0.2, 'yrs': None, 'c_d': 1, 'energy_multiplier': 1,
+        'zbar': None}
+    row = sensitivity.solve(m, params, point, settings)
+    assert np.isfinite([row['objective'], row['capex']]).all()
@@ -0,0 +1,48 @@
+# test_data_writer.py
+# CTES Optimization Processor
+# Change-aware writing of AMPL files
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import os
+
+import data_writer
+
+#-------------------------------------------------------------------------------
+def write(path, files, log):
+    data_writer.open_manifest(path)
+    for filename, text in files.items():
+        data_writer.put(text, path, filename)
+    return data_writer.close_manifest(path, log)
+#-------------------------------------------------------------------------------
+def read(path, filename):
+    with open(os.path.join(path, filename), 'r') as f:
+        return f.read()
+#-------------------------------------------------------------------------------
+def test_edited_file_is_rewritten(tmp_path, log):
+    path = str(tmp_path)
+    write(path, {'l1.dat': '1.5\n', 'l2.dat': '2.5\n'}, log)
+    # Same length edit, with a later modification time
+    target = os.path.join(path, 'l1.dat')
+    with open(target, 'w') as f:
+        f.write('9.9\n')
+    f.close()
+    st = os.stat(target)
+    os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    man = write(path, {'l1.dat': '1.5\n', 'l2.dat': '2.5\n'}, log)
+    assert (man['written_ct'], man['skipped_ct']) == (1, 1)
+    assert read(path, 'l1.dat') == '1.5\n'
+#-------------------------------------------------------------------------------
+def test_stale_files_are_removed(tmp_path, log):
+    path = str(tmp_path)
+    write(path, {'St1.dat': '1\n', 'St2.dat': '2\n', 'Tsets2.dat': '1\n'},
+        log)
+    # Interrupted write: the names of the earlier files are kept
+    data_writer.open_manifest(path)
+    data_writer.manifests.pop(os.path.abspath(path))
+    man = write(path, {'St1.dat': '1\n'}, log)
+    assert man['removed_ct'] == 2
+    assert sorted(os.listdir(path)) == ['St1.dat', 'manifest.json']
+    man = write(path, {'St1.dat': '1\n'}, log)
+    assert (man['written_ct'], man['skipped_ct'], man['removed_ct']) == \
+        (0, 1, 0)
@@ -0,0 +1,28 @@
+# test_decompose.py
+# CTES Optimization Processor
+# Plant-wise Lagrangian decomposition
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import os
+
+import pytest
+
+import common
+import decompose
+
+#-------------------------------------------------------------------------------
+def test_decomposition_reports_bounds(rtu_project, log):
+    best = decompose.run(rtu_project, log, {'workers': 1, 'iterations': 2})
+    assert len(best) == 1
+    with open(os.path.join(rtu_project, 'optimization_results',
+        'decomposition.json'), 'r') as f:
+        result = json.load(f)
+    f.close()
+    assert 1 <= len(result['iterations']) <= 2
+    assert result['lower_bound'] <= result['objective'] + 1e-6
+#-------------------------------------------------------------------------------
+def test_decomposition_needs_an_iteration(rtu_project, log):
+    with pytest.raises(common.InputError):
+        decompose.run(rtu_project, log, {'workers': 1, 'iterations': 0})
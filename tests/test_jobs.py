@@ -0,0 +1,90 @@
+# test_jobs.py
+# CTES Optimization Processor
+# Solver jobs run through a stub solver command
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import os
+import time
+
+import pytest
+
+import jobs
+
+#-------------------------------------------------------------------------------
+# Solver outputs of the instance, solved in-process
+@pytest.fixture
+def solved(rtu_project, log):
+    ampl = os.path.join(rtu_project, 'ampl_files')
+    ref = os.path.join(rtu_project, 'reference')
+    status = os.path.join(rtu_project, 'reference.json')
+    done = jobs.run([jobs.job('reference', ampl, ref)], {'command': None},
+        status, log)
+    assert done['reference']['state'] == 'done'
+    return ref
+#-------------------------------------------------------------------------------
+def stub(path, name, script):
+    f = os.path.join(path, name + '.sh')
+    with open(f, 'w') as s:
+        s.write("#!/bin/sh\n" + script + "\n")
+    os.chmod(f, 0o755)
+    return f
+#-------------------------------------------------------------------------------
+def alive(pid):
+    try:
+        with open('/proc/{}/stat'.format(pid), 'r') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return False
+#-------------------------------------------------------------------------------
+def test_run_collects_outputs_and_records_status(rtu_project, solved, log):
+    ampl = os.path.join(rtu_project, 'ampl_files')
+    pid = os.path.join(rtu_project, 'sleep.pid')
+    # Each job directory is named 'ctes_<job>_*'
+    script = stub(rtu_project, 'solver', 'case "$(basename "$PWD")" in\n' \
+        'ctes_done_*) cp {}/*.out . && echo solved > stub.log ;;\n' \
+        'ctes_failed_*) echo infeasible; exit 3 ;;\n' \
+        '*) sleep 30 & echo $! > {}; wait; touch late.out ;;\n' \
+        'esac'.format(solved, pid))
+    status = os.path.join(rtu_project, 'jobs_status.json')
+    start = time.time()
+    jobs.run([jobs.job(name, ampl, os.path.join(rtu_project, 'results',
+        name)) for name in ['done', 'failed', 'timeout']], {'command': script,
+        'workers': 3, 'timeout': 2}, status, log)
+    elapsed = time.time() - start
+    with open(status, 'r') as f:
+        states = json.load(f)
+    f.close()
+
+    # Outputs and logs of the job directory are collected
+    out = os.path.join(rtu_project, 'results', 'done')
+    assert states['done']['state'] == 'done'
+    assert states['done']['returncode'] == 0
+    assert states['done']['warm_start'] is False
+    for name in ['P.out', 'Z.out', 'Q.out', 'stub.log', 'solver.log']:
+        assert os.path.isfile(os.path.join(out, name))
+    with open(os.path.join(out, 'Z.out'), 'r') as f, open(os.path.join(
+        solved, 'Z.out'), 'r') as g:
+        assert f.read() == g.read()
+    assert os.path.isfile(os.path.join(out, 'summary', 'index.json'))
+
+    # A failing command records its return code and output
+    assert states['failed']['state'] == 'failed'
+    assert states['failed']['returncode'] == 3
+    with open(os.path.join(rtu_project, 'results', 'failed',
+        'solver.log'), 'r') as f:
+        assert 'infeasible' in f.read()
+
+    # A timeout stops the whole process group
+    out = os.path.join(rtu_project, 'results', 'timeout')
+    assert states['timeout']['state'] == 'timeout'
+    assert states['timeout']['returncode'] is None
+    assert elapsed < 20
+    with open(pid, 'r') as f:
+        assert not alive(int(f.read()))
+    assert not os.path.isfile(os.path.join(out, 'late.out'))
+    with open(os.path.join(out, 'solver.log'), 'r') as f:
+        assert 'Timed out after 2 s' in f.read()
+    for name, s in states.items():
+        assert set(['start', 'end', 'elapsed_s']) <= set(s.keys())
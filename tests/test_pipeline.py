@@ -0,0 +1,28 @@
+# test_pipeline.py
+# CTES Optimization Processor
+# In-process API
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import logging
+import os
+
+import instance
+import pipeline
+
+#-------------------------------------------------------------------------------
+def test_pool_stages_log_to_project_log(tmp_path):
+    project = instance.project(str(tmp_path), {'retail': 1})
+    log_file = os.path.join(project, 'project_workspace',
+        'ctes_processor.log')
+    with pipeline.Pipeline(workers=2) as p:
+        prep = p.preprocess(pipeline.Config(project))
+    assert prep['community']['plant_count'] == 1
+    with open(log_file, 'r') as f:
+        text = f.read()
+    f.close()
+    # The building parse runs in the pool
+    assert "Processing retail for UTSS optimization" in text
+    # Closing releases the project's log file
+    l = logging.getLogger('ctes.{}'.format(os.path.abspath(project)))
+    assert l.handlers == []
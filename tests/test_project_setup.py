@@ -0,0 +1,49 @@
+# test_project_setup.py
+# CTES Optimization Processor
+# Names of the input files brought into a project
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import os
+
+import project_setup
+
+FOLDERS = ['building_simulations', 'seed_models', 'weather_files']
+
+#-------------------------------------------------------------------------------
+def inputs(root, files):
+    paths = []
+    for folder, names in files:
+        path = os.path.join(root, folder)
+        os.makedirs(path, exist_ok=True)
+        for name in names:
+            open(os.path.join(path, name), 'w').close()
+        paths.append(path)
+    return paths
+#-------------------------------------------------------------------------------
+def names(plan):
+    return {os.path.join(os.path.basename(os.path.dirname(src)),
+        os.path.basename(src)): filename for src, folder, filename in plan}
+#-------------------------------------------------------------------------------
+def test_chiller_follows_renamed_simulation(tmp_path):
+    paths = inputs(str(tmp_path), [
+        ('bldgA', ['eplusout.eso', 'chiller0.dat', 'chiller1.dat']),
+        ('bldgB', ['bldgA.eso', 'bldgA_chiller0.dat', 'site.epw'])])
+    plan = names(project_setup.name_files(paths, FOLDERS))
+    assert plan == {
+        'bldgA/eplusout.eso': 'bldgA.eso',
+        'bldgA/chiller0.dat': 'bldgA_chiller0.dat',
+        'bldgA/chiller1.dat': 'bldgA_chiller1.dat',
+        'bldgB/bldgA.eso': 'bldgB_bldgA.eso',
+        'bldgB/bldgA_chiller0.dat': 'bldgB_bldgA_chiller0.dat',
+        'bldgB/site.epw': 'site.epw'
+    }
+#-------------------------------------------------------------------------------
+def test_chillers_of_several_simulations(tmp_path):
+    paths = inputs(str(tmp_path), [
+        ('site', ['office.eso', 'office_chiller0.dat', 'lab.eso',
+            'lab_chiller0.dat', 'office.osm'])])
+    plan = names(project_setup.name_files(paths, FOLDERS))
+    assert plan['site/office_chiller0.dat'] == 'office_chiller0.dat'
+    assert plan['site/lab_chiller0.dat'] == 'lab_chiller0.dat'
+    assert plan['site/office.osm'] == 'office.osm'
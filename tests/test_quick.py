@@ -0,0 +1,22 @@
+# test_quick.py
+# CTES Optimization Processor
+# LP relaxation and rounding heuristic
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import os
+
+import quick
+
+#-------------------------------------------------------------------------------
+def test_quick_solve(rtu_project, log):
+    summary = quick.run(rtu_project, log)
+    assert summary['objective'] >= summary['lp_bound'] - 1e-6
+    assert os.path.isfile(os.path.join(rtu_project, 'optimization_results',
+        'quick.json'))
+#-------------------------------------------------------------------------------
+def test_unrepaired_rounding_writes_nothing(rtu_project, log, monkeypatch):
+    monkeypatch.setattr(quick, 'fix_and_solve', lambda m, fixed, settings: {
+        'x': None, 'status': 'Time limit reached'})
+    assert quick.run(rtu_project, log) is None
+    assert os.listdir(os.path.join(rtu_project, 'optimization_results')) == []
@@ -0,0 +1,47 @@
+# test_results.py
+# CTES Optimization Processor
+# Utility bills from the AMPL inputs and solver outputs
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import os
+
+import common
+import instance
+import results
+
+#-------------------------------------------------------------------------------
+def bills(ampl_path):
+    with open(os.path.join(common.RESOURCES, 'schemas',
+        'results_schema.json'), 'r') as f:
+        schema = json.load(f)
+    f.close()
+    inputs = results.load_inputs(ampl_path)
+    return results.bills(inputs, {'P': inputs['p'].copy()}, schema)['cost']
+#-------------------------------------------------------------------------------
+def test_known_bill(rtu_project):
+    # Each day: 6 peak hours at 190 kW and $0.20/kWh, 5 other daytime hours
+    # at 130 kW and 13 night hours at 100 kW at $0.05/kWh; one $12/kW demand
+    # period per day, both in January
+    cost = bills(os.path.join(rtu_project, 'ampl_files'))
+    for case in ['baseline', 'optimal']:
+        assert cost[case]['energy_bill_$_kWh'] == 2 * (228 + 32.5 + 65)
+        assert cost[case]['demand_bill_$_kW'] == 2 * 12 * 190
+        assert cost[case]['demand_bill_monthly_$_kW'] == [4560] + [0] * 11
+        assert cost[case]['total_bill'] == 5211
+    assert cost['optimal']['storage_bill'] == 0
+#-------------------------------------------------------------------------------
+def test_no_demand_periods(tmp_path):
+    path = instance.write(str(tmp_path))
+    with open(os.path.join(path, 'fixed_params.dat'), 'r') as f:
+        fixed = f.read().split("\n")
+    f.close()
+    fixed[4] = "0,0"
+    with open(os.path.join(path, 'fixed_params.dat'), 'w') as f:
+        f.write("\n".join(fixed))
+    f.close()
+    instance.lines(path, 'Td.dat', [[]])
+    cost = bills(path)
+    assert cost['baseline']['demand_bill_$_kW'] == 0
+    assert cost['baseline']['total_bill'] == 651
@@ -0,0 +1,71 @@
+# test_shards.py
+# CTES Optimization Processor
+# Sharded pre-processing with lost and stalled workers
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import logging
+import os
+import signal
+
+import instance
+import shards
+
+#-------------------------------------------------------------------------------
+def ampl_files(project):
+    path = os.path.join(project, 'ampl_files')
+    files = {}
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), 'rb') as f:
+            files[name] = f.read()
+        f.close()
+    return files
+#-------------------------------------------------------------------------------
+def test_task_of_killed_worker_is_requeued(tmp_path, monkeypatch, caplog):
+    log = logging.getLogger('ctes.test')
+    project = instance.project(str(tmp_path), {'retail': 2, 'office': 1})
+    shards.coordinate(project, str(tmp_path / 'clean'), log, workers=2)
+    expected = ampl_files(project)
+
+    # The first worker to start a task dies with it (local workers are forked
+    # with the patched module)
+    marker = str(tmp_path / 'killed')
+    building = shards.building
+    def crash(task, log):
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            return building(task, log)
+        os.kill(os.getpid(), signal.SIGKILL)
+    monkeypatch.setattr(shards, 'building', crash)
+    caplog.set_level(logging.INFO, logger='ctes.test')
+    shared = str(tmp_path / 'shared')
+    shards.coordinate(project, shared, log, workers=2, lease=1)
+
+    assert os.path.isfile(marker)
+    assert any(['re-queued' in r.getMessage() for r in caplog.records])
+    assert ampl_files(project) == expected
+    for k in ['tasks', 'claimed', 'results']:
+        assert os.listdir(os.path.join(shared, k)) == []
+#-------------------------------------------------------------------------------
+def test_stalled_worker_leaves_new_claim(tmp_path, monkeypatch):
+    log = logging.getLogger('ctes.test')
+    paths = shards.folders(str(tmp_path))
+    shards.put(os.path.join(paths['tasks'], 'run_00000'), {'lease': 1,
+        'bldg': 'retail'})
+    stalled = shards.claim(paths)
+    claims = []
+    # While the task runs, its lease runs out (the coordinator re-queues
+    # it) and another worker claims it
+    def requeue(task, log):
+        os.rename(os.path.join(paths['claimed'], stalled),
+            os.path.join(paths['tasks'], 'run_00000'))
+        claims.append(shards.claim(paths))
+        return {'bldg': task['bldg']}
+    monkeypatch.setattr(shards, 'building', requeue)
+    shards.execute(paths, stalled, log)
+
+    assert claims[0] is not None and claims[0] != stalled
+    assert os.listdir(paths['claimed']) == [claims[0]]
+    assert shards.get(os.path.join(paths['results'], 'run_00000')) == {
+        'bldg': 'retail'}
@@ -0,0 +1,70 @@
+# test_sweep.py
+# CTES Optimization Processor
+# Scenario sweeps over program manager settings and tariffs
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import logging
+import os
+
+import instance
+import sweep
+
+#-------------------------------------------------------------------------------
+class Records(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+#-------------------------------------------------------------------------------
+def test_scenarios_log_to_project_log(tmp_path):
+    project = instance.project(str(tmp_path), {'retail': 1})
+    spec = os.path.join(str(tmp_path), 'sweep.json')
+    with open(spec, 'w') as f:
+        json.dump({'grid': {'segments': [2, 3]}, 'workers': 2}, f)
+    f.close()
+    log = logging.getLogger('ctes.test.sweep')
+    records = Records()
+    log.addHandler(records)
+    try:
+        index = sweep.run(project, spec, log)
+    finally:
+        log.removeHandler(records)
+    assert [s['name'] for s in index] == ['segments-2_base',
+        'segments-3_base']
+    for s in index:
+        assert os.path.isfile(os.path.join(s['path'], 'fixed_params.dat'))
+    # Records of the scenario processes reach the caller's logger
+    workers = [r for r in records.records if r.processName != 'MainProcess']
+    assert any(['Processing' in r.getMessage() for r in workers])
+#-------------------------------------------------------------------------------
+def test_scenarios_parse_with_their_weather(tmp_path):
+    project = instance.project(str(tmp_path), {'retail': 1})
+    instance.epw(os.path.join(project, 'weather_files', 'xhot.epw'), 3)
+    spec = os.path.join(str(tmp_path), 'sweep.json')
+    with open(spec, 'w') as f:
+        json.dump({'grid': {'weather': ['weather.epw', 'xhot.epw']}}, f)
+    f.close()
+    index = sweep.run(project, spec, logging.getLogger('ctes.test'))
+    qNX = []
+    for s in index:
+        with open(os.path.join(s['path'], 'qNX1.dat'), 'r') as f:
+            qNX.append(f.read())
+        f.close()
+    assert qNX[0] != qNX[1]
+#-------------------------------------------------------------------------------
+def test_failed_scenario_is_indexed(tmp_path):
+    project = instance.project(str(tmp_path), {'retail': 1})
+    spec = os.path.join(str(tmp_path), 'sweep.json')
+    with open(spec, 'w') as f:
+        json.dump({'grid': {'utss': ['ib40', 'no_such_product']}}, f)
+    f.close()
+    index = sweep.run(project, spec, logging.getLogger('ctes.test'))
+    assert [s['status'] for s in index] == ['written', 'failed']
+    assert 'no_such_product' in index[1]['error']
+    with open(os.path.join(project, 'sweep', 'index.json'), 'r') as f:
+        assert json.load(f) == index
+    f.close()
@@ -0,0 +1,47 @@
+# test_weathers.py
+# CTES Optimization Processor
+# Storage processing for several weather files
+# Karl Heine, kheine@mines.edu, heinek@erau.edu
+# July 2021
+
+import json
+import logging
+import os
+
+import instance
+import stages
+
+TARIFF = {'dr_events': {}, 'energy': [{'rate': 0.1, 'months': list(range(1,
+    13)), 'days': list(range(1, 32)), 'hours': list(range(24))}]}
+
+#-------------------------------------------------------------------------------
+def read(path, name):
+    with open(os.path.join(path, name), 'r') as f:
+        return f.read()
+#-------------------------------------------------------------------------------
+def test_weathers_reuse_primary_and_tariff(tmp_path, caplog):
+    log = logging.getLogger('ctes.test')
+    caplog.set_level(logging.INFO)
+    project = instance.project(str(tmp_path), {'retail': 1})
+    instance.epw(os.path.join(project, 'weather_files', 'xhot.epw'), 3)
+    stages.preprocess(project, log, tariff=TARIFF)
+    with open(os.path.join(project, 'weather', 'index.json'), 'r') as f:
+        index = {w['name']: w for w in json.load(f)}
+    f.close()
+
+    # The primary (first) weather is the project's own pre-processing
+    ampl = os.path.join(project, 'ampl_files')
+    assert sorted(index.keys()) == ['weather', 'xhot']
+    assert index['weather']['path'] == ampl
+    assert not os.path.isdir(os.path.join(project, 'weather', 'weather'))
+    assert index['xhot']['max_dry_bulb_C'] == round(
+        index['weather']['max_dry_bulb_C'] + 3, 2)
+
+    # Both weathers are priced with the project's tariff
+    hot = index['xhot']['path']
+    assert read(hot, 'cost_elec.dat') == read(ampl, 'cost_elec.dat')
+    assert min([float(v) for v in read(ampl, 'cost_elec.dat').replace(',',
+        ' ').split()]) >= 0.1
+    assert read(hot, 'qNX1.dat') != read(ampl, 'qNX1.dat')
+    # Records of the weather processes reach the caller's logger
+    assert any([r.processName != 'MainProcess' for r in caplog.records])